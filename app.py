@@ -1,54 +1,59 @@
 from flask import Flask
 from config import Config
-from database import db
-from routes.admin import admin_bp
-from routes.patients import patient_bp
-from routes.doctor import doctor_bp
-from models import User
+from database import db, apply_sqlite_pragmas, pool_options
+from identity import identity_cache, load_identity
+from directory import directory_cache
+from fragments import fragment_cache
 from flask_login import LoginManager
-from werkzeug.security import generate_password_hash
+from passwords import password_hasher
+from perf import query_profiler
 
 login_manager = LoginManager()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_identity(int(user_id))
 
 def create_app():
+    """
+    Build the app without touching the database, so worker start-up stays cheap.
+    Tables and the admin account are set up once with `flask init-db` and `flask seed-admin`.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        pool_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('DB_POOL_OPTIONS')),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
 
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
+    identity_cache.init_app(app, 'IDENTITY_CACHE')
+    directory_cache.init_app(app, 'DIRECTORY_CACHE')
+    fragment_cache.init_app(app)
+    password_hasher.init_app(app)
+    query_profiler.init_app(app)
     login_manager.login_view = 'login' # redirects to login page if not logged in
 
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+
+    # Imported here rather than at the top, so importing this module (e.g. for login_manager)
+    # doesn't pull in every view, form and query module
+    from routes.admin import admin_bp
+    from routes.patients import patient_bp
+    from routes.doctor import doctor_bp
+    from routes.api import api_bp
+    from routes.auth import register_auth_routes
+    from commands import register_commands
+
     # Register Blueprints
     app.register_blueprint(admin_bp, url_prefix = '/admin')
     app.register_blueprint(doctor_bp, url_prefix = '/doctor')
     app.register_blueprint(patient_bp, url_prefix = '/patient')
+    app.register_blueprint(api_bp, url_prefix = '/api/v1')
+    register_auth_routes(app)
+    register_commands(app)
 
-
-    with app.app_context():
-        db.create_all()
-        #Create admin user if it doesn't exist
-        # app.py (fix admin creation)
-        if not User.query.filter_by(role='Admin').first():
-            hashed_password = generate_password_hash('admin_password')
-            admin = User(
-                username='admin',
-                name='Administrator',
-                email='admin123@gmail.com',
-                password= hashed_password,
-                role='Admin'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin user added successfully.")
-    
     return app
-
-
-
-
-
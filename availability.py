@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from models import Doctor, DoctorAvailability, DoctorAvailabilityOverride, Appointment, AppointmentStatus, DayOfWeek
+from slot_grid import SlotGrid, EMPTY, SLOT_LABELS, DEFAULT_SLOT_MINUTES, slot_index, minute_of_day
+from leave import overlapping_leave, day_bits
+
+# DayOfWeek is declared Monday first, matching date.weekday()
+WEEKDAY_INDEX = {day: i for i, day in enumerate(DayOfWeek)}
+
+
+def date_range(date_from, date_to):
+    current = date_from
+    while current <= date_to:
+        yield current
+        current += timedelta(days=1)
+
+
+class AvailabilityRange:
+    """
+    Weekly schedule, per-date overrides, leave blocks and BOOKED appointments for a set of
+    doctors over a date range, loaded with one query per table. All slot maths afterwards is
+    done on SlotGrids.
+
+    Weekly rows are one per slot. Overrides, leave and bookings are read as time intervals
+    and turned into the slot starts they affect at the doctor's slot length: an interval
+    blocks every slot it overlaps and an opened one offers the slots that fit inside it.
+    """
+
+    def __init__(self, doctor_ids, date_from, date_to):
+        self.doctor_ids = list(doctor_ids)
+        self.date_from = date_from
+        self.date_to = date_to
+
+        # {doctor_id: minutes per slot}
+        self.slot_minutes = {}
+        # {doctor_id: [bits per weekday, Monday first]}
+        self.weekly = defaultdict(lambda: [0] * 7)
+        # {(doctor_id, date): (opened bits, blocked bits)}
+        self.overrides = {}
+        # {(doctor_id, date): (opened bits, blocked bits)} from DoctorLeave blocks
+        self.leave = {}
+        # {(doctor_id, date): bits}
+        self.booked = defaultdict(int)
+
+        if not self.doctor_ids:
+            return
+
+        self.slot_minutes = dict(Doctor.query.with_entities(Doctor.id, Doctor.slot_minutes).filter(
+            Doctor.id.in_(self.doctor_ids)
+        ).all())
+
+        weekly_rows = DoctorAvailability.query.with_entities(
+            DoctorAvailability.doctor_id, DoctorAvailability.day, DoctorAvailability.start_time
+        ).filter(DoctorAvailability.doctor_id.in_(self.doctor_ids)).all()
+        for doctor_id, day, start_time in weekly_rows:
+            self.weekly[doctor_id][WEEKDAY_INDEX[day]] |= 1 << slot_index(start_time)
+
+        override_rows = DoctorAvailabilityOverride.query.with_entities(
+            DoctorAvailabilityOverride.doctor_id, DoctorAvailabilityOverride.date,
+            DoctorAvailabilityOverride.start_time, DoctorAvailabilityOverride.end_time,
+            DoctorAvailabilityOverride.is_available
+        ).filter(
+            DoctorAvailabilityOverride.doctor_id.in_(self.doctor_ids),
+            DoctorAvailabilityOverride.date.between(date_from, date_to)
+        ).all()
+        for doctor_id, day, start_time, end_time, is_available in override_rows:
+            start, end = _span(start_time, end_time)
+            minutes = self.slot_length(doctor_id)
+            opened, blocked = self.overrides.get((doctor_id, day), (0, 0))
+            if is_available:
+                opened |= SlotGrid.spaced(start, end, minutes).bits
+            else:
+                blocked |= SlotGrid.covering(start, end, minutes).bits
+            self.overrides[(doctor_id, day)] = (opened, blocked)
+
+        range_start = datetime.combine(date_from, datetime.min.time())
+        range_end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+        for block in overlapping_leave(self.doctor_ids, range_start, range_end):
+            first = max(block.start_at.date(), date_from)
+            last = min((block.end_at - timedelta(microseconds=1)).date(), date_to)
+            for day in date_range(first, last):
+                bits = day_bits(block.start_at, block.end_at, day, self.slot_length(block.doctor_id),
+                                whole_slots=block.is_available)
+                opened, blocked = self.leave.get((block.doctor_id, day), (0, 0))
+                if block.is_available:
+                    opened |= bits
+                else:
+                    blocked |= bits
+                self.leave[(block.doctor_id, day)] = (opened, blocked)
+
+        booked_rows = Appointment.query.with_entities(
+            Appointment.doctor_id, Appointment.date, Appointment.time, Appointment.slot_minutes
+        ).filter(
+            Appointment.doctor_id.in_(self.doctor_ids),
+            Appointment.date.between(date_from, date_to),
+            Appointment.status == AppointmentStatus.BOOKED
+        ).all()
+        for doctor_id, day, t, booked_minutes in booked_rows:
+            start = minute_of_day(t)
+            self.booked[(doctor_id, day)] |= SlotGrid.covering(
+                start, start + booked_minutes, self.slot_length(doctor_id)
+            ).bits
+
+    def slot_length(self, doctor_id):
+        return self.slot_minutes.get(doctor_id, DEFAULT_SLOT_MINUTES)
+
+    def weekly_grid(self, doctor_id, day):
+        if doctor_id not in self.weekly:
+            return EMPTY
+        return SlotGrid(self.weekly[doctor_id][day.weekday()])
+
+    def override_grids(self, doctor_id, day):
+        """(opened, blocked) grids from that date's overrides and leave blocks."""
+        opened, blocked = self.overrides.get((doctor_id, day), (0, 0))
+        # A slot opened on the date wins over a neighbouring blocked one that overlaps it
+        blocked &= ~opened
+        leave_opened, leave_blocked = self.leave.get((doctor_id, day), (0, 0))
+        opened |= leave_opened
+        # Blocked intervals cover every start position they touch; only the slots the doctor would work matter
+        blocked = (blocked | leave_blocked) & (opened | self.weekly_grid(doctor_id, day).bits)
+        return SlotGrid(opened), SlotGrid(blocked)
+
+    def booked_grid(self, doctor_id, day):
+        return SlotGrid(self.booked.get((doctor_id, day), 0))
+
+    def open_grid(self, doctor_id, day):
+        """Slots the doctor works on `day`: weekly schedule with that date's overrides applied."""
+        opened, blocked = self.override_grids(doctor_id, day)
+        return (self.weekly_grid(doctor_id, day) | opened) - blocked
+
+    def free_grid(self, doctor_id, day):
+        return self.open_grid(doctor_id, day) - self.booked_grid(doctor_id, day)
+
+    def free_slots(self, doctor_id, day):
+        """Sorted 'HH:MM' labels of the slots still bookable on `day`."""
+        return self.free_grid(doctor_id, day).labels()
+
+    def slot_table(self, doctor_id, day):
+        """Rows for the doctor's per-date slot tables (weekly and override-only slots, booked/free)."""
+        weekly = self.weekly_grid(doctor_id, day)
+        opened, blocked = self.override_grids(doctor_id, day)
+        booked = self.booked_grid(doctor_id, day)
+        return [{
+            'time': SLOT_LABELS[i],
+            'is_weekly': bool(weekly.bits >> i & 1),
+            'is_available': not blocked.bits >> i & 1,
+            'is_booked': bool(booked.bits >> i & 1)
+        } for i in weekly | opened | blocked]
+
+
+def _span(start_time, end_time):
+    """(start, end) minutes from midnight; an end at or before the start means the next midnight or later."""
+    start, end = minute_of_day(start_time), minute_of_day(end_time)
+    return start, end if end > start else end + 24 * 60
+
+
+def get_free_slots(doctor_ids, date_from, date_to):
+    """Return {doctor_id: {date: ['HH:MM', ...]}} of bookable slots for the whole range."""
+    availability = AvailabilityRange(doctor_ids, date_from, date_to)
+    return {
+        doctor_id: {day: availability.free_slots(doctor_id, day) for day in date_range(date_from, date_to)}
+        for doctor_id in availability.doctor_ids
+    }
+
+
+def get_free_grid(doctor_id, selected_date):
+    """SlotGrid of bookable slots for one doctor on one date."""
+    return AvailabilityRange([doctor_id], selected_date, selected_date).free_grid(doctor_id, selected_date)
+
+
+def get_slot_table(doctor_id, selected_date):
+    return AvailabilityRange([doctor_id], selected_date, selected_date).slot_table(doctor_id, selected_date)
@@ -0,0 +1,109 @@
+"""
+Times the appointment hot-path queries on a synthetic SQLite database before and after
+the indexes declared in models.py are created by migrations.upgrade_schema().
+
+    python benchmarks/bench_appointment_indexes.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.schema import CreateTable
+from database import db
+from migrations import upgrade_schema
+import models  # noqa: F401  (registers the tables on db.metadata)
+
+DOCTORS = 200
+PATIENTS = 50000
+STATUSES = ['BOOKED', 'COMPLETED', 'CANCELLED']
+TODAY = date(2025, 6, 1)
+
+QUERIES = {
+    'doctor upcoming (doctor.dashboard)':
+        "SELECT id FROM appointment WHERE doctor_id = :doctor AND date >= :today AND status = 'BOOKED' "
+        "ORDER BY date, time",
+    'doctor completed (doctor.dashboard)':
+        "SELECT id FROM appointment WHERE doctor_id = :doctor AND status = 'COMPLETED' ORDER BY date DESC, time DESC",
+    'patient past (patient.dashboard)':
+        "SELECT id FROM appointment WHERE patient_id = :patient AND date < :today ORDER BY date DESC, time DESC",
+    'today (admin.dashboard)':
+        "SELECT id FROM appointment WHERE date = :today",
+    'double-booking check (book_appt)':
+        "SELECT id FROM appointment WHERE doctor_id = :doctor AND date = :today AND time = '10:00:00.000000' "
+        "AND status = 'BOOKED' LIMIT 1",
+    'treatment lookup (joinedload)':
+        "SELECT id FROM treatment WHERE appointment_id = :appointment",
+}
+
+
+def build_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        # CreateTable emits constraints but not the Index objects, giving the pre-migration schema
+        for table in db.metadata.sorted_tables:
+            conn.execute(CreateTable(table))
+
+    rng = random.Random(42)
+    start = TODAY - timedelta(days=3 * 365)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO appointment (doctor_id, patient_id, date, time, status) VALUES (?, ?, ?, ?, ?)",
+        ((rng.randint(1, DOCTORS), rng.randint(1, PATIENTS),
+          (start + timedelta(days=rng.randint(0, 4 * 365))).isoformat(),
+          '%02d:%02d:00.000000' % (rng.randint(9, 22), rng.choice((0, 30))),
+          rng.choice(STATUSES)) for _ in range(rows))
+    )
+    conn.executemany(
+        "INSERT INTO treatment (appointment_id, disease) VALUES (?, 'flu')",
+        ((i,) for i in range(1, rows + 1, 3))
+    )
+    conn.commit()
+    conn.close()
+    return engine
+
+
+def time_queries(engine, repeat):
+    rng = random.Random(7)
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            params = [{'doctor': rng.randint(1, DOCTORS), 'patient': rng.randint(1, PATIENTS),
+                       'appointment': rng.randint(1, 1000), 'today': TODAY.isoformat()} for _ in range(repeat)]
+            started = time.perf_counter()
+            for p in params:
+                conn.execute(text(sql), p).fetchall()
+            results[name] = (time.perf_counter() - started) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    print(f"Building {args.rows} appointments in {path} ...")
+    engine = build_database(path, args.rows)
+
+    before = time_queries(engine, args.repeat)
+    started = time.perf_counter()
+    upgrade_schema(engine)
+    print(f"upgrade_schema() created indexes in {time.perf_counter() - started:.1f}s")
+    after = time_queries(engine, args.repeat)
+
+    print(f"{'query':40} {'before ms':>10} {'after ms':>10}")
+    for name in QUERIES:
+        print(f"{name:40} {before[name]:10.2f} {after[name]:10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Counts SQL statements per request for logged-in pages with the identity cache disabled
+(IDENTITY_CACHE_TTL = 0, every request runs the user loader query) and enabled.
+
+    python benchmarks/bench_identity_queries.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+
+Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'identity.db')}"
+Config.WTF_CSRF_ENABLED = False
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from database import db
+from identity import identity_cache
+from models import User, Doctor, Patient, Appointment, DoctorAvailability, DayOfWeek
+from migrations import init_db
+from app import create_app
+
+app = create_app()
+
+PAGES = {
+    'Patient': ['/patient/dashboard', '/patient/appointment/book', '/patient/doctors'],
+    'Doctor': ['/doctor/dashboard', '/doctor/slots', '/doctor/profile/edit'],
+}
+
+
+def seed(app):
+    with app.app_context():
+        init_db()
+        password = generate_password_hash('pw')
+        doctor_user = User(username='doc', name='Doc', email='doc@example.com', password=password, role='Doctor')
+        patient_user = User(username='pat', name='Pat', email='pat@example.com', password=password, role='Patient')
+        db.session.add_all([doctor_user, patient_user])
+        db.session.flush()
+        doctor = Doctor(user_id=doctor_user.id, specialization='General')
+        patient = Patient(user_id=patient_user.id, dob=date(1990, 1, 1), phone_number='0')
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        for day in DayOfWeek:
+            db.session.add(DoctorAvailability(doctor_id=doctor.id, day=day, start_time=time(9), end_time=time(9, 30)))
+        db.session.add(Appointment(doctor_id=doctor.id, patient_id=patient.id, date=date.today() + timedelta(days=1),
+                                   time=time(9), problem='checkup'))
+        db.session.commit()
+
+
+def count_queries(app, email, urls, repeat=5):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    client.post('/', data={'email': email, 'password': 'pw'})
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        results = {}
+        for url in urls:
+            client.get(url)  # warm the cache
+            statements.clear()
+            for _ in range(repeat):
+                client.get(url)
+            results[url] = len(statements) / repeat
+        return results
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def main():
+    seed(app)
+
+    print(f"{'page':32} {'cache off':>10} {'cache on':>10}")
+    for role, urls in PAGES.items():
+        email = 'doc@example.com' if role == 'Doctor' else 'pat@example.com'
+        identity_cache.ttl = 0
+        identity_cache.clear()
+        off = count_queries(app, email, urls)
+        identity_cache.ttl = 300
+        on = count_queries(app, email, urls)
+        for url in urls:
+            print(f"{url:32} {off[url]:10.1f} {on[url]:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
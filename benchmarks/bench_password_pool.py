@@ -0,0 +1,90 @@
+"""
+Logins/sec through the real login view with 16 concurrent clients, for several
+PASSWORD_HASH_WORKERS pool sizes (0 = hash on the request thread). A 17th thread keeps
+requesting the login page meanwhile; its rate shows how much the hashing starves
+everything else in the process.
+
+    python benchmarks/bench_password_pool.py [seconds per run] [pool sizes...]
+    python benchmarks/bench_password_pool.py 10 0 1 2 4 8
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+
+Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'passwords.db')}"
+Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+Config.WTF_CSRF_ENABLED = False
+
+from database import db
+from models import User
+from passwords import password_hasher
+from migrations import init_db
+from app import create_app
+
+app = create_app()
+
+CLIENTS = 16
+
+
+def seed():
+    with app.app_context():
+        init_db()
+        db.session.add(User(username='admin2', name='Admin Two', email='bench@example.com',
+                            password=password_hasher.hash('pw'), role='Admin'))
+        db.session.commit()
+
+
+def run(workers, seconds):
+    password_hasher.shutdown()
+    password_hasher.workers = workers
+    password_hasher.hash('warm up')  # start the pool outside the timed window
+
+    stop = threading.Event()
+    logins = [0] * CLIENTS
+    pages = [0]
+
+    def login_loop(i):
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.post('/', data={'email': 'bench@example.com', 'password': 'pw'})
+            if response.status_code == 302:
+                logins[i] += 1
+            client.get('/logout')
+
+    def page_loop():
+        client = app.test_client()
+        while not stop.is_set():
+            client.get('/')
+            pages[0] += 1
+
+    threads = [threading.Thread(target=login_loop, args=(i,)) for i in range(CLIENTS)]
+    threads.append(threading.Thread(target=page_loop))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(logins) / seconds, pages[0] / seconds
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    sizes = [int(arg) for arg in sys.argv[2:]] or [0, 1, 2, 4]
+    seed()
+    print(f"method {password_hasher.method}, {os.cpu_count()} CPU(s), {CLIENTS} clients, {seconds:.0f}s per run")
+    print(f"{'pool':>6} {'logins/s':>10} {'other req/s':>12}")
+    for workers in sizes:
+        logins, pages = run(workers, seconds)
+        print(f"{workers:>6} {logins:>10.1f} {pages:>12.1f}")
+    password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
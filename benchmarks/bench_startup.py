@@ -0,0 +1,114 @@
+"""
+Worker cold start: how long a fresh Python process takes to import the app, build it with
+create_app() and answer its first request (GET /, the login page). Each run is a new
+interpreter, like a gunicorn worker being (re)started. The medians are checked against
+benchmarks/startup_budget.json and the script exits 1 if any is over budget, so it can run in CI.
+
+Import time comes from `python -X importtime`; the slowest modules are listed so a new heavy
+import shows up by name.
+
+    python benchmarks/bench_startup.py            # 10 runs
+    python benchmarks/bench_startup.py --runs 20 --top 25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+
+# Runs in the child; prints one JSON line of phase timings (ms) once the first response is back
+CHILD = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get('/').status_code
+answered = time.perf_counter()
+print(json.dumps({
+    'import': (imported - started) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (answered - created) * 1000,
+    'status': status,
+}), flush=True)
+'''
+
+
+def init_database(env):
+    subprocess.run([sys.executable, '-c', 'from app import create_app\nfrom migrations import init_db\n'
+                    'with create_app().app_context(): init_db()'], cwd=ROOT, env=env, check=True)
+
+
+def cold_start(env):
+    """One fresh interpreter; returns phase timings plus 'total' (spawn to first response) in ms."""
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', CHILD], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    line = child.stdout.readline()
+    total = (time.perf_counter() - started) * 1000
+    child.wait()
+    timings = json.loads(line)
+    if timings.pop('status') != 200:
+        raise RuntimeError('first request did not return 200')
+    timings['total'] = total
+    return timings
+
+
+def slowest_imports(env, top):
+    """(cumulative us, self us, module) for the slowest imports under `import app`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), int(own), module.rstrip()))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}")
+    init_database(env)
+
+    cold_start(env)  # warm the OS file cache and __pycache__ so runs are comparable
+    runs = [cold_start(env) for _ in range(args.runs)]
+
+    print(f"{args.runs} cold starts, {os.cpu_count()} CPU(s), Python {sys.version.split()[0]}")
+    print(f"{'phase':<14} {'median ms':>10} {'max ms':>8} {'budget ms':>10}")
+    over = []
+    for phase in ['import', 'create_app', 'first_request', 'total']:
+        values = [run[phase] for run in runs]
+        median = statistics.median(values)
+        limit = budget.get(phase)
+        flag = ''
+        if limit is not None and median > limit:
+            over.append(phase)
+            flag = '  OVER'
+        print(f"{phase:<14} {median:>10.1f} {max(values):>8.1f} {limit if limit is not None else '-':>10}{flag}")
+
+    print(f"\nslowest imports (self time, -X importtime):")
+    print(f"{'self ms':>8} {'cumul. ms':>10}  module")
+    for cumulative, own, module in slowest_imports(env, args.top):
+        print(f"{own / 1000:>8.1f} {cumulative / 1000:>10.1f}  {module.strip()}")
+
+    if over:
+        print(f"\nover budget: {', '.join(over)} (see {os.path.relpath(BUDGET_FILE)})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Times the treatment record search (search.py) on a synthetic database of a million
+treatments: loading them through the index triggers, a full rebuild, ranked searches as an
+admin, a doctor and a patient, and the extra cost of recording one treatment.
+
+    python benchmarks/bench_treatment_search.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'treatments.db')
+Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{DB_PATH}"
+Config.PASSWORD_HASH_WORKERS = 0
+
+from app import create_app
+from database import db
+from migrations import init_db
+from models import Treatment
+from search import search_treatments, rebuild_treatment_index, TREATMENT_PAGE_SIZE
+
+DOCTORS = 500
+PATIENTS = 50000
+START = date(2022, 1, 1)
+
+DISEASES = ['influenza', 'hypertension', 'type 2 diabetes', 'asthma', 'migraine', 'gastritis', 'bronchitis',
+            'pneumonia', 'dermatitis', 'anaemia', 'hypothyroidism', 'urinary tract infection', 'sinusitis',
+            'tonsillitis', 'otitis media', 'conjunctivitis', 'osteoarthritis', 'gout', 'psoriasis', 'tuberculosis',
+            'dengue', 'malaria', 'typhoid', 'hepatitis b', 'appendicitis', 'kidney stones', 'vertigo', 'eczema',
+            'depression', 'anxiety', 'insomnia', 'obesity', 'sciatica', 'scabies', 'chickenpox', 'measles']
+DRUGS = ['paracetamol', 'ibuprofen', 'amoxicillin', 'azithromycin', 'metformin', 'amlodipine', 'losartan',
+         'salbutamol', 'omeprazole', 'pantoprazole', 'cetirizine', 'levothyroxine', 'atorvastatin', 'prednisolone',
+         'doxycycline', 'ciprofloxacin', 'metronidazole', 'insulin glargine', 'sumatriptan', 'diclofenac',
+         'allopurinol', 'sertraline', 'fluoxetine', 'melatonin', 'ferrous sulfate', 'folic acid', 'artemether',
+         'isoniazid', 'rifampicin', 'permethrin', 'acyclovir', 'ondansetron', 'betahistine', 'tamsulosin']
+FINDINGS = ['fever', 'cough', 'fatigue', 'headache', 'nausea', 'rash', 'wheezing', 'chest pain', 'joint pain',
+            'swelling', 'dizziness', 'elevated blood pressure', 'raised blood sugar', 'low haemoglobin',
+            'sore throat', 'abdominal pain', 'back pain', 'itching', 'weight loss', 'shortness of breath']
+NOTES = ['review in two weeks', 'follow up with blood test', 'advised rest and fluids', 'refer to specialist',
+         'continue current dose', 'stop if side effects', 'lifestyle changes discussed', 'x-ray ordered',
+         'allergic to penicillin', 'repeat prescription', 'patient improving', 'no improvement since last visit']
+
+# (label, query, scope); scope is None, 'doctor' or 'patient'
+SEARCHES = [
+    ('common word, admin', 'fever', None),
+    ('common word, doctor', 'fever', 'doctor'),
+    ('common word, patient', 'fever', 'patient'),
+    ('two words, admin', 'asthma salbutamol', None),
+    ('two words, doctor', 'asthma salbutamol', 'doctor'),
+    ('prefix, admin', 'amox*', None),
+    ('prefix, doctor', 'amox*', 'doctor'),
+    ('rare word, admin', 'betahistine vertigo dizziness', None),
+    ('no match, admin', 'zzzz', None),
+]
+
+
+def zipf_choice(rng, items):
+    """Earlier items much more often than later ones, like real diagnoses."""
+    return items[min(int(rng.paretovariate(1.2)) - 1, len(items) - 1)]
+
+
+def build(path, rows):
+    """Users, doctors, patients and `rows` completed appointments each with a treatment; treatments
+    go in through the index triggers. Returns the seconds spent inserting treatments."""
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executemany(
+        'INSERT INTO "user" (id, username, name, email, password, role) VALUES (?, ?, ?, ?, ?, ?)',
+        ((i, f'u{i}', f'User {i}', f'u{i}@example.com', 'x', 'Doctor' if i <= DOCTORS else 'Patient')
+         for i in range(1, DOCTORS + PATIENTS + 1))
+    )
+    conn.executemany('INSERT INTO doctor (id, user_id, specialization) VALUES (?, ?, ?)',
+                     ((i, i, 'General') for i in range(1, DOCTORS + 1)))
+    conn.executemany('INSERT INTO patient (id, user_id, dob, phone_number) VALUES (?, ?, ?, ?)',
+                     ((i, DOCTORS + i, '1990-01-01', '0') for i in range(1, PATIENTS + 1)))
+    conn.executemany(
+        "INSERT INTO appointment (id, doctor_id, patient_id, date, time, status) VALUES (?, ?, ?, ?, ?, 'COMPLETED')",
+        ((i, rng.randint(1, DOCTORS), rng.randint(1, PATIENTS),
+          (START + timedelta(days=rng.randint(0, 3 * 365))).isoformat(),
+          '%02d:%02d:00.000000' % (rng.randint(9, 22), rng.choice((0, 30)))) for i in range(1, rows + 1))
+    )
+    conn.commit()
+
+    def treatments():
+        for i in range(1, rows + 1):
+            disease = zipf_choice(rng, DISEASES)
+            yield (i, disease,
+                   f"{disease} with {zipf_choice(rng, FINDINGS)} and {zipf_choice(rng, FINDINGS)}",
+                   f"{zipf_choice(rng, DRUGS)} twice daily, {zipf_choice(rng, DRUGS)} as needed",
+                   rng.choice(NOTES) if rng.random() < 0.6 else None)
+
+    started = time.perf_counter()
+    conn.executemany(
+        'INSERT INTO treatment (appointment_id, disease, diagnosis, prescription, notes) VALUES (?, ?, ?, ?, ?)',
+        treatments()
+    )
+    conn.commit()
+    seconds = time.perf_counter() - started
+    conn.close()
+    return seconds
+
+
+def time_search(query, scope, repeat, rng):
+    times, found = [], 0
+    for _ in range(repeat):
+        kwargs = {}
+        if scope == 'doctor':
+            kwargs['doctor_id'] = rng.randint(1, DOCTORS)
+        elif scope == 'patient':
+            kwargs['patient_id'] = rng.randint(1, PATIENTS)
+        started = time.perf_counter()
+        found = len(search_treatments(query, limit=TREATMENT_PAGE_SIZE + 1, **kwargs))
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), max(times), found
+
+
+def time_inserts(count):
+    """ms per single Treatment add + commit, as treat_patient does it, with the trigger indexing it."""
+    times = []
+    for i in range(count):
+        started = time.perf_counter()
+        db.session.add(Treatment(appointment_id=i + 1, disease='influenza', diagnosis='fever',
+                                 prescription='paracetamol', notes='benchmark'))
+        db.session.commit()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+    print(f"Building {args.rows} treatments in {DB_PATH} ...")
+    load_seconds = build(DB_PATH, args.rows)
+    print(f"loaded through the triggers in {load_seconds:.1f}s ({args.rows / load_seconds:.0f} treatments/s)")
+
+    with app.app_context():
+        started = time.perf_counter()
+        rebuild_treatment_index()
+        print(f"rebuild_treatment_index() in {time.perf_counter() - started:.1f}s")
+        print(f"database file {os.path.getsize(DB_PATH) / 2 ** 20:.0f} MB")
+
+        rng = random.Random(7)
+        print(f"\n{'search (one page of ' + str(TREATMENT_PAGE_SIZE) + ')':34} {'median ms':>10} {'max ms':>10} {'rows':>6}")
+        for label, query, scope in SEARCHES:
+            search_treatments(query, limit=1)  # warm the page cache
+            median, worst, found = time_search(query, scope, args.repeat, rng)
+            print(f"{label:34} {median:10.2f} {worst:10.2f} {found:6}")
+
+        print(f"\nrecording one treatment (add + commit, indexed by trigger): {time_inserts(50):.2f} ms median")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Regression check: the dashboards, the admin appointment list and doctor page must run a fixed number of
+SQL statements however many appointments they show (no N+1 lazy loads per row).
+
+Seeds a throwaway database twice, with FEW and then MANY appointments per listing (every row
+with a different doctor/patient, so lazy loads can't be served from the identity map),
+requests each page as its role and reads the count from the X-Query-Count header
+(perf.py). Exits 1 if a page's count grows with the data or differs from EXPECTED.
+
+    python benchmarks/check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+
+Config.WTF_CSRF_ENABLED = False
+Config.PERF_HEADERS = True
+Config.PASSWORD_HASH_WORKERS = 0
+
+FEW, MANY = 3, 30
+PASSWORD_HASH = 'pbkdf2:sha256:1000'
+
+# Statements per page once the session's identity and the doctor's fragments (fragments.py) are cached,
+# counting the user loader's check that the user still exists; update deliberately when a page changes
+EXPECTED = {
+    ('admin@example.com', '/admin/dashboard'): 5,
+    ('admin@example.com', '/admin/appointments'): 3,
+    ('admin@example.com', '/admin/doctor/1'): 8,  # doctor 0's history
+    ('doc0@example.com', '/doctor/dashboard'): 4,
+    ('pat0@example.com', '/patient/dashboard'): 5,
+}
+
+
+def seed(app, n):
+    """Doctor 0 and patient 0 each get n upcoming and n completed appointments, all with
+    different counterparts; admin's today list gets n rows between other pairs."""
+    from database import db
+    from migrations import init_db
+    from models import User, Doctor, Patient, Appointment, AppointmentStatus, Treatment
+    from werkzeug.security import generate_password_hash
+
+    with app.app_context():
+        init_db()
+        password = generate_password_hash('pw', PASSWORD_HASH)
+        db.session.add(User(username='admin', name='Admin', email='admin@example.com', password=password, role='Admin'))
+        doctors, patients = [], []
+        for i in range(2 * n + 1):
+            doctor_user = User(username=f'doc{i}', name=f'Doctor {i}', email=f'doc{i}@example.com',
+                               password=password, role='Doctor')
+            patient_user = User(username=f'pat{i}', name=f'Patient {i}', email=f'pat{i}@example.com',
+                                password=password, role='Patient')
+            db.session.add_all([doctor_user, patient_user])
+            db.session.flush()
+            doctor = Doctor(user_id=doctor_user.id, specialization='General')
+            patient = Patient(user_id=patient_user.id, dob=date(1990, 1, 1), phone_number='0')
+            db.session.add_all([doctor, patient])
+            doctors.append(doctor)
+            patients.append(patient)
+        db.session.flush()
+
+        today = date.today()
+        appointments = []
+        for i in range(1, n + 1):
+            slot = time(8 + i // 4, 15 * (i % 4))
+            later, earlier = today + timedelta(days=i), today - timedelta(days=i)
+            appointments += [
+                # doctor 0's upcoming and completed lists
+                Appointment(doctor_id=doctors[0].id, patient_id=patients[i].id, date=later, time=slot, problem='p'),
+                Appointment(doctor_id=doctors[0].id, patient_id=patients[i].id, date=earlier, time=slot, problem='p',
+                            status=AppointmentStatus.COMPLETED),
+                # patient 0's upcoming and past lists
+                Appointment(doctor_id=doctors[i].id, patient_id=patients[0].id, date=later, time=slot, problem='p'),
+                Appointment(doctor_id=doctors[i].id, patient_id=patients[0].id, date=earlier, time=slot, problem='p',
+                            status=AppointmentStatus.COMPLETED, rating=4, remarks='ok'),
+                # admin's today list
+                Appointment(doctor_id=doctors[n + i].id, patient_id=patients[n + i].id, date=today, time=slot, problem='p'),
+            ]
+        db.session.add_all(appointments)
+        db.session.flush()
+        db.session.add_all([Treatment(appointment_id=appt.id, disease='d', diagnosis='x', prescription='y')
+                            for appt in appointments if appt.status == AppointmentStatus.COMPLETED])
+        db.session.commit()
+
+
+def measure(n):
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'counts.db')}"
+    from app import create_app
+    app = create_app()
+    seed(app, n)
+
+    counts = {}
+    clients = {}
+    for email, url in EXPECTED:
+        client = clients.get(email)
+        if client is None:
+            client = clients[email] = app.test_client()
+            client.post('/', data={'email': email, 'password': 'pw'})
+        client.get(url)  # the first request after login fills the identity cache
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} as {email} returned {response.status_code}')
+        counts[email, url] = int(response.headers['X-Query-Count'])
+    return counts
+
+
+def main():
+    few, many = measure(FEW), measure(MANY)
+    failed = False
+    print(f"{'page':<45} {FEW:>4} rows {MANY:>4} rows {'expected':>9}")
+    for (email, url), expected in EXPECTED.items():
+        key = (email, url)
+        ok = few[key] == many[key] == expected
+        failed |= not ok
+        print(f"{url + ' (' + email.split('@')[0] + ')':<45} {few[key]:>9} {many[key]:>9} {expected:>9}"
+              + ('' if ok else '  FAIL'))
+    if failed:
+        print('\nQuery counts changed: look for a lazy load per row (see /admin/perf) or update EXPECTED.')
+        sys.exit(1)
+    print('\nOK: query counts are fixed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+Requests/sec for the login, patient dashboard and booking flows against a pre-forked
+server with 1, 4 and 8 worker processes, on a throwaway SQLite database configured the
+same way as production (WAL etc., see Config.SQLITE_PRAGMAS).
+
+Each worker is a forked process running the app in werkzeug's threaded server on a shared
+listening socket, which is how gunicorn's sync/gthread workers share a port. To measure a
+real gunicorn instead, start it on the seeded database and pass its URL:
+
+    python benchmarks/load_test.py                    # 1, 4 and 8 workers, 5s per flow
+    python benchmarks/load_test.py --workers 2 --seconds 10 --clients 32
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --db /path/to/seeded.db
+
+Flows (each counted as one request; the form GETs that fetch a CSRF token are extra):
+    login      GET / then POST / with a patient's credentials
+    dashboard  GET /patient/dashboard while logged in
+    booking    GET the booking form, then POST a booking for a free slot
+"""
+import argparse
+import http.client
+import logging
+import os
+import re
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, time as dtime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PASSWORD = 'pw'
+DOCTORS = 20
+CSRF = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"|value="([^"]+)"[^>]*name="csrf_token"')
+
+
+def seed(patients):
+    """Create patients, doctors with a full weekly schedule, return (patient emails, doctor ids)."""
+    from app import create_app
+    from database import db
+    from migrations import init_db
+    from models import User, Doctor, Patient, DayOfWeek
+    from passwords import password_hasher
+    from schedule_writer import write_weekly_schedules
+    from slot_grid import SlotGrid
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        hashed = password_hasher.hash(PASSWORD)
+        emails = []
+        for i in range(patients):
+            user = User(username=f'loadpat{i}', name=f'Load Patient {i}', email=f'loadpat{i}@example.com',
+                        password=hashed, role='Patient')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Patient(user_id=user.id, dob=date(1990, 1, 1), phone_number='0'))
+            emails.append(user.email)
+        doctor_ids = []
+        for i in range(DOCTORS):
+            user = User(username=f'loaddoc{i}', name=f'Load Doctor {i}', email=f'loaddoc{i}@example.com',
+                        password=hashed, role='Doctor')
+            db.session.add(user)
+            db.session.flush()
+            doctor = Doctor(user_id=user.id, specialization='General')
+            db.session.add(doctor)
+            db.session.flush()
+            doctor_ids.append(doctor.id)
+        write_weekly_schedules({doctor_id: {day: SlotGrid.spaced(0, 24 * 60) for day in DayOfWeek} for doctor_id in doctor_ids})
+        db.session.commit()
+        db.engine.dispose()
+    return emails, doctor_ids
+
+
+def serve(workers, port):
+    """Fork `workers` processes serving the app on one listening socket; returns their pids."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(256)
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+            try:
+                from werkzeug.serving import make_server
+                from app import create_app
+                logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no access log
+                from passwords import password_hasher
+                server = make_server('127.0.0.1', port, create_app(), threaded=True, fd=listener.fileno())
+                server.serve_forever()
+            finally:
+                # os._exit skips atexit, so stop this worker's password pool by hand
+                password_hasher.shutdown(wait=True)
+                os._exit(0)
+        pids.append(pid)
+    listener.close()
+    return pids
+
+
+class Client:
+    """One browser: a cookie and a connection, no redirect following."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        connection.close()
+        return response.status, data.decode('utf-8', 'replace')
+
+    def csrf(self, path):
+        status, html = self.request('GET', path)
+        match = CSRF.search(html)
+        return match and (match.group(1) or match.group(2))
+
+    def login(self, email):
+        token = self.csrf('/')
+        status, _ = self.request('POST', '/', {'csrf_token': token, 'email': email, 'password': PASSWORD})
+        return status == 302
+
+
+def make_slots(doctor_ids):
+    """An endless supply of distinct (doctor, date, time) bookings."""
+    day = date.today() + timedelta(days=1)
+    while True:
+        for hour in range(24):
+            for minute in (0, 30):
+                for doctor_id in doctor_ids:
+                    yield doctor_id, day, dtime(hour, minute)
+        day += timedelta(days=1)
+
+
+def run_flow(flow, base_url, emails, slots, seconds):
+    stop = threading.Event()
+    lock = threading.Lock()
+    done = [0, 0]  # ok, failed
+
+    def worker(email):
+        client = Client(base_url)
+        if flow != 'login' and not client.login(email):
+            raise RuntimeError(f'could not log in as {email}')
+        while not stop.is_set():
+            if flow == 'login':
+                ok = client.login(email)
+                client.request('GET', '/logout')
+            elif flow == 'dashboard':
+                ok = client.request('GET', '/patient/dashboard')[0] == 200
+            else:
+                with lock:
+                    doctor_id, day, slot = next(slots)
+                token = client.csrf('/patient/appointment/book')
+                status, _ = client.request('POST', '/patient/appointment/book', {
+                    'csrf_token': token, 'doctor_id': doctor_id, 'date': day.isoformat(),
+                    'time': slot.strftime('%H:%M'), 'problem': 'load test', 'submit': 'Book Appointment'
+                })
+                ok = status == 302
+            with lock:
+                done[0 if ok else 1] += 1
+
+    threads = [threading.Thread(target=worker, args=(email,), daemon=True) for email in emails]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return done[0] / seconds, done[1]
+
+
+def wait_for(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            Client(base_url).request('GET', '/')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {base_url} did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--clients', type=int, default=16, help='concurrent simulated users')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--flows', nargs='+', default=['login', 'dashboard', 'booking'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help='benchmark an already running server instead')
+    parser.add_argument('--db', help='SQLite file to seed (default: a temporary one)')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'load.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    emails, doctor_ids = seed(args.clients)
+    slots = make_slots(doctor_ids)
+
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients, {args.seconds:.0f}s per flow, db {db_path}")
+    print(f"{'workers':>8} " + ' '.join(f"{flow + ' req/s':>16}" for flow in args.flows))
+    for workers in ([None] if args.url else args.workers):
+        base_url = args.url or f'http://127.0.0.1:{args.port}'
+        pids = [] if args.url else serve(workers, args.port)
+        try:
+            wait_for(base_url)
+            cells = []
+            for flow in args.flows:
+                rate, failed = run_flow(flow, base_url, emails, slots, args.seconds)
+                cells.append(f"{rate:>10.1f}" + (f" ({failed} err)" if failed else ' ' * 6))
+            print(f"{workers or 'ext':>8} " + ' '.join(cells))
+        finally:
+            for pid in pids:
+                os.kill(pid, signal.SIGTERM)
+            for pid in pids:
+                os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Fires many concurrent bookings at one slot through booking.reserve_slot() and checks
+that exactly one of them wins.
+
+    python benchmarks/stress_double_booking.py --attempts 300 --threads 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+
+Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}"
+# Writers queue on SQLite's database lock; give them time instead of failing with "database is locked"
+Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+
+from app import create_app
+from database import db
+from models import User, Doctor, Patient, Appointment, AppointmentStatus
+from booking import reserve_slot
+from migrations import init_db
+
+
+def seed(app, patients):
+    with app.app_context():
+        init_db()
+        doctor_user = User(username='stress_doc', name='Stress Doctor', email='stress_doc@example.com',
+                           password='x', role='Doctor')
+        db.session.add(doctor_user)
+        db.session.flush()
+        doctor = Doctor(user_id=doctor_user.id, specialization='General')
+        db.session.add(doctor)
+        patient_ids = []
+        for i in range(patients):
+            user = User(username=f'stress_pat{i}', name=f'Patient {i}', email=f'stress_pat{i}@example.com',
+                        password='x', role='Patient')
+            db.session.add(user)
+            db.session.flush()
+            patient = Patient(user_id=user.id, dob=date(1990, 1, 1), phone_number='0')
+            db.session.add(patient)
+            db.session.flush()
+            patient_ids.append(patient.id)
+        db.session.commit()
+        return doctor.id, patient_ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    app = create_app()
+    doctor_id, patient_ids = seed(app, args.attempts)
+    slot_date, slot_time = date.today() + timedelta(days=1), time(10, 0)
+
+    def attempt(patient_id):
+        with app.app_context():
+            try:
+                return 'booked' if reserve_slot(patient_id, doctor_id, slot_date, slot_time, 'stress') else 'taken'
+            except Exception as e:
+                db.session.rollback()
+                return f'error: {type(e).__name__}'
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        outcomes = list(pool.map(attempt, patient_ids))
+
+    counts = {outcome: outcomes.count(outcome) for outcome in set(outcomes)}
+    print(f"{args.attempts} attempts on {args.threads} threads: {counts}")
+
+    with app.app_context():
+        booked = Appointment.query.filter_by(
+            doctor_id=doctor_id, date=slot_date, time=slot_time, status=AppointmentStatus.BOOKED
+        ).count()
+
+    assert counts.get('booked') == 1, f"expected exactly one successful booking, got {counts}"
+    assert counts.get('taken') == args.attempts - 1, f"unexpected failures: {counts}"
+    assert booked == 1, f"expected one BOOKED row, found {booked}"
+    print("OK: exactly one booking succeeded")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import Doctor, Appointment, AppointmentStatus
+from slot_grid import DEFAULT_SLOT_MINUTES, minute_of_day
+from intervals import booked_intervals
+
+
+def doctor_slot_minutes(doctor_id):
+    """The doctor's slot length, for stamping on a new or moved appointment."""
+    minutes = db.session.query(Doctor.slot_minutes).filter(Doctor.id == doctor_id).scalar()
+    return minutes or DEFAULT_SLOT_MINUTES
+
+
+def overlapping_booking(appointment):
+    """Another BOOKED appointment of the same doctor and date whose slot overlaps this one's, or None."""
+    rows = Appointment.query.with_entities(Appointment.time, Appointment.slot_minutes).filter(
+        Appointment.doctor_id == appointment.doctor_id,
+        Appointment.date == appointment.date,
+        Appointment.status == AppointmentStatus.BOOKED,
+        Appointment.id != appointment.id
+    ).all()
+    start = minute_of_day(appointment.time)
+    return booked_intervals(rows).overlapping(start, start + appointment.slot_minutes)
+
+
+def reserve_slot(patient_id, doctor_id, appt_date, appt_time, problem=None):
+    """
+    Book a slot in a single transaction. The partial unique index on BOOKED appointments
+    makes the INSERT itself the availability check, so concurrent requests for the same
+    slot can't both succeed. Returns the new Appointment, or None if the slot is taken.
+
+    Slots of different lengths can overlap without sharing a start time (a 10:00 booking
+    made at 30 minutes and a 10:15 one at 15), so the day's bookings are checked too, after
+    the INSERT: by then this transaction holds SQLite's write lock and no other booking can
+    land in between.
+    """
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        date=appt_date,
+        time=appt_time,
+        slot_minutes=doctor_slot_minutes(doctor_id),
+        problem=problem,
+        status=AppointmentStatus.BOOKED
+    )
+    db.session.add(appointment)
+    try:
+        db.session.flush()
+        if overlapping_booking(appointment) is not None:
+            db.session.rollback()
+            return None
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return appointment
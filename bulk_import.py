@@ -0,0 +1,432 @@
+import csv
+import json
+import os
+import re
+import time as timer
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, select
+from database import db
+from models import (User, Doctor, Patient, Appointment, AppointmentStatus, Treatment, DayOfWeek,
+                    ImportCheckpoint)
+from slot_grid import SlotGrid, SLOT_LENGTHS, DEFAULT_SLOT_MINUTES, minute_of_day
+from intervals import IntervalSet, check_overlaps
+from passwords import hash_passwords
+from schedule_writer import write_weekly_schedules, slot_lengths
+from schedule_version import bump_schedule_versions
+from doctor_stats import apply_stat_deltas
+from directory import invalidate_directory
+
+BATCH_SIZE = 1000
+
+ImportResult = namedtuple('ImportResult', ['records', 'inserted', 'rejected', 'errors', 'resumed_from', 'seconds'])
+
+user_table = User.__table__
+doctor_table = Doctor.__table__
+patient_table = Patient.__table__
+appointment_table = Appointment.__table__
+treatment_table = Treatment.__table__
+
+
+def read_records(path):
+    """Records from a .csv (with a header row), .json (a list of objects) or .ndjson/.jsonl file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ('.csv', '.json', '.ndjson', '.jsonl'):
+        raise ValueError(f"unsupported file type '{ext}', use .csv, .json or .ndjson")
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if ext == '.csv':
+            yield from csv.DictReader(f)
+        elif ext == '.json':
+            yield from json.load(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+## FIELD PARSING ##
+
+def _text(record, field, max_length=None, required=True):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise ValueError(f"'{field}' is required")
+        return None
+    if max_length and len(value) > max_length:
+        raise ValueError(f"'{field}' is longer than {max_length} characters")
+    return value
+
+
+def _date(record, field):
+    value = _text(record, field)
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"'{field}' must be YYYY-MM-DD, got '{value}'")
+
+
+def _time(record, field):
+    value = _text(record, field)
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            pass
+    raise ValueError(f"'{field}' must be HH:MM, got '{value}'")
+
+
+def _slot_minutes(record):
+    value = _text(record, 'slot_minutes', required=False)
+    if value is None:
+        return DEFAULT_SLOT_MINUTES
+    if not value.isdigit() or int(value) not in SLOT_LENGTHS:
+        raise ValueError(f"'slot_minutes' must be one of {', '.join(map(str, SLOT_LENGTHS))}")
+    return int(value)
+
+
+def _list(value):
+    """A JSON list, or a CSV cell like 'Monday;Wednesday' / '09:00, 09:30'."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item for item in re.split(r'[;,\s]+', str(value)) if item]
+
+
+def _day(name):
+    try:
+        return DayOfWeek[name.strip().upper()]
+    except KeyError:
+        raise ValueError(f"unknown day '{name}'")
+
+
+def _weekly_schedule(record):
+    """{DayOfWeek: SlotGrid} from either 'schedule': {"MONDAY": [...]} or 'days' + 'slots'."""
+    schedule = record.get('schedule')
+    if isinstance(schedule, str) and schedule.strip():
+        schedule = json.loads(schedule)
+    if schedule:
+        return {_day(day): SlotGrid.from_labels(_list(labels)) for day, labels in schedule.items()}
+    grid = SlotGrid.from_labels(_list(record.get('slots')))
+    return {_day(day): grid for day in _list(record.get('days'))}
+
+
+def _parse(batch, parse_record):
+    rows, errors = [], []
+    for number, record in batch:
+        try:
+            rows.append((number, parse_record(record)))
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append((number, str(e)))
+    return rows, errors
+
+
+## USERS ##
+
+def _parse_user(record):
+    role = _text(record, 'role').capitalize()
+    if role not in ('Patient', 'Doctor'):
+        raise ValueError("'role' must be Patient or Doctor")
+    return {
+        'username': _text(record, 'username', 50),
+        'name': _text(record, 'name', 50),
+        'email': _text(record, 'email', 50),
+        'password': _text(record, 'password'),
+        'role': role
+    }
+
+
+def validate_users(batch):
+    rows, errors = _parse(batch, _parse_user)
+    usernames = set(db.session.scalars(select(User.username).where(User.username.in_([row['username'] for _, row in rows]))))
+    emails = set(db.session.scalars(select(User.email).where(User.email.in_([row['email'] for _, row in rows]))))
+    valid = []
+    for number, row in rows:
+        if row['username'] in usernames:
+            errors.append((number, f"username '{row['username']}' already exists"))
+        elif row['email'] in emails:
+            errors.append((number, f"email '{row['email']}' already exists"))
+        else:
+            usernames.add(row['username'])
+            emails.add(row['email'])
+            valid.append(row)
+    return valid, errors
+
+
+def write_users(rows, pool):
+    hashes = hash_passwords([row['password'] for row in rows], pool)
+    db.session.execute(insert(user_table), [dict(row, password=hashed) for row, hashed in zip(rows, hashes)])
+    return len(rows)
+
+
+## PROFILES ##
+
+def _profile_owners(emails, profile):
+    """{email: (user_id, role, existing profile id or None)} for the users behind a batch of profiles."""
+    found = db.session.execute(
+        select(User.email, User.id, User.role, profile.id)
+        .outerjoin(profile, profile.user_id == User.id)
+        .where(User.email.in_(emails))
+    ).all()
+    return {email: (user_id, user_role, profile_id) for email, user_id, user_role, profile_id in found}
+
+
+def _attach_owners(rows, errors, role, profile):
+    owners = _profile_owners([row['email'] for _, row in rows], profile)
+    claimed = set()
+    valid = []
+    for number, row in rows:
+        owner = owners.get(row['email'])
+        if owner is None:
+            errors.append((number, f"no user with email '{row['email']}'"))
+        elif owner[1] != role:
+            errors.append((number, f"user '{row['email']}' is not a {role}"))
+        elif owner[2] is not None or owner[0] in claimed:
+            errors.append((number, f"user '{row['email']}' already has a {role.lower()} profile"))
+        else:
+            claimed.add(owner[0])
+            row = dict(row, user_id=owner[0])
+            del row['email']
+            valid.append(row)
+    return valid, errors
+
+
+def _parse_patient(record):
+    return {
+        'email': _text(record, 'email'),
+        'dob': _date(record, 'dob'),
+        'phone_number': _text(record, 'phone_number', 15)
+    }
+
+
+def validate_patients(batch):
+    rows, errors = _parse(batch, _parse_patient)
+    return _attach_owners(rows, errors, 'Patient', Patient)
+
+
+def write_patients(rows, pool):
+    db.session.execute(insert(patient_table), rows)
+    return len(rows)
+
+
+def _parse_doctor(record):
+    minutes = _slot_minutes(record)
+    schedule = _weekly_schedule(record)
+    for grid in schedule.values():
+        check_overlaps(grid, minutes)
+    return {
+        'email': _text(record, 'email'),
+        'specialization': _text(record, 'specialization', 50),
+        'slot_minutes': minutes,
+        'schedule': schedule
+    }
+
+
+def validate_doctors(batch):
+    rows, errors = _parse(batch, _parse_doctor)
+    return _attach_owners(rows, errors, 'Doctor', Doctor)
+
+
+def write_doctors(rows, pool):
+    doctor_ids = db.session.execute(
+        insert(doctor_table).returning(doctor_table.c.id, sort_by_parameter_order=True),
+        [{'user_id': row['user_id'], 'specialization': row['specialization'], 'slot_minutes': row['slot_minutes']}
+         for row in rows]
+    ).scalars().all()
+    write_weekly_schedules({doctor_id: row['schedule'] for doctor_id, row in zip(doctor_ids, rows)})
+    return len(rows)
+
+
+## APPOINTMENTS ##
+
+TREATMENT_FIELDS = ('disease', 'diagnosis', 'prescription', 'notes')
+
+
+def _parse_appointment(record):
+    status = _text(record, 'status', required=False) or AppointmentStatus.BOOKED.name
+    try:
+        status = AppointmentStatus[status.upper()]
+    except KeyError:
+        raise ValueError(f"unknown status '{status}'")
+    rating = _text(record, 'rating', required=False)
+    if rating is not None:
+        if not rating.isdigit() or not 1 <= int(rating) <= 5:
+            raise ValueError("'rating' must be 1 to 5")
+        rating = int(rating)
+    treatment = {field: _text(record, field, required=False) for field in TREATMENT_FIELDS}
+    if any(treatment.values()) and not treatment['disease']:
+        raise ValueError("'disease' is required when treatment fields are given")
+    return {
+        'doctor_email': _text(record, 'doctor_email'),
+        'patient_email': _text(record, 'patient_email'),
+        'date': _date(record, 'date'),
+        'time': _time(record, 'time'),
+        'status': status,
+        'problem': _text(record, 'problem', 300, required=False),
+        'remarks': _text(record, 'remarks', required=False),
+        'rating': rating,
+        'treatment': treatment if treatment['disease'] else None
+    }
+
+
+def _ids_by_email(emails, profile):
+    return dict(db.session.execute(
+        select(User.email, profile.id).join(profile, profile.user_id == User.id).where(User.email.in_(emails))
+    ).all())
+
+
+def validate_appointments(batch):
+    rows, errors = _parse(batch, _parse_appointment)
+    doctors = _ids_by_email({row['doctor_email'] for _, row in rows}, Doctor)
+    patients = _ids_by_email({row['patient_email'] for _, row in rows}, Patient)
+
+    resolved = []
+    for number, row in rows:
+        if row['doctor_email'] not in doctors:
+            errors.append((number, f"no doctor with email '{row['doctor_email']}'"))
+        elif row['patient_email'] not in patients:
+            errors.append((number, f"no patient with email '{row['patient_email']}'"))
+        else:
+            resolved.append((number, row, doctors[row['doctor_email']], patients[row['patient_email']]))
+
+    # Each appointment takes the doctor's current slot length
+    minutes_by_doctor = slot_lengths({doctor_id for _, _, doctor_id, _ in resolved})
+
+    # Booked slots must not overlap (and so stay unique for uq_appointment_booked_slot), in the
+    # batch and against the database: one IntervalSet per doctor and date
+    booked = [(doctor_id, row['date']) for _, row, doctor_id, _ in resolved if row['status'] == AppointmentStatus.BOOKED]
+    taken = defaultdict(IntervalSet)
+    if booked:
+        existing = db.session.execute(
+            select(Appointment.doctor_id, Appointment.date, Appointment.time, Appointment.slot_minutes).where(
+                Appointment.status == AppointmentStatus.BOOKED,
+                Appointment.doctor_id.in_({doctor_id for doctor_id, _ in booked}),
+                Appointment.date.in_({day for _, day in booked})
+            )
+        ).all()
+        for doctor_id, day, t, minutes in existing:
+            start = minute_of_day(t)
+            taken[(doctor_id, day)].add(start, start + minutes)
+
+    valid = []
+    for number, row, doctor_id, patient_id in resolved:
+        minutes = minutes_by_doctor[doctor_id]
+        if row['status'] == AppointmentStatus.BOOKED:
+            start = minute_of_day(row['time'])
+            clash = taken[(doctor_id, row['date'])].add(start, start + minutes)
+            if clash is not None:
+                at = '%02d:%02d' % divmod(clash[0], 60)
+                errors.append((number, f"overlaps the doctor's {at} booking on {row['date']}"))
+                continue
+        valid.append({
+            'doctor_id': doctor_id,
+            'patient_id': patient_id,
+            'date': row['date'],
+            'time': row['time'],
+            'slot_minutes': minutes,
+            'status': row['status'],
+            'problem': row['problem'],
+            'remarks': row['remarks'],
+            'rating': row['rating'],
+            'treatment': row['treatment']
+        })
+    return valid, errors
+
+
+def write_appointments(rows, pool):
+    appointment_ids = db.session.execute(
+        insert(appointment_table).returning(appointment_table.c.id, sort_by_parameter_order=True),
+        [{key: value for key, value in row.items() if key != 'treatment'} for row in rows]
+    ).scalars().all()
+    treatments = [
+        dict(row['treatment'], appointment_id=appointment_id)
+        for appointment_id, row in zip(appointment_ids, rows) if row['treatment']
+    ]
+    if treatments:
+        db.session.execute(insert(treatment_table), treatments)
+
+    # Core inserts skip the ORM listeners, so keep the doctor stats and schedule versions in step here
+    deltas = defaultdict(Counter)
+    for row in rows:
+        deltas[(row['doctor_id'], row['date'])][row['status']] += 1
+    connection = db.session.connection()
+    apply_stat_deltas(connection, deltas)
+    bump_schedule_versions(connection, {row['doctor_id'] for row in rows})
+    return len(rows)
+
+
+IMPORTERS = {
+    'users': (validate_users, write_users),
+    'patients': (validate_patients, write_patients),
+    'doctors': (validate_doctors, write_doctors),
+    'appointments': (validate_appointments, write_appointments),
+}
+
+
+## DRIVER ##
+
+def _save_checkpoint(checkpoint, source, file_size, records_done):
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source=source)
+        db.session.add(checkpoint)
+    checkpoint.file_size = file_size
+    checkpoint.records_done = records_done
+    checkpoint.updated_at = datetime.now()
+    return checkpoint
+
+
+def run_import(kind, path, batch_size=BATCH_SIZE, pool=None, restart=False, progress=None):
+    """
+    Import `path` as `kind` (users, patients, doctors or appointments), batch_size records per
+    transaction. Each batch is validated with a handful of queries, invalid records are reported
+    and skipped, and the rest go in as bulk Core inserts. The checkpoint commits with the batch,
+    so running the same import again continues after the last committed batch.
+    progress(records_done, inserted, rejected, records_per_second) is called after each batch.
+    """
+    validate, write = IMPORTERS[kind]
+    source = f"{kind}:{os.path.abspath(path)}"
+    file_size = os.path.getsize(path)
+
+    checkpoint = ImportCheckpoint.query.filter_by(source=source).first()
+    resumed_from = 0
+    if checkpoint and not restart:
+        if checkpoint.file_size != file_size:
+            raise ValueError(f"{path} changed since the interrupted import; rerun with --restart to start over")
+        resumed_from = checkpoint.records_done
+
+    records = islice(enumerate(read_records(path), 1), resumed_from, None)
+    started = timer.perf_counter()
+    processed = inserted = 0
+    errors = []
+
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        try:
+            rows, batch_errors = validate(batch)
+            batch_inserted = write(rows, pool) if rows else 0
+            checkpoint = _save_checkpoint(checkpoint, source, file_size, batch[-1][0])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise RuntimeError(f"batch starting at record {batch[0][0]} failed, nothing from it was saved: {e}") from e
+
+        processed += len(batch)
+        inserted += batch_inserted
+        errors.extend(sorted(batch_errors))
+        if progress:
+            progress(batch[-1][0], inserted, len(errors), processed / (timer.perf_counter() - started))
+
+    if kind == 'doctors' and inserted:
+        invalidate_directory()
+    return ImportResult(
+        records=processed,
+        inserted=inserted,
+        rejected=len(errors),
+        errors=errors,
+        resumed_from=resumed_from,
+        seconds=timer.perf_counter() - started
+    )
@@ -0,0 +1,191 @@
+import json
+import click
+from flask.cli import with_appcontext
+from database import db
+from models import User, Doctor, DayOfWeek
+from migrations import init_db
+from slot_grid import SlotGrid
+from schedule_writer import apply_weekly_schedules, write_weekly_schedules, slot_lengths
+from intervals import check_overlaps
+from doctor_stats import rebuild_doctor_stats
+from summaries import build_summaries, CHUNK_SIZE
+from export import export_chunks, parse_export_filters, FORMATS as EXPORT_FORMATS
+from bulk_import import run_import, IMPORTERS, BATCH_SIZE
+from passwords import hashing_pool, password_hasher
+from search import rebuild_search_index
+
+
+def load_schedule_template(path):
+    """
+    A template is JSON, either per day:
+        {"MONDAY": ["09:00", "09:30"], "TUESDAY": ["14:00"]}
+    or the same slots on several days, like the setup form:
+        {"days": ["MONDAY", "FRIDAY"], "slots": ["09:00", "09:30"]}
+    Days left out are cleared.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if 'days' in data or 'slots' in data:
+        grid = SlotGrid.from_labels(data.get('slots', []))
+        return {DayOfWeek[name.upper()]: grid for name in data.get('days', [])}
+    return {DayOfWeek[name.upper()]: SlotGrid.from_labels(labels) for name, labels in data.items()}
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the tables, or bring an existing database up to date with the models."""
+    init_db()
+    click.echo('Database is up to date.')
+
+
+@click.command('seed-admin')
+@click.option('--email', default='admin123@gmail.com', show_default=True)
+@click.option('--password', default='admin_password', show_default=True, help='Change it after the first login.')
+@click.option('--username', default='admin', show_default=True)
+@click.option('--name', default='Administrator', show_default=True)
+@with_appcontext
+def seed_admin(email, password, username, name):
+    """Create the admin account, unless an admin already exists."""
+    if User.query.filter_by(role='Admin').first():
+        click.echo('An admin user already exists.')
+        return
+    db.session.add(User(username=username, name=name, email=email,
+                        password=password_hasher.hash(password), role='Admin'))
+    db.session.commit()
+    click.echo('Admin user added successfully.')
+
+
+@click.command('apply-schedule-template')
+@click.argument('template', type=click.Path(exists=True, dir_okay=False))
+@click.option('--doctor', 'doctor_ids', type=int, multiple=True, help='Doctor id (repeatable).')
+@click.option('--specialization', help='Every doctor with this specialization.')
+@click.option('--all', 'all_doctors', is_flag=True, help='Every doctor.')
+@click.option('--dry-run', is_flag=True, help='Report what would change without writing.')
+@with_appcontext
+def apply_schedule_template(template, doctor_ids, specialization, all_doctors, dry_run):
+    """Replace the weekly schedule of the selected doctors with TEMPLATE."""
+    try:
+        schedule = load_schedule_template(template)
+    except (KeyError, ValueError) as e:
+        raise click.BadParameter(f"bad template: {e}", param_hint='TEMPLATE')
+
+    query = db.session.query(Doctor.id)
+    if doctor_ids:
+        query = query.filter(Doctor.id.in_(doctor_ids))
+    elif specialization:
+        query = query.filter(db.func.lower(Doctor.specialization) == specialization.strip().lower())
+    elif not all_doctors:
+        raise click.UsageError('pick doctors with --doctor, --specialization or --all')
+
+    targets = [doctor_id for (doctor_id,) in query.all()]
+    if not targets:
+        click.echo('No matching doctors.')
+        return
+
+    # The same labels can fit 15-minute slots and overlap as 30-minute ones
+    for minutes in set(slot_lengths(targets).values()):
+        try:
+            for grid in schedule.values():
+                check_overlaps(grid, minutes)
+        except ValueError as e:
+            raise click.BadParameter(f"bad template: {e}", param_hint='TEMPLATE')
+
+    schedules = {doctor_id: schedule for doctor_id in targets}
+    if dry_run:
+        inserted, deleted = write_weekly_schedules(schedules)
+        db.session.rollback()
+    else:
+        inserted, deleted = apply_weekly_schedules(schedules)
+    click.echo(f"{len(targets)} doctor(s): {inserted} slot(s) added, {deleted} removed"
+               + (" (dry run, nothing written)" if dry_run else ""))
+
+
+@click.command('rebuild-doctor-stats')
+@with_appcontext
+def rebuild_doctor_stats_command():
+    """Recount the per-doctor appointment stats from the appointment table."""
+    doctors = rebuild_doctor_stats()
+    click.echo(f"Rebuilt stats for {doctors} doctor(s).")
+
+
+@click.command('build-summaries')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Appointments read per query.')
+@with_appcontext
+def build_summaries_command(chunk_size):
+    """Rebuild the doctor/patient summary rollups (run nightly from cron)."""
+    run = build_summaries(chunk_size)
+    click.echo(f"Summarised {run.appointment_count} appointment(s) in {run.seconds}s.")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Refill the search indexes over users/patients/doctors and treatments."""
+    users, treatments = rebuild_search_index()
+    click.echo(f"Indexed {users} user(s) and {treatments} treatment(s).")
+
+
+@click.command('export-appointments')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--from', 'date_from', help='First date (YYYY-MM-DD).')
+@click.option('--to', 'date_to', help='Last date (YYYY-MM-DD).')
+@click.option('--doctor', 'doctor_id', type=int, help='Only this doctor id.')
+@click.option('--status', help='Booked, Completed or Cancelled.')
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8'), default='-', help='File to write (default stdout).')
+@with_appcontext
+def export_appointments_command(fmt, date_from, date_to, doctor_id, status, output):
+    """Stream appointments with their treatments as CSV or NDJSON."""
+    try:
+        filters = parse_export_filters(date_from, date_to, doctor_id, status)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    for chunk in export_chunks(fmt, **filters):
+        output.write(chunk)
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(list(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Records per transaction.')
+@click.option('--workers', type=int, help='Password hashing processes (default: one per CPU).')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an interrupted run and start from the top.')
+@click.option('--show-errors', default=20, show_default=True, help='How many rejected records to list.')
+@with_appcontext
+def import_data(kind, path, batch_size, workers, restart, show_errors):
+    """
+    Bulk import users, patients, doctors or appointments from a CSV/JSON/NDJSON file.
+    Import users first, then profiles (matched by email), then appointments.
+    """
+    def progress(records_done, inserted, rejected, rate):
+        click.echo(f"  record {records_done}: {inserted} inserted, {rejected} rejected ({rate:.0f} records/s)")
+
+    try:
+        if kind == 'users':
+            with hashing_pool(workers) as pool:
+                result = run_import(kind, path, batch_size, pool, restart, progress)
+        else:
+            result = run_import(kind, path, batch_size, None, restart, progress)
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(f"{e}. Rerun the same command to resume.")
+
+    if result.resumed_from:
+        click.echo(f"Resumed after record {result.resumed_from}.")
+    rate = result.records / result.seconds if result.seconds else 0
+    click.echo(f"{result.records} record(s) in {result.seconds:.1f}s ({rate:.0f} records/s): "
+               f"{result.inserted} inserted, {result.rejected} rejected.")
+    for number, message in result.errors[:show_errors]:
+        click.echo(f"  record {number}: {message}")
+    if result.rejected > show_errors:
+        click.echo(f"  ... and {result.rejected - show_errors} more")
+
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_admin)
+    app.cli.add_command(apply_schedule_template)
+    app.cli.add_command(rebuild_doctor_stats_command)
+    app.cli.add_command(build_summaries_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(export_appointments_command)
+    app.cli.add_command(import_data)
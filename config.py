@@ -1,4 +1,48 @@
+import os
+
+env = os.environ.get
+
+
 class Config:
-    SECRET_KEY = 'secretkey-avinash'
-    SQLALCHEMY_DATABASE_URI = "sqlite:///hospital.db"
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SECRET_KEY = env('SECRET_KEY', 'secretkey-avinash')
+    SQLALCHEMY_DATABASE_URI = env('DATABASE_URL', "sqlite:///hospital.db")
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool per worker process. SQLite file databases use a QueuePool, so these apply there too;
+    # an in-memory SQLite database has a single shared connection and no pool to size (see database.py)
+    DB_POOL_OPTIONS = {
+        'pool_size': int(env('DB_POOL_SIZE', 5)),
+        'max_overflow': int(env('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(env('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(env('DB_POOL_RECYCLE', 3600)),
+    }
+    # Run on every new SQLite connection (see database.py). WAL lets readers carry on while
+    # one process writes; busy_timeout (ms) makes a second writer wait instead of failing
+    SQLITE_PRAGMAS = {
+        'journal_mode': env('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': env('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(env('SQLITE_BUSY_TIMEOUT', 10000)),
+        'mmap_size': int(env('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(env('SQLITE_CACHE_SIZE', -32000)),  # negative = KiB, so 32 MB
+    }
+    # Flask-Login identity snapshots (see identity.py); TTL 0 disables the cache
+    IDENTITY_CACHE_SIZE = 1024
+    IDENTITY_CACHE_TTL = 300
+    # Doctor directory snapshot (see directory.py)
+    DIRECTORY_CACHE_TTL = 300
+    # Rendered doctor slot tables and upcoming lists (see fragments.py). FRAGMENT_CACHE_STORE is
+    # an optional SQLite file the workers share, e.g. /tmp/hospital-fragments.db
+    FRAGMENT_CACHE_SIZE = int(env('FRAGMENT_CACHE_SIZE', 512))
+    FRAGMENT_CACHE_TTL = int(env('FRAGMENT_CACHE_TTL', 600))
+    FRAGMENT_CACHE_STORE = env('FRAGMENT_CACHE_STORE', '')
+    # Password hashing (see passwords.py): a werkzeug method string such as 'scrypt:32768:8:1'
+    # or 'pbkdf2:sha256:600000'. Hashes made with other settings are upgraded on the next login
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    # Processes that hash/check passwords off the request thread; 0 does it inline
+    PASSWORD_HASH_WORKERS = int(env('PASSWORD_HASH_WORKERS', 2))
+    # Per-request SQL counters behind /admin/perf (see perf.py). PERF_HEADERS adds
+    # X-Query-Count etc. to every response; it is always on in debug mode
+    PERF_PROFILING = env('PERF_PROFILING', '1') == '1'
+    PERF_HEADERS = env('PERF_HEADERS', '0') == '1'
+    PERF_WINDOW = 500  # requests kept per endpoint for the percentiles
+    PERF_SLOW_QUERY_MS = int(env('PERF_SLOW_QUERY_MS', 100))
+    PERF_REPEAT_THRESHOLD = 5  # same statement this many times in one request = likely N+1
@@ -1,3 +1,30 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 
 db = SQLAlchemy()
+
+
+def uses_queue_pool(uri):
+    """False for in-memory SQLite, which gets one StaticPool connection and rejects pool sizing options."""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return True
+    return url.database not in (None, '', ':memory:') and url.query.get('mode') != 'memory'
+
+
+def pool_options(uri, options):
+    return dict(options or {}) if uses_queue_pool(uri) else {}
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Set PRAGMAs on every connection the engine opens; does nothing for other databases."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
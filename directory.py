@@ -0,0 +1,89 @@
+from collections import defaultdict, namedtuple
+from database import db
+from models import User, Doctor, DoctorAvailability, DayOfWeek
+from slot_grid import SlotGrid, SLOT_LABELS, SLOTS_PER_DAY, GRID_MINUTES, slot_index
+from cache import TTLCache
+
+DirectoryEntry = namedtuple('DirectoryEntry', ['id', 'name', 'specialization', 'days', 'slot_ranges', 'slot_minutes'])
+
+directory_cache = TTLCache(maxsize=1)
+
+
+def slot_ranges(grid, minutes):
+    """Collapse a grid of `minutes` long slots into 'HH:MM-HH:MM' ranges of back-to-back slots."""
+    step = minutes // GRID_MINUTES
+    ranges = []
+    start = previous = None
+    for i in grid:
+        if start is None:
+            start = i
+        elif i != previous + step:
+            ranges.append(f"{SLOT_LABELS[start]}-{SLOT_LABELS[(previous + step) % SLOTS_PER_DAY]}")
+            start = i
+        previous = i
+    if start is not None:
+        ranges.append(f"{SLOT_LABELS[start]}-{SLOT_LABELS[(previous + step) % SLOTS_PER_DAY]}")
+    return ranges
+
+
+def build_directory():
+    """Every doctor with name, specialization, working days (Monday first), slot ranges and slot length, in one query."""
+    rows = db.session.query(
+        Doctor.id,
+        User.name,
+        Doctor.specialization,
+        Doctor.slot_minutes,
+        DoctorAvailability.day,
+        DoctorAvailability.start_time
+    ).join(User, Doctor.user_id == User.id).outerjoin(
+        DoctorAvailability, DoctorAvailability.doctor_id == Doctor.id
+    ).order_by(User.name, Doctor.id).all()
+
+    doctors = {}
+    days = defaultdict(set)
+    slot_bits = defaultdict(int)
+    for doctor_id, name, specialization, minutes, day, start_time in rows:
+        doctors.setdefault(doctor_id, (name, specialization, minutes))
+        if day is not None:
+            days[doctor_id].add(day)
+            slot_bits[doctor_id] |= 1 << slot_index(start_time)
+
+    return [
+        DirectoryEntry(
+            id=doctor_id,
+            name=name,
+            specialization=specialization,
+            days=tuple(day for day in DayOfWeek if day in days[doctor_id]),
+            slot_ranges=tuple(slot_ranges(SlotGrid(slot_bits[doctor_id]), minutes)),
+            slot_minutes=minutes
+        )
+        for doctor_id, (name, specialization, minutes) in doctors.items()
+    ]
+
+
+def get_directory():
+    directory = directory_cache.get('directory')
+    if directory is None:
+        directory = build_directory()
+        directory_cache.put('directory', directory)
+    return directory
+
+
+def search_directory(specialization=None, day=None):
+    """Directory entries filtered by specialization (case-insensitive) and/or a DayOfWeek."""
+    entries = get_directory()
+    if specialization:
+        specialization = specialization.strip().lower()
+        entries = [e for e in entries if e.specialization.lower() == specialization]
+    if day:
+        entries = [e for e in entries if day in e.days]
+    return entries
+
+
+def specializations():
+    return sorted({e.specialization for e in get_directory()}, key=str.lower)
+
+
+def invalidate_directory():
+    """Call after a doctor's profile, weekly schedule or existence changes."""
+    directory_cache.invalidate('directory')
@@ -0,0 +1,144 @@
+from collections import Counter, defaultdict
+from sqlalchemy import case, delete, event, func, insert, inspect, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from database import db
+from models import Appointment, AppointmentStatus, Doctor, DoctorStats, DoctorDailyStats
+
+STATUS_COLUMNS = {
+    AppointmentStatus.BOOKED: 'booked_count',
+    AppointmentStatus.COMPLETED: 'completed_count',
+    AppointmentStatus.CANCELLED: 'cancelled_count',
+}
+
+totals_table = DoctorStats.__table__
+daily_table = DoctorDailyStats.__table__
+appointment_table = Appointment.__table__
+
+
+def _upsert_many(connection, table, key_columns, rows):
+    """Add each row's counts to the matching row of `table`, creating missing rows; one executemany."""
+    if not rows:
+        return
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + stmt.excluded[column] for column in STATUS_COLUMNS.values()}
+    )
+    connection.execute(stmt, rows)
+
+
+def apply_stat_deltas(connection, deltas):
+    """deltas: {(doctor_id, date): Counter({AppointmentStatus: +n/-n})}"""
+    daily_rows = []
+    totals = defaultdict(Counter)
+    for (doctor_id, day), by_status in deltas.items():
+        counts = {STATUS_COLUMNS[status]: by_status[status] for status in STATUS_COLUMNS}
+        if doctor_id is None or not any(counts.values()):
+            continue
+        daily_rows.append({'doctor_id': doctor_id, 'date': day, **counts})
+        totals[doctor_id].update(counts)
+    _upsert_many(connection, daily_table, ['doctor_id', 'date'], daily_rows)
+    _upsert_many(connection, totals_table, ['doctor_id'], [
+        {'doctor_id': doctor_id, **{column: counts[column] for column in STATUS_COLUMNS.values()}}
+        for doctor_id, counts in totals.items()
+    ])
+
+
+def _committed(state, key):
+    """Value of an attribute as it is in the database, before this flush."""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[key].value
+
+
+def _stat_key(doctor_id, day, status):
+    return (doctor_id, day), status or AppointmentStatus.BOOKED
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_appointments(session, flush_context, instances):
+    deltas = defaultdict(Counter)
+    removed_doctors = set()
+
+    def count(key, status, n):
+        deltas[key][status] += n
+
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            count(*_stat_key(obj.doctor_id, obj.date, obj.status), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            state = inspect(obj)
+            count(*_stat_key(_committed(state, 'doctor_id'), _committed(state, 'date'), _committed(state, 'status')), -1)
+        elif isinstance(obj, Doctor):
+            removed_doctors.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and session.is_modified(obj):
+            state = inspect(obj)
+            old = _stat_key(_committed(state, 'doctor_id'), _committed(state, 'date'), _committed(state, 'status'))
+            new = _stat_key(obj.doctor_id, obj.date, obj.status)
+            # Booked -> completed/cancelled, moved to another day or doctor
+            if old != new:
+                count(*old, -1)
+                count(*new, 1)
+
+    if deltas or removed_doctors:
+        connection = session.connection()
+        apply_stat_deltas(connection, deltas)
+        if removed_doctors:
+            connection.execute(delete(daily_table).where(daily_table.c.doctor_id.in_(removed_doctors)))
+            connection.execute(delete(totals_table).where(totals_table.c.doctor_id.in_(removed_doctors)))
+
+
+def rebuild_doctor_stats():
+    """
+    Recount both stats tables from the appointment table. Needed after bulk/Core writes to
+    appointments (which the flush listener doesn't see) or if the counters ever drift.
+    Returns the number of doctors with stats.
+    """
+    connection = db.session.connection()
+    connection.execute(delete(daily_table))
+    connection.execute(delete(totals_table))
+
+    columns = list(STATUS_COLUMNS.values())
+    status_counts = [
+        func.sum(case((appointment_table.c.status == status, 1), else_=0))
+        for status in STATUS_COLUMNS
+    ]
+    connection.execute(insert(daily_table).from_select(
+        ['doctor_id', 'date', *columns],
+        select(appointment_table.c.doctor_id, appointment_table.c.date, *status_counts)
+        .group_by(appointment_table.c.doctor_id, appointment_table.c.date)
+    ))
+    connection.execute(insert(totals_table).from_select(
+        ['doctor_id', *columns],
+        select(daily_table.c.doctor_id, *[func.sum(daily_table.c[column]) for column in columns])
+        .group_by(daily_table.c.doctor_id)
+    ))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(DoctorStats).scalar()
+
+
+def ensure_doctor_stats():
+    """Fill the stats tables the first time they exist on a database that already has appointments."""
+    if db.session.query(DoctorStats.doctor_id).first() is None and db.session.query(Appointment.id).first() is not None:
+        rebuild_doctor_stats()
+
+
+def get_doctor_counts(doctor_id, day):
+    """(appointments on `day`, completed, pending) for one doctor, from the stats tables."""
+    totals = db.session.get(DoctorStats, doctor_id)
+    daily = db.session.get(DoctorDailyStats, (doctor_id, day))
+    return (
+        daily.total_count if daily else 0,
+        totals.completed_count if totals else 0,
+        totals.booked_count if totals else 0
+    )
+
+
+def get_doctor_total(doctor_id):
+    """Every appointment the doctor has, whatever its status, from the stats table."""
+    totals = db.session.get(DoctorStats, doctor_id)
+    return totals.booked_count + totals.completed_count + totals.cancelled_count if totals else 0
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import select
+from database import db
+from models import User, Doctor, Patient, Appointment, AppointmentStatus, Treatment
+
+YIELD_PER = 2000
+# Rows buffered into each chunk handed to the response/file
+ROWS_PER_CHUNK = 500
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Plain table aliases: an ORM aliased() here would configure every mapper at import time,
+# which shows up in each worker's start-up (see benchmarks/bench_startup.py)
+doctor_user = User.__table__.alias('doctor_user')
+patient_user = User.__table__.alias('patient_user')
+
+EXPORT_COLUMNS = [
+    Appointment.id.label('appointment_id'),
+    Appointment.date,
+    Appointment.time,
+    Appointment.status,
+    Appointment.doctor_id,
+    doctor_user.c.name.label('doctor_name'),
+    Doctor.specialization,
+    Appointment.patient_id,
+    patient_user.c.name.label('patient_name'),
+    Appointment.problem,
+    Appointment.rating,
+    Appointment.remarks,
+    Treatment.id.label('treatment_id'),
+    Treatment.disease,
+    Treatment.diagnosis,
+    Treatment.prescription,
+    Treatment.notes,
+]
+FIELD_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+
+def parse_export_filters(date_from=None, date_to=None, doctor_id=None, status=None):
+    """Turn raw strings (query args / CLI options) into filter values; raises ValueError on bad input."""
+    filters = {}
+    if date_from:
+        filters['date_from'] = datetime.strptime(date_from, '%Y-%m-%d').date()
+    if date_to:
+        filters['date_to'] = datetime.strptime(date_to, '%Y-%m-%d').date()
+    if doctor_id:
+        filters['doctor_id'] = int(doctor_id)
+    if status:
+        try:
+            filters['status'] = AppointmentStatus[status.strip().upper()]
+        except KeyError:
+            raise ValueError(f"unknown status '{status}'")
+    return filters
+
+
+def export_statement(date_from=None, date_to=None, doctor_id=None, status=None):
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .join(Doctor, Appointment.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.c.id)
+        .join(Patient, Appointment.patient_id == Patient.id)
+        .join(patient_user, Patient.user_id == patient_user.c.id)
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.id)
+        .order_by(Appointment.date, Appointment.time, Appointment.id)
+    )
+    if date_from:
+        stmt = stmt.where(Appointment.date >= date_from)
+    if date_to:
+        stmt = stmt.where(Appointment.date <= date_to)
+    if doctor_id:
+        stmt = stmt.where(Appointment.doctor_id == doctor_id)
+    if status:
+        stmt = stmt.where(Appointment.status == status)
+    return stmt
+
+
+def iter_export_rows(**filters):
+    """
+    Yield export rows one at a time off a streaming cursor, YIELD_PER rows fetched at once.
+    The cursor holds a read transaction for the whole export; on a rollback-journal SQLite
+    database that keeps writers waiting, so very large exports are best run from the CLI.
+    """
+    result = db.session.execute(
+        export_statement(**filters).execution_options(yield_per=YIELD_PER)
+    )
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _plain(value):
+    if isinstance(value, AppointmentStatus):
+        return value.value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELD_NAMES)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_plain(value) for value in row])
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({name: _plain(value) for name, value in zip(FIELD_NAMES, row)}))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_chunks(fmt, **filters):
+    """Text chunks of the export in `fmt` ('csv' or 'ndjson'); memory stays flat however many rows match."""
+    rows = iter_export_rows(**filters)
+    return csv_chunks(rows) if fmt == 'csv' else ndjson_chunks(rows)
@@ -0,0 +1,98 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime, timedelta
+from availability import AvailabilityRange
+from directory import search_directory
+from slot_grid import SlotGrid, SLOT_LABELS, SLOTS_PER_DAY, FULL_DAY, slot_index
+
+OpenSlot = namedtuple('OpenSlot', ['date', 'time', 'doctor_id', 'doctor_name', 'specialization', 'slot_minutes'])
+
+CHUNK_DAYS = 7  # dates loaded per AvailabilityRange (three queries each)
+MAX_DAYS = 90  # furthest ahead a search may look
+MAX_RESULTS = 50
+
+# Heap entries with this slot mean "open this doctor's day"; they sort before its real slots
+PROBE = -1
+
+
+def time_window(after=None, before=None):
+    """SlotGrid of the slots starting at or after `after` and before `before` (whole day when unset)."""
+    start = slot_index(after) if after else 0
+    end = slot_index(before) if before else SLOTS_PER_DAY
+    return SlotGrid(((1 << end) - 1) & ~((1 << start) - 1))
+
+
+class ChunkedAvailability:
+    """AvailabilityRange for a set of doctors, CHUNK_DAYS dates at a time, each chunk loaded the first time one of its dates is asked for."""
+
+    def __init__(self, doctor_ids, date_from, date_to):
+        self.doctor_ids = list(doctor_ids)
+        self.date_from = date_from
+        self.date_to = date_to
+        self.chunks = {}
+
+    def free_grid(self, doctor_id, day):
+        k = (day - self.date_from).days // CHUNK_DAYS
+        chunk = self.chunks.get(k)
+        if chunk is None:
+            start = self.date_from + timedelta(days=k * CHUNK_DAYS)
+            end = min(start + timedelta(days=CHUNK_DAYS - 1), self.date_to)
+            chunk = self.chunks[k] = AvailabilityRange(self.doctor_ids, start, end)
+        return chunk.free_grid(doctor_id, day)
+
+
+def earliest_slots(doctors, date_from, date_to, limit=10, window=None, now=None):
+    """
+    The `limit` earliest free slots across `doctors` (directory entries) from date_from to
+    date_to, only at times inside the `window` SlotGrid. Slots today that have already
+    started are skipped.
+
+    A k-way merge of one slot stream per doctor on a heap of (date, slot, doctor_id). Every
+    doctor starts as a probe for date_from; popping a probe works out that doctor's free
+    slots for the day and pushes the first one, or a probe for the next day. A day is only
+    opened once every earlier slot has been handed out, so the walk stops at the date of the
+    last result and only the chunks up to there are loaded.
+    """
+    now = now or datetime.now()
+    window = window.bits if window is not None else FULL_DAY
+    not_started = FULL_DAY & ~((1 << (slot_index(now.time()) + 1)) - 1)
+    by_id = {doctor.id: doctor for doctor in doctors}
+    availability = ChunkedAvailability(by_id, date_from, date_to)
+
+    heap = [(date_from, PROBE, doctor_id) for doctor_id in by_id]
+    heapq.heapify(heap)
+    day_slots = {}  # doctor_id -> iterator over the rest of that doctor's current day
+    results = []
+    while heap and len(results) < limit:
+        day, slot, doctor_id = heapq.heappop(heap)
+        if slot == PROBE:
+            bits = availability.free_grid(doctor_id, day).bits & window
+            if day == now.date():
+                bits &= not_started
+            day_slots[doctor_id] = iter(SlotGrid(bits))
+        else:
+            doctor = by_id[doctor_id]
+            results.append(OpenSlot(day, SLOT_LABELS[slot], doctor_id, doctor.name, doctor.specialization,
+                                    doctor.slot_minutes))
+
+        next_slot = next(day_slots[doctor_id], None)
+        if next_slot is not None:
+            heapq.heappush(heap, (day, next_slot, doctor_id))
+        elif day < date_to:
+            heapq.heappush(heap, (day + timedelta(days=1), PROBE, doctor_id))
+    return results
+
+
+def first_available(specialization=None, date_from=None, date_to=None, limit=10, after=None, before=None, now=None):
+    """
+    The `limit` earliest free slots with any doctor of `specialization` (any doctor when
+    empty), from date_from (today) up to date_to (MAX_DAYS ahead), between the times of day
+    `after` and `before`. Past dates are never searched.
+    """
+    now = now or datetime.now()
+    date_from = max(date_from or now.date(), now.date())
+    date_to = min(date_to or date_from + timedelta(days=MAX_DAYS - 1), date_from + timedelta(days=MAX_DAYS - 1))
+    if date_to < date_from:
+        return []
+    doctors = search_directory(specialization=specialization)
+    return earliest_slots(doctors, date_from, date_to, min(limit, MAX_RESULTS), time_window(after, before), now)
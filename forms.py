@@ -1,8 +1,10 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, IntegerField, DateField, TimeField, TextAreaField, SelectMultipleField
-from wtforms.validators import DataRequired, Length, Email, EqualTo, NumberRange
+from wtforms import StringField, PasswordField, SubmitField, SelectField, IntegerField, DateField, TimeField, TextAreaField, SelectMultipleField, DateTimeLocalField
+from wtforms.validators import DataRequired, Length, Email, EqualTo, NumberRange, Optional
 from wtforms import widgets
 from models import DayOfWeek
+from slot_grid import SlotGrid, slot_choices, slot_length_choices, SLOT_LENGTHS, DEFAULT_SLOT_MINUTES
+from datetime import time
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators = [DataRequired(), Email()])
@@ -24,8 +26,13 @@ class PatientSetupForm(FlaskForm):
     phone_number = StringField('Phone Number', validators=[DataRequired()])
     submit = SubmitField('Complete Profile')
 
+# Hours the setup and Manage Slots forms offer slots in
+SETUP_HOURS = (time(9, 0), time(23, 0))
+DAILY_HOURS = (time(9, 0), time(19, 0))
+
 class DoctorSetupForm(FlaskForm):
     specialization = StringField('Specialization', validators=[DataRequired()])
+    slot_minutes = SelectField('Slot Length', coerce=int, choices=slot_length_choices(), default=DEFAULT_SLOT_MINUTES)
     available_days = SelectMultipleField(
         "Available Days",
         choices=[(day.name, day.value) for day in DayOfWeek],
@@ -34,43 +41,43 @@ class DoctorSetupForm(FlaskForm):
     )
     available_slots = SelectMultipleField(
         "Available Slots",
-        choices=[
-            ("09:00", "09:00"), ("09:30", "09:30"),
-            ("10:00", "10:00"), ("10:30", "10:30"),
-            ("11:00", "11:00"), ("11:30", "11:30"),
-            ("12:00", "12:00"), ("12:30", "12:30"),
-            ("13:00", "13:00"), ("13:30", "13:30"),
-            ("14:00", "14:00"), ("14:30", "14:30"),
-            ("15:00", "15:00"), ("15:30", "15:30"),
-            ("16:00", "16:00"), ("16:30", "16:30"),
-            ("17:00", "17:00"), ("17:30", "17:30"),
-            ("18:00", "18:00"), ("18:30", "18:30"),
-            ("19:00", "19:00"), ("19:30", "19:30"),
-            ("20:00", "20:00"), ("20:30", "20:30"),
-            ("21:00", "21:00"), ("21:30", "21:30"),
-            ("22:00", "22:00"), ("22:30", "22:30")
-        ],
+        choices=slot_choices(*SETUP_HOURS),
         option_widget=widgets.CheckboxInput(),
         widget=widgets.ListWidget(prefix_label=False),
     )
     submit = SubmitField('Save Profile')
 
+def chosen_slot_minutes(form, fallback=DEFAULT_SLOT_MINUTES):
+    """The slot length picked on the form, or `fallback` if none or an unknown one was sent."""
+    return form.slot_minutes.data if form.slot_minutes.data in SLOT_LENGTHS else fallback
+
+def offer_slots(field, hours, minutes, keep=None):
+    """Point a slot checkbox field at back-to-back `minutes` long slots within `hours`, plus the slots in the `keep` SlotGrid."""
+    if keep:
+        grid = SlotGrid.from_labels(label for label, _ in slot_choices(*hours, minutes)) | keep
+        field.choices = [(label, label) for label in grid.labels()]
+    else:
+        field.choices = slot_choices(*hours, minutes)
+
 class DoctorProfileForm(FlaskForm):
     specialization = StringField('Specialization', validators=[DataRequired()])
+    slot_minutes = SelectField('Slot Length', coerce=int, choices=slot_length_choices())
     submit = SubmitField('Update Profile')
 
 
 class DailySlotForm(FlaskForm):
     date = DateField('Date', validators=[DataRequired()])
-    slots = SelectMultipleField('Slots', choices=[
-            ("09:00", "09:00"), ("09:30", "09:30"), ("10:00", "10:00"), ("10:30", "10:30"),
-            ("11:00", "11:00"), ("11:30", "11:30"), ("12:00", "12:00"), ("12:30", "12:30"),
-            ("13:00", "13:00"), ("13:30", "13:30"), ("14:00", "14:00"), ("14:30", "14:30"),
-            ("15:00", "15:00"), ("15:30", "15:30"), ("16:00", "16:00"), ("16:30", "16:30"),
-            ("17:00", "17:00"), ("17:30", "17:30"), ("18:00", "18:00"), ("18:30", "18:30")
-        ], option_widget=widgets.CheckboxInput(), widget=widgets.ListWidget(prefix_label=False))
+    slots = SelectMultipleField('Slots', choices=slot_choices(*DAILY_HOURS),
+        option_widget=widgets.CheckboxInput(), widget=widgets.ListWidget(prefix_label=False))
     submit = SubmitField('Save Slots')
 
+class LeaveForm(FlaskForm):
+    start_at = DateTimeLocalField('From', format='%Y-%m-%dT%H:%M', validators=[DataRequired()])
+    end_at = DateTimeLocalField('Until', format='%Y-%m-%dT%H:%M', validators=[DataRequired()])
+    kind = SelectField('Type', choices=[('blocked', 'Leave (block slots)'), ('available', 'Extra hours (open slots)')])
+    reason = StringField('Reason', validators=[Optional(), Length(max=200)])
+    submit = SubmitField('Add Block')
+
 class AppointmentForm(FlaskForm):
     doctor_id = SelectField('Doctor', coerce=int, validators=[DataRequired()])
     date = DateField('Date', validators=[DataRequired()])
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from cache import TTLCache
+from schedule_version import TOUCHED_KEY
+
+
+class FragmentStore:
+    """
+    Fragments in a SQLite file that every worker on the machine opens, so a table one worker
+    rendered is a hit in the others. Values are stored as JSON. Any error reading or writing
+    the file counts as a miss; the page then renders the fragment itself.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()  # one connection per thread, opened on first use
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # it's a cache: losing the last writes on a crash is fine
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS fragments '
+                '(key TEXT PRIMARY KEY, doctor_id INTEGER NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_fragments_doctor_id ON fragments (doctor_id)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM fragments WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, doctor_id, value):
+        if self.ttl <= 0:
+            return
+        self._connection().execute(
+            'INSERT OR REPLACE INTO fragments (key, doctor_id, value, expires) VALUES (?, ?, ?, ?)',
+            (key, doctor_id, json.dumps(value), time.time() + self.ttl)
+        )
+
+    def invalidate_doctors(self, doctor_ids):
+        conn = self._connection()
+        conn.executemany('DELETE FROM fragments WHERE doctor_id = ?', [(i,) for i in doctor_ids])
+        conn.execute('DELETE FROM fragments WHERE expires <= ?', (time.time(),))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM fragments')
+
+
+class FragmentCache:
+    """
+    Rendered page fragments keyed by (name, doctor, date, schedule_version). Any write to the
+    doctor's appointments, weekly slots or overrides bumps the version (schedule_version.py),
+    so a stale fragment is never looked up again, in this worker or any other. Once the write
+    commits, the session event below also drops the doctor's old fragments here and in the
+    shared store, so they don't sit in memory until the LRU pushes them out.
+
+    Lookups go to the per-process LRU first, then the shared store (FRAGMENT_CACHE_STORE,
+    optional), then render. Values must be JSON-serialisable when a store is configured.
+    """
+
+    def __init__(self, maxsize=512, ttl=600):
+        self.local = TTLCache(maxsize, ttl)
+        self.store = None
+        self._stats = defaultdict(Counter)  # name -> Counter(local, shared, miss)
+        self._invalidated = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Reads FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_TTL (0 disables) and FRAGMENT_CACHE_STORE (a file path)."""
+        self.local.init_app(app, 'FRAGMENT_CACHE')
+        path = app.config.get('FRAGMENT_CACHE_STORE')
+        self.store = FragmentStore(path, self.local.ttl) if path else None
+        self.reset_stats()
+
+    def _count(self, name, outcome):
+        with self._lock:
+            self._stats[name][outcome] += 1
+
+    def get_or_render(self, name, doctor_id, day, version, render):
+        """The cached fragment, or render() stored under the key."""
+        key = (name, doctor_id, day.isoformat(), version)
+        value = self.local.get(key)
+        if value is not None:
+            self._count(name, 'local')
+            return value
+
+        store_key = ':'.join(map(str, key))
+        if self.store is not None:
+            try:
+                value = self.store.get(store_key)
+            except sqlite3.Error:
+                value = None
+            if value is not None:
+                self.local.put(key, value)
+                self._count(name, 'shared')
+                return value
+
+        self._count(name, 'miss')
+        value = render()
+        self.local.put(key, value)
+        if self.store is not None:
+            try:
+                self.store.put(store_key, doctor_id, value)
+            except sqlite3.Error:
+                pass
+        return value
+
+    def invalidate_doctors(self, doctor_ids):
+        doctor_ids = set(doctor_ids)
+        dropped = self.local.invalidate_where(lambda key: key[1] in doctor_ids)
+        with self._lock:
+            self._invalidated += dropped
+        if self.store is not None:
+            try:
+                self.store.invalidate_doctors(doctor_ids)
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        self.local.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+            self._invalidated = 0
+
+    def stats(self):
+        """Hits (in-process and shared store), misses and hit rate per fragment, for /admin/perf."""
+        with self._lock:
+            counts = {name: Counter(counter) for name, counter in self._stats.items()}
+            invalidated = self._invalidated
+        rows = []
+        for name, counter in sorted(counts.items()):
+            total = counter['local'] + counter['shared'] + counter['miss']
+            rows.append({
+                'name': name,
+                'local': counter['local'],
+                'shared': counter['shared'],
+                'miss': counter['miss'],
+                'hit_rate': (counter['local'] + counter['shared']) / total if total else 0.0,
+            })
+        return {'fragments': rows, 'entries': len(self.local), 'maxsize': self.local.maxsize,
+                'ttl': self.local.ttl, 'shared': self.store is not None, 'invalidated': invalidated}
+
+
+fragment_cache = FragmentCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    doctor_ids = session.info.pop(TOUCHED_KEY, None)
+    if doctor_ids:
+        fragment_cache.invalidate_doctors(doctor_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    # The version bumps were rolled back with everything else
+    session.info.pop(TOUCHED_KEY, None)
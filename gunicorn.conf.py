@@ -0,0 +1,11 @@
+# gunicorn -c gunicorn.conf.py wsgi:app   (settings can be overridden with the same env vars)
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', 4))
+# Threads per worker; requests mostly wait on SQLite or the password pool, not the GIL
+threads = int(os.environ.get('WEB_THREADS', 4))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# Each worker builds its own app (engine, caches, password pool); nothing DB-related is shared across fork
+preload_app = False
+accesslog = '-'
@@ -0,0 +1,80 @@
+from flask_login import UserMixin
+from sqlalchemy.orm import joinedload
+from database import db
+from models import User, Doctor, Patient
+from cache import TTLCache
+
+
+class Identity(UserMixin):
+    """
+    Read-only snapshot of the logged-in user, returned by the Flask-Login user loader.
+    Routes needing the ORM rows use `db_user` / `doctor_profile` / `patient_profile`,
+    which are fetched through the session only when touched.
+    """
+    __slots__ = ('id', 'username', 'name', 'email', 'role', 'doctor_id', 'patient_id')
+
+    def __init__(self, user):
+        for field, value in (
+            ('id', user.id),
+            ('username', user.username),
+            ('name', user.name),
+            ('email', user.email),
+            ('role', user.role),
+            ('doctor_id', user.doctor_profile.id if user.doctor_profile else None),
+            ('patient_id', user.patient_profile.id if user.patient_profile else None),
+        ):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Identity is read-only; update current_user.db_user.{name} instead")
+
+    @property
+    def db_user(self):
+        return db.session.get(User, self.id)
+
+    @property
+    def doctor_profile(self):
+        return db.session.get(Doctor, self.doctor_id) if self.doctor_id else None
+
+    @property
+    def patient_profile(self):
+        return db.session.get(Patient, self.patient_id) if self.patient_id else None
+
+
+identity_cache = TTLCache()
+
+
+def _still_exists(identity):
+    # The cache is per worker, so another worker may have deleted this user since it was cached.
+    # One PK get of the row the role works from; routes usually need it next, from the identity map
+    if identity.patient_id:
+        return db.session.get(Patient, identity.patient_id) is not None
+    if identity.doctor_id:
+        return db.session.get(Doctor, identity.doctor_id) is not None
+    return db.session.get(User, identity.id) is not None
+
+
+def load_identity(user_id):
+    """
+    Cached snapshot for `user_id`; on a miss, the user and both profiles load in one query.
+    None (so Flask-Login logs the session out) once the user or their profile is gone.
+    """
+    identity = identity_cache.get(user_id)
+    if identity is not None and not _still_exists(identity):
+        identity_cache.invalidate(user_id)
+        return None
+    if identity is None:
+        user = User.query.options(
+            joinedload(User.doctor_profile),
+            joinedload(User.patient_profile)
+        ).filter_by(id=user_id).first()
+        if user is None:
+            return None
+        identity = Identity(user)
+        identity_cache.put(user_id, identity)
+    return identity
+
+
+def invalidate_identity(user_id):
+    """Call after changing a user's name/role/profile or deleting them."""
+    identity_cache.invalidate(user_id)
@@ -0,0 +1,55 @@
+from bisect import bisect_right
+from slot_grid import SLOT_LABELS, GRID_MINUTES, minute_of_day
+
+
+class IntervalSet:
+    """
+    Non-overlapping [start, end) intervals (minutes from midnight, or any comparable numbers),
+    kept sorted by start. Because they never overlap, the ends are sorted too, so whether a new
+    interval collides is one bisect on the ends: O(log n) however many slots a day has.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def overlapping(self, start, end):
+        """The stored interval overlapping [start, end), or None."""
+        i = bisect_right(self.ends, start)  # first interval ending after `start`
+        if i < len(self.starts) and self.starts[i] < end:
+            return self.starts[i], self.ends[i]
+        return None
+
+    def add(self, start, end):
+        """Store [start, end); returns the interval it collides with instead, if any."""
+        clash = self.overlapping(start, end)
+        if clash is None:
+            i = bisect_right(self.ends, start)
+            self.starts.insert(i, start)
+            self.ends.insert(i, end)
+        return clash
+
+
+def booked_intervals(rows):
+    """IntervalSet of (time, slot_minutes) bookings for one doctor and date."""
+    intervals = IntervalSet()
+    for t, minutes in rows:
+        start = minute_of_day(t)
+        intervals.add(start, start + minutes)
+    return intervals
+
+
+def check_overlaps(grid, minutes):
+    """Raise ValueError if any two of the grid's `minutes` long slots overlap (e.g. 10:00 and 10:15 at 30 minutes)."""
+    intervals = IntervalSet()
+    for i in grid:
+        start = i * GRID_MINUTES
+        clash = intervals.add(start, start + minutes)
+        if clash is not None:
+            raise ValueError(f"{SLOT_LABELS[clash[0] // GRID_MINUTES]} and {SLOT_LABELS[i]} overlap with {minutes}-minute slots")
@@ -0,0 +1,170 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from database import db
+from models import DoctorLeave, Appointment, AppointmentStatus
+from listings import appointment_listing
+from slot_grid import SlotGrid
+
+# Longest block one request may add; longer leave is entered as several blocks
+MAX_LEAVE_DAYS = 366
+
+LeaveBlock = namedtuple('LeaveBlock', ['id', 'doctor_id', 'start_at', 'end_at', 'is_available'])
+
+EPOCH = datetime(1970, 1, 1)
+
+# R*Tree over (doctor, minutes since 1970) boxes, id = doctor_leave.id. A lookup by doctor and
+# time window only visits the tree nodes overlapping it, so it stays O(log n) however much
+# leave has piled up. 32-bit integer coordinates: minutes run out in the year 6053.
+LEAVE_INDEX = """
+CREATE VIRTUAL TABLE IF NOT EXISTS doctor_leave_index USING rtree_i32(
+    id, doctor_lo, doctor_hi, start_minute, end_minute
+)
+"""
+
+# Same minute arithmetic as to_minutes() below, on the stored 'YYYY-MM-DD HH:MM:SS.ffffff' text
+LEAVE_ROWS = """
+INSERT INTO doctor_leave_index (id, doctor_lo, doctor_hi, start_minute, end_minute)
+SELECT l.id, l.doctor_id, l.doctor_id,
+       CAST(strftime('%s', l.start_at) AS INTEGER) / 60, CAST(strftime('%s', l.end_at) AS INTEGER) / 60
+FROM doctor_leave l
+"""
+
+LEAVE_TRIGGERS = {
+    'doctor_leave_index_insert': f'AFTER INSERT ON doctor_leave BEGIN {LEAVE_ROWS} WHERE l.id = NEW.id; END',
+    'doctor_leave_index_update': (
+        'AFTER UPDATE OF id, doctor_id, start_at, end_at ON doctor_leave '
+        f'BEGIN DELETE FROM doctor_leave_index WHERE id = OLD.id; {LEAVE_ROWS} WHERE l.id = NEW.id; END'
+    ),
+    'doctor_leave_index_delete': 'AFTER DELETE ON doctor_leave BEGIN DELETE FROM doctor_leave_index WHERE id = OLD.id; END',
+}
+
+# Chunk size for overlapping_leave: one lookup per doctor in a UNION ALL, and SQLite allows at
+# most 500 SELECTs in a compound statement
+LOOKUPS_PER_QUERY = 250
+
+
+def _overlapping_query(count):
+    """
+    Blocks overlapping [:start, :end) of the doctors :doctor_0..:doctor_<count-1>. Each doctor is
+    its own (id, id) box in the index: a single box from the lowest to the highest id would also
+    walk the leave of every doctor in between.
+    """
+    lookups = ' UNION ALL '.join(
+        f'SELECT id FROM doctor_leave_index WHERE doctor_lo <= :doctor_{n} AND doctor_hi >= :doctor_{n} '
+        'AND start_minute < :end AND end_minute > :start'
+        for n in range(count)
+    )
+    return text(f"""
+        SELECT l.id, l.doctor_id, l.start_at, l.end_at, l.is_available
+        FROM doctor_leave l WHERE l.id IN ({lookups})
+    """)
+
+
+def to_minutes(value):
+    return int((value - EPOCH).total_seconds()) // 60
+
+
+def ensure_leave_index():
+    """Create the interval index and (re)create its triggers; fill it if it was just created. Run by init_db."""
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'doctor_leave_index'"
+    )).first()
+    connection.execute(text(LEAVE_INDEX))
+    for trigger, body in LEAVE_TRIGGERS.items():
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+        connection.execute(text(f'CREATE TRIGGER {trigger} {body}'))
+    if not exists:
+        connection.execute(text(LEAVE_ROWS))
+    db.session.commit()
+
+
+def overlapping_leave(doctor_ids, start, end):
+    """LeaveBlocks of `doctor_ids` overlapping [start, end), earliest first, one index lookup per doctor."""
+    doctor_ids = sorted(set(doctor_ids))
+    blocks = []
+    for i in range(0, len(doctor_ids), LOOKUPS_PER_QUERY):
+        chunk = doctor_ids[i:i + LOOKUPS_PER_QUERY]
+        params = {f'doctor_{n}': doctor_id for n, doctor_id in enumerate(chunk)}
+        params.update(start=to_minutes(start), end=to_minutes(end))
+        rows = db.session.execute(_overlapping_query(len(chunk)), params)
+        blocks.extend(LeaveBlock(id_, doctor_id, _as_datetime(start_at), _as_datetime(end_at), bool(is_available))
+                      for id_, doctor_id, start_at, end_at, is_available in rows)
+    return sorted(blocks, key=lambda block: block.start_at)
+
+
+def leave_at(doctor_id, when):
+    """The block covering the moment `when` for this doctor, or None (a stabbing query on the index)."""
+    blocks = overlapping_leave([doctor_id], when, when + timedelta(minutes=1))
+    return blocks[0] if blocks else None
+
+
+def _as_datetime(value):
+    # Raw text() rows come back as the stored string
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def day_bits(start_at, end_at, day, minutes, whole_slots):
+    """
+    Start positions on `day` of the `minutes` long slots that [start_at, end_at) touches. With
+    whole_slots, back-to-back slots from start_at that fit inside the block (for opening hours);
+    otherwise every slot it overlaps (for blocking).
+    """
+    midnight = datetime.combine(day, datetime.min.time())
+    start = (start_at - midnight).total_seconds() / 60
+    end = (end_at - midnight).total_seconds() / 60
+    if whole_slots:
+        return SlotGrid.spaced(max(start, 0), end, minutes).bits
+    return SlotGrid.covering(start, end, minutes).bits
+
+
+def colliding_appointments(doctor_id, start_at, end_at):
+    """BOOKED appointments of the doctor whose slot overlaps [start_at, end_at), with patients, in one query."""
+    rows = appointment_listing('patient', columns=('slot_minutes',)).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.status == AppointmentStatus.BOOKED,
+        Appointment.date.between(start_at.date(), end_at.date())
+    ).order_by(Appointment.date, Appointment.time).all()
+    collisions = []
+    for appt in rows:
+        start = datetime.combine(appt.date, appt.time)
+        if start < end_at and start + timedelta(minutes=appt.slot_minutes) > start_at:
+            collisions.append(appt)
+    return collisions
+
+
+def validate_block(start_at, end_at):
+    """Error message for a block that can't be saved, or None."""
+    if end_at <= start_at:
+        return 'The end must be after the start.'
+    if end_at - start_at > timedelta(days=MAX_LEAVE_DAYS):
+        return f'A block can be at most {MAX_LEAVE_DAYS} days long.'
+    return None
+
+
+def add_leave(doctor_id, start_at, end_at, is_available=False, reason=None):
+    """
+    Save a block and commit (the schedule version bump in schedule_version.py covers it).
+    Returns (leave, colliding BOOKED appointments); raises ValueError for a bad range.
+    Colliding appointments are only reported; cancelling them is left to the doctor.
+    """
+    error = validate_block(start_at, end_at)
+    if error:
+        raise ValueError(error)
+    leave = DoctorLeave(doctor_id=doctor_id, start_at=start_at, end_at=end_at,
+                        is_available=is_available, reason=reason or None)
+    db.session.add(leave)
+    db.session.commit()
+    collisions = [] if is_available else colliding_appointments(doctor_id, start_at, end_at)
+    return leave, collisions
+
+
+def upcoming_leave(doctor_id, now=None):
+    """The doctor's blocks that haven't ended yet, soonest first."""
+    now = now or datetime.now()
+    return DoctorLeave.query.filter(
+        DoctorLeave.doctor_id == doctor_id, DoctorLeave.end_at > now
+    ).order_by(DoctorLeave.start_at).all()
@@ -0,0 +1,48 @@
+from sqlalchemy.orm import configure_mappers, joinedload, load_only
+from models import Appointment, Doctor, Patient, Treatment, User
+
+# Appointment columns every listing template shows; date/time/id are also the keyset pagination key
+LISTING_COLUMNS = ('id', 'doctor_id', 'patient_id', 'date', 'time', 'status', 'problem')
+
+
+def _doctor():
+    # appt.doctor.id, appt.doctor.user.name
+    return joinedload(Appointment.doctor).options(
+        load_only(Doctor.id, Doctor.user_id),
+        joinedload(Doctor.user).load_only(User.id, User.name)
+    )
+
+
+def _patient():
+    # appt.patient.id, appt.patient.user.name
+    return joinedload(Appointment.patient).options(
+        load_only(Patient.id, Patient.user_id),
+        joinedload(Patient.user).load_only(User.id, User.name)
+    )
+
+
+def _treatment():
+    # appt.treatment.disease / diagnosis / prescription
+    return joinedload(Appointment.treatment).load_only(
+        Treatment.id, Treatment.appointment_id, Treatment.disease, Treatment.diagnosis, Treatment.prescription
+    )
+
+
+RELATED = {'doctor': _doctor, 'patient': _patient, 'treatment': _treatment}
+
+
+def appointment_listing(*related, columns=()):
+    """
+    Appointment.query for list pages: loads only LISTING_COLUMNS (plus the `columns` named)
+    and joins the `related` rows ('doctor', 'patient', 'treatment') into the same SELECT,
+    so a page costs the same number of queries however many appointments it shows.
+    Anything else a template touches is still lazy loaded, one query per row, and shows up
+    as a repeated statement on /admin/perf.
+    """
+    # The backrefs used above (Appointment.doctor, ...) only exist once the mappers are configured
+    configure_mappers()
+    names = LISTING_COLUMNS + tuple(columns)
+    return Appointment.query.options(
+        load_only(*[getattr(Appointment, name) for name in names]),
+        *[RELATED[name]() for name in related]
+    )
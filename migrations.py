@@ -0,0 +1,71 @@
+import click
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+from database import db
+from doctor_stats import ensure_doctor_stats
+from search import ensure_search_index
+from leave import ensure_leave_index
+
+
+def add_missing_columns(engine):
+    """ALTER TABLE ... ADD COLUMN for model columns the database doesn't have yet (they need a server_default)."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+
+
+def duplicate_rows(engine, index, limit=10):
+    """[(key values, 'id, id, ...')] of rows sharing a key of the unique `index`, at most `limit` keys."""
+    preparer = engine.dialect.identifier_preparer
+    columns = ', '.join(preparer.quote(column.name) for column in index.columns)
+    row_id = preparer.quote(index.table.primary_key.columns.values()[0].name)
+    where = index.dialect_options['sqlite']['where']
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT {columns}, group_concat({row_id}, ', ') FROM {preparer.format_table(index.table)}"
+            + (f' WHERE {where}' if where is not None else '')
+            + f' GROUP BY {columns} HAVING count(*) > 1 LIMIT {limit}'
+        )).all()
+    return [(tuple(row[:-1]), row[-1]) for row in rows]
+
+
+def upgrade_schema(engine=None):
+    """
+    Bring an existing database up to date with the models. db.create_all() only creates
+    missing tables, so columns and indexes declared later on existing tables are added here.
+    Safe to run again: anything already present is skipped.
+    """
+    engine = engine or db.engine
+    add_missing_columns(engine)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except IntegrityError:
+                # Existing rows violate a unique index (e.g. legacy double bookings). Without it
+                # nothing stops new ones, so stop here rather than leave the database half upgraded
+                columns = ', '.join(column.name for column in index.columns)
+                conflicts = '\n'.join(f'  ({", ".join(map(str, key))}): {table.name} ids {ids}'
+                                      for key, ids in duplicate_rows(engine, index))
+                raise click.ClickException(
+                    f"Could not create unique index {index.name}: these {table.name} rows share "
+                    f"({columns}):\n{conflicts}\nFix or cancel the duplicates, then run `flask init-db` again."
+                )
+
+
+def init_db():
+    """Create missing tables, upgrade existing ones and fill the derived tables. Run by `flask init-db`."""
+    db.create_all()
+    upgrade_schema()
+    ensure_doctor_stats()
+    ensure_search_index()
+    ensure_leave_index()
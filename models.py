@@ -52,10 +52,29 @@ class DoctorAvailabilityOverride(db.Model):
 
     __table_args__ = (db.UniqueConstraint('doctor_id', 'date', 'start_time', name='_doctor_date_start_uc'),)
 
+class DoctorLeave(db.Model):
+    """
+    A block of time, e.g. two weeks of leave, as one row instead of an override per slot per date.
+    Blocks every slot overlapping [start_at, end_at), or when is_available is True opens the slots fitting in it.
+    Kept in an interval index (leave.py) that AvailabilityRange queries.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    start_at = db.Column(db.DateTime, nullable=False)
+    end_at = db.Column(db.DateTime, nullable=False)
+    is_available = db.Column(db.Boolean, nullable=False, default=False)
+    reason = db.Column(db.String(200))
+
+    __table_args__ = (db.Index('ix_doctor_leave_doctor_end', 'doctor_id', 'end_at'),)
+
 class Doctor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
     specialization = db.Column(db.String(50), nullable=False)
+    # Bumped whenever this doctor's schedule, overrides or bookings change (see schedule_version.py)
+    schedule_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Length of each of this doctor's slots, one of slot_grid.SLOT_LENGTHS
+    slot_minutes = db.Column(db.Integer, nullable=False, default=30, server_default='30')
     availability = db.relationship('DoctorAvailability', backref='doctor', lazy='dynamic', cascade="all, delete-orphan")
     appointments = db.relationship('Appointment', backref='doctor', lazy=True)
 
@@ -77,15 +96,83 @@ class Appointment(db.Model):
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     time = db.Column(db.Time, nullable=False)
+    # The doctor's slot length when booked, so changing it later doesn't shrink existing bookings
+    slot_minutes = db.Column(db.Integer, nullable=False, default=30, server_default='30')
     problem = db.Column(db.String(300), nullable=True)
     status = db.Column(db.Enum(AppointmentStatus), default=AppointmentStatus.BOOKED, nullable=False)
     remarks = db.Column(db.Text, nullable=True) 
     rating = db.Column(db.Integer, nullable=True)
     treatment = db.relationship('Treatment', backref='appointment', uselist=False)
 
+    # Dashboards and the double-booking check filter on these columns
+    __table_args__ = (
+        db.Index('ix_appointment_doctor_date_status_time', 'doctor_id', 'date', 'status', 'time'),
+        db.Index('ix_appointment_patient_date', 'patient_id', 'date'),
+        db.Index('ix_appointment_date_time', 'date', 'time'),
+        # At most one BOOKED appointment per doctor slot; cancelled/completed rows don't count
+        db.Index('uq_appointment_booked_slot', 'doctor_id', 'date', 'time', unique=True,
+                 sqlite_where=db.text("status = 'BOOKED'")),
+    )
+
+# Appointment counts kept up to date by doctor_stats.py, so admin pages don't scan appointments
+class DoctorStats(db.Model):
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), primary_key=True)
+    booked_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class DoctorDailyStats(db.Model):
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    booked_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    @property
+    def total_count(self):
+        return self.booked_count + self.completed_count + self.cancelled_count
+
+# Rollups rebuilt by summaries.py (nightly or on demand); the summary pages only read these.
+# role is 'Doctor' or 'Patient' and owner_id the matching doctor.id / patient.id
+class SummaryWeek(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    role = db.Column(db.String(20), nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False)
+    week_start = db.Column(db.Date, nullable=False)  # Monday
+    booked_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_total = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('role', 'owner_id', 'week_start', name='_summary_week_uc'),)
+
+class SummaryDisease(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    role = db.Column(db.String(20), nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False)
+    disease = db.Column(db.String(200), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_summary_disease_owner_count', 'role', 'owner_id', 'count'),)
+
+class SummaryRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    finished_at = db.Column(db.DateTime, nullable=False)
+    appointment_count = db.Column(db.Integer, nullable=False)
+    seconds = db.Column(db.Float, nullable=False)
+
+# Progress of bulk_import.py runs, committed with each chunk so an interrupted import can resume
+class ImportCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(500), unique=True, nullable=False)  # "<kind>:<absolute path>"
+    file_size = db.Column(db.Integer, nullable=False)
+    records_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
 class Treatment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=False, index=True)
     disease = db.Column(db.Text, nullable=False)
     diagnosis = db.Column(db.Text, nullable=True)
     prescription = db.Column(db.Text, nullable=True)
@@ -0,0 +1,113 @@
+from datetime import date, time
+from flask import request
+from sqlalchemy import tuple_
+from models import Appointment
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+# Total ordering for appointment listings; matches the (..., date, time) indexes
+APPOINTMENT_KEY = [Appointment.date, Appointment.time, Appointment.id]
+
+_PARSERS = {date: date.fromisoformat, time: time.fromisoformat, int: int}
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def encode_cursor(item, columns):
+    """'2025-01-31_10:30:00_42' for a row keyed on (date, time, id)."""
+    return '_'.join(_encode(getattr(item, column.key)) for column in columns)
+
+
+def decode_cursor(cursor, columns):
+    """Cursor string -> tuple of column values, or None if it is malformed."""
+    parts = cursor.split('_') if cursor else []
+    if len(parts) != len(columns):
+        return None
+    try:
+        return tuple(_PARSERS[column.type.python_type](part) for column, part in zip(columns, parts))
+    except (KeyError, ValueError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, total, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, columns, descending=False, after=None, before=None, per_page=DEFAULT_PER_PAGE, total=None):
+    """
+    Seek pagination: instead of OFFSET, filter on the (date, time, id)-style key of the last row
+    seen, so every page costs the same index range scan however deep into history it is.
+    `columns` must end in a unique column (the id) to make the ordering total.
+    """
+    key = tuple_(*columns)
+    if total is None:
+        # Counted once on the first page and carried in the page links afterwards
+        total = query.order_by(None).count()
+
+    after_key = decode_cursor(after, columns)
+    before_key = decode_cursor(before, columns)
+    backwards = before_key is not None and after_key is None
+
+    if after_key is not None:
+        query = query.filter(key < tuple_(*after_key) if descending else key > tuple_(*after_key))
+    elif backwards:
+        query = query.filter(key > tuple_(*before_key) if descending else key < tuple_(*before_key))
+
+    reverse = descending != backwards
+    query = query.order_by(*[column.desc() if reverse else column.asc() for column in columns])
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if backwards:
+        items.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after_key is not None
+
+    return KeysetPage(
+        items,
+        per_page,
+        total,
+        next_cursor=encode_cursor(items[-1], columns) if items and has_next else None,
+        prev_cursor=encode_cursor(items[0], columns) if items and has_prev else None
+    )
+
+
+def paginate_from_request(query, columns, descending=False, default_per_page=DEFAULT_PER_PAGE, total=None):
+    """
+    keyset_paginate() driven by ?after=, ?before=, ?per_page= and the carried ?total=.
+    Pass `total` when it is already known (e.g. from the stats tables) to skip the COUNT.
+    """
+    per_page = min(max(request.args.get('per_page', default_per_page, type=int), 1), MAX_PER_PAGE)
+    return keyset_paginate(
+        query,
+        columns,
+        descending=descending,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=per_page,
+        total=request.args.get('total', total, type=int)
+    )
@@ -0,0 +1,139 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+# Passwords sent to a worker process per task in bulk jobs; big enough to amortise the pickling round trip
+HASH_CHUNKSIZE = 16
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults so 'scrypt' and 'scrypt:32768:8:1' compare equal."""
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        defaults = ['scrypt', str(2 ** 15), '8', '1']
+    elif parts[0] == 'pbkdf2':
+        defaults = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join(parts + defaults[len(parts):])
+
+
+def _pool_context():
+    # The workers only need werkzeug; forking avoids re-importing run.py (and building the app) in each one.
+    # Only safe from a single-threaded process, i.e. the CLI
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+
+def _request_pool_context():
+    # The request pool starts (and is replaced) inside web workers that already run other threads;
+    # a forked child could inherit a lock one of them holds (logging, the DB pool) and hang on it.
+    # A forkserver forks the workers from its own single-threaded process instead. It imports the
+    # main module once (run.py and the CLI guard theirs with __name__ == '__main__'), not every worker
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['__main__', 'werkzeug.security'])
+        return context
+    return None
+
+
+def hashing_pool(workers=None):
+    """A process pool for one-off bulk jobs (see hash_passwords); use it as a context manager."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords in a small process pool (PASSWORD_HASH_WORKERS), so a burst
+    of logins doesn't hold the GIL and stall every other request in the worker. With 0
+    workers everything runs inline. Each process gets its own pool, started on the first
+    hash or check, so CLI commands that never touch a password don't start any workers. The
+    first login usually comes while other request threads are running, so the workers come
+    from a forkserver rather than a fork of this process. If a
+    worker dies (OOM kill, segfault) the pool is broken for good; it is then replaced and the
+    call retried once, and run inline if the new pool breaks too.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=0):
+        self.method = method
+        self.workers = workers
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+
+    def _get_pool(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:  # two first logins at once must not start two pools
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_request_pool_context())
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next call starts a fresh one (unless another thread already did)."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=False):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._pool = None
+
+    def _run(self, func, *args):
+        for _ in range(2):
+            pool = self._get_pool()
+            if pool is None:
+                break
+            try:
+                return pool.submit(func, *args).result()
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+        return func(*args)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if the hash was made with a different algorithm or cost than PASSWORD_HASH_METHOD."""
+        return normalize_method(stored_hash.split('$', 1)[0]) != normalize_method(self.method)
+
+    def hash_many(self, passwords, pool=None):
+        """Hash a batch (bulk imports); pass hashing_pool() to use more processes than the request pool."""
+        passwords = list(passwords)
+        own_pool = pool is None
+        pool = pool or self._get_pool()
+        hash_one = partial(generate_password_hash, method=self.method)
+        if pool is not None and len(passwords) >= 2:
+            try:
+                return list(pool.map(hash_one, passwords, chunksize=HASH_CHUNKSIZE))
+            except BrokenProcessPool:
+                if not own_pool:
+                    raise  # the caller's pool; it decides what to do with it
+                self._discard_pool(pool)
+        return [hash_one(password) for password in passwords]
+
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
+
+
+def hash_passwords(passwords, pool=None):
+    return password_hasher.hash_many(passwords, pool)
@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache, partial
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from database import db
+
+# Statements longer than this are cut in reports
+STATEMENT_CHARS = 300
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement):
+    """Collapse whitespace and expanded IN lists so the same query with other parameters compares equal."""
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\((?:\s*\?\s*,)+\s*\?\s*\)', '(?)', shape)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class RequestProfile:
+    """Statements run while handling one request."""
+    __slots__ = ('started', 'count', 'sql_seconds', 'shapes', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.sql_seconds = 0.0
+        self.shapes = Counter()
+        self.slowest = []  # (seconds, statement), longest first, at most `top`
+
+    def add(self, statement, seconds, top):
+        self.count += 1
+        self.sql_seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.slowest) < top or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[top:]
+
+    def repeated(self, threshold):
+        """Statement shapes run at least `threshold` times: usually a lazy load inside a loop (N+1)."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'samples', 'repeated')
+
+    def __init__(self, window):
+        self.requests = 0
+        self.samples = deque(maxlen=window)  # (request ms, query count, sql ms)
+        self.repeated = {}  # shape -> [times seen, most repeats in one request]
+
+
+class QueryProfiler:
+    """
+    Counts SQL statements and their time per request (cursor events on the engine plus Flask
+    request hooks) and keeps rolling numbers per endpoint for /admin/perf. Statements run
+    outside a request (CLI, startup) are ignored. Like the caches, the numbers are per process.
+    """
+
+    def __init__(self, window=500, slow_ms=100, repeat_threshold=5, top=5):
+        self.enabled = True
+        self.headers = False
+        self.window = window
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+        self.top = top
+        self._endpoints = {}
+        self._slow = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Reads PERF_PROFILING, PERF_HEADERS (default: on in debug mode), PERF_WINDOW,
+        PERF_SLOW_QUERY_MS and PERF_REPEAT_THRESHOLD.
+        """
+        self.enabled = app.config.get('PERF_PROFILING', self.enabled)
+        self.headers = app.config.get('PERF_HEADERS') or app.debug
+        self.window = app.config.get('PERF_WINDOW', self.window)
+        self.slow_ms = app.config.get('PERF_SLOW_QUERY_MS', self.slow_ms)
+        self.repeat_threshold = app.config.get('PERF_REPEAT_THRESHOLD', self.repeat_threshold)
+        self.reset()
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._after_request)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._slow.clear()
+
+    # The start time lives on the statement's execution context, not the connection: a statement
+    # that raises never reaches after_cursor_execute and would leave a stale entry behind
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._perf_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_perf_start', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        if not has_request_context():
+            return
+        profile = g.get('_perf')
+        if profile is not None:
+            profile.add(statement, seconds, self.top)
+        if seconds * 1000 >= self.slow_ms:
+            with self._lock:
+                self._slow.appendleft({
+                    'ms': seconds * 1000,
+                    'endpoint': request.endpoint,
+                    'statement': statement[:STATEMENT_CHARS],
+                    'at': time.time(),
+                })
+
+    def _start_request(self):
+        g._perf = RequestProfile()
+
+    def _after_request(self, response):
+        profile = g.get('_perf')
+        if profile is None:
+            return response
+        record = partial(self._record, request.endpoint, profile)
+        if response.is_streamed:
+            # The body (and its queries) runs after this hook; the server closes it when done
+            response.call_on_close(record)
+        else:
+            record()
+        if self.headers:
+            elapsed_ms = (time.perf_counter() - profile.started) * 1000
+            sql_ms = profile.sql_seconds * 1000
+            response.headers['X-Query-Count'] = str(profile.count)
+            response.headers['X-Query-Time-Ms'] = f'{sql_ms:.1f}'
+            response.headers['X-Repeated-Queries'] = str(len(profile.repeated(self.repeat_threshold)))
+            response.headers['Server-Timing'] = (
+                f'sql;dur={sql_ms:.1f};desc="{profile.count} queries", app;dur={elapsed_ms:.1f}'
+            )
+        return response
+
+    def _record(self, endpoint, profile):
+        if endpoint is None or endpoint == 'static':
+            return
+        elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        repeated = profile.repeated(self.repeat_threshold)
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats(self.window)
+            stats.requests += 1
+            stats.samples.append((elapsed_ms, profile.count, profile.sql_seconds * 1000))
+            for shape, n in repeated:
+                seen = stats.repeated.setdefault(shape, [0, 0])
+                seen[0] += 1
+                seen[1] = max(seen[1], n)
+
+    def report(self):
+        """Per-endpoint rows (slowest p95 first), repeated statement shapes and recent slow statements."""
+        with self._lock:
+            endpoints = [(name, stats.requests, list(stats.samples), dict(stats.repeated))
+                         for name, stats in self._endpoints.items()]
+            slow = list(self._slow)
+
+        rows, repeated = [], []
+        for name, requests, samples, shapes in endpoints:
+            times = sorted(sample[0] for sample in samples)
+            counts = [sample[1] for sample in samples]
+            sql_times = sorted(sample[2] for sample in samples)
+            rows.append({
+                'endpoint': name,
+                'requests': requests,
+                'p50': percentile(times, 50),
+                'p95': percentile(times, 95),
+                'p99': percentile(times, 99),
+                'avg_queries': sum(counts) / len(counts),
+                'max_queries': max(counts),
+                'sql_p95': percentile(sql_times, 95),
+            })
+            for shape, (seen, most) in shapes.items():
+                repeated.append({'endpoint': name, 'statement': shape[:STATEMENT_CHARS],
+                                 'requests': seen, 'most': most})
+        rows.sort(key=lambda row: row['p95'], reverse=True)
+        repeated.sort(key=lambda row: row['most'], reverse=True)
+        return {'endpoints': rows, 'repeated': repeated, 'slow': slow, 'window': self.window,
+                'slow_ms': self.slow_ms, 'repeat_threshold': self.repeat_threshold}
+
+
+query_profiler = QueryProfiler()
@@ -1,4 +1,22 @@
 from routes.routes import *
+from availability import get_free_grid
+from slot_grid import SlotGrid
+from sqlalchemy import select
+from pagination import paginate_from_request, APPOINTMENT_KEY
+from identity import invalidate_identity
+from directory import invalidate_directory
+from schedule_writer import apply_weekly_schedule, weekly_grid_from_form, set_slot_minutes
+from forms import chosen_slot_minutes, offer_slots, SETUP_HOURS
+from doctor_stats import get_doctor_counts, get_doctor_total
+from summaries import build_summaries
+from export import export_chunks, parse_export_filters, FORMATS as EXPORT_FORMATS
+from flask import Response, stream_with_context
+from perf import query_profiler
+from fragments import fragment_cache
+from listings import appointment_listing
+from search import search_people, treatment_search_page, highlight, SUGGEST_LIMIT, SUGGEST_CANDIDATES
+from flask import jsonify
+from booking import doctor_slot_minutes, overlapping_booking
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -12,15 +30,123 @@ def dashboard():
         return redirect(url_for('login'))
     
     today = date.today()
-    todays_appointments = Appointment.query.filter(Appointment.date == today)
-    future_appointments = Appointment.query.filter(Appointment.date > today).order_by(Appointment.date).all()
+    todays_appointments = appointment_listing('doctor', 'patient').filter(
+        Appointment.date == today
+    ).order_by(Appointment.time, Appointment.id).all()
+    future_appointments = paginate_from_request(
+        appointment_listing('doctor', 'patient').filter(Appointment.date > today),
+        APPOINTMENT_KEY
+    )
 
     return render_template(
         'admin/dashboard.html',
         todays_appointments = todays_appointments,
-        future_appointments =future_appointments
+        future_appointments =future_appointments,
+        last_summary_run = SummaryRun.query.order_by(SummaryRun.id.desc()).first()
+    )
+
+@admin_bp.route('/summaries/refresh', methods=['POST'])
+@login_required
+def refresh_summaries():
+    if current_user.role != 'Admin':
+        flash('Access Denied', 'danger')
+        return redirect(url_for('login'))
+
+    run = build_summaries()
+    flash(f'Summary reports rebuilt from {run.appointment_count} appointments in {run.seconds}s.', 'success')
+    return redirect(url_for('admin.dashboard') + '#summary')
+
+@admin_bp.route('/perf')
+@login_required
+def perf():
+    if current_user.role != 'Admin':
+        flash('Access Denied', 'danger')
+        return redirect(url_for('login'))
+
+    return render_template('admin/perf.html', report=query_profiler.report(), fragments=fragment_cache.stats())
+
+@admin_bp.route('/perf/reset', methods=['POST'])
+@login_required
+def reset_perf():
+    if current_user.role != 'Admin':
+        flash('Access Denied', 'danger')
+        return redirect(url_for('login'))
+
+    query_profiler.reset()
+    fragment_cache.reset_stats()
+    flash('Performance counters cleared.', 'success')
+    return redirect(url_for('admin.perf'))
+
+### SEARCH ###
+
+SEARCH_ROLES = ('Patient', 'Doctor', 'Admin')
+
+
+def person_url(hit):
+    if hit.doctor_id:
+        return url_for('admin.view_doctor_detail', doctor_id=hit.doctor_id)
+    if hit.patient_id:
+        return url_for('admin.view_patient_detail', patient_id=hit.patient_id)
+    return None
+
+
+@admin_bp.route('/search')
+@login_required
+def search():
+    if current_user.role != 'Admin':
+        flash('Access Denied', 'danger')
+        return redirect(url_for('login'))
+
+    q = request.args.get('q', '').strip()
+    role = request.args.get('role') if request.args.get('role') in SEARCH_ROLES else None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 25
+
+    # One extra row tells us whether there is a next page without counting every match
+    hits = search_people(q, role, limit=per_page + 1, offset=(page - 1) * per_page) if q else []
+    return render_template(
+        'admin/search.html',
+        q=q,
+        role=role,
+        roles=SEARCH_ROLES,
+        page=page,
+        has_next=len(hits) > per_page,
+        results=[(hit, person_url(hit)) for hit in hits[:per_page]]
     )
 
+@admin_bp.route('/search/suggest')
+@login_required
+def search_suggest():
+    """Typeahead for the navbar search box: the best few matches for ?q= as JSON."""
+    if current_user.role != 'Admin':
+        abort(403)
+
+    q = request.args.get('q', '').strip()
+    role = request.args.get('role') if request.args.get('role') in SEARCH_ROLES else None
+    hits = search_people(q, role, limit=SUGGEST_LIMIT, candidates=SUGGEST_CANDIDATES)
+    return jsonify({
+        'query': q,
+        'results': [{
+            'user_id': hit.user_id,
+            'name': hit.name,
+            'email': hit.email,
+            'role': hit.role,
+            'url': person_url(hit)
+        } for hit in hits]
+    })
+
+@admin_bp.route('/records/search')
+@login_required
+def search_records():
+    """Ranked search over all treatment records (disease, diagnosis, prescription, notes)."""
+    if current_user.role != 'Admin':
+        flash('Access Denied', 'danger')
+        return redirect(url_for('login'))
+
+    q = request.args.get('q', '').strip()
+    results = treatment_search_page(q, request.args.get('after'), request.args.get('before')) if q else []
+    return render_template('admin/treatment_search.html', q=q, results=results, highlight=highlight)
+
 ###  APPOINTMENT MANAGEMENT ###
 
 @admin_bp.route('/appointments')
@@ -30,13 +156,42 @@ def view_appt():
         flash('Access Denied', 'danger')
         return redirect(url_for('login'))
     
-    all_appointments = Appointment.query.options(
-        joinedload(Appointment.patient).joinedload(Patient.user),
-        joinedload(Appointment.doctor).joinedload(Doctor.user),
-        joinedload(Appointment.treatment)
-    ).order_by(Appointment.date.desc(), Appointment.time.desc()).all()
+    all_appointments = paginate_from_request(
+        appointment_listing('doctor', 'patient', 'treatment'),
+        APPOINTMENT_KEY,
+        descending=True,
+        default_per_page=50
+    )
+
+    return render_template('admin/appts.html', appointments=all_appointments, statuses=AppointmentStatus)
+
+@admin_bp.route('/appointments/export')
+@login_required
+def export_appointments():
+    """Stream appointments + treatments as CSV or NDJSON (?format=, ?from=, ?to=, ?doctor_id=, ?status=)."""
+    if current_user.role != 'Admin':
+        flash('Access Denied', 'danger')
+        return redirect(url_for('login'))
 
-    return render_template('admin/appts.html', appointments=all_appointments)
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        abort(400, description="format must be csv or ndjson")
+    try:
+        filters = parse_export_filters(
+            request.args.get('from'),
+            request.args.get('to'),
+            request.args.get('doctor_id'),
+            request.args.get('status')
+        )
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    filename = f"appointments-{date.today().isoformat()}.{fmt}"
+    return Response(
+        stream_with_context(export_chunks(fmt, **filters)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @admin_bp.route('/appointment/delete/<int:appointment_id>', methods=['POST'])
 @login_required
@@ -92,21 +247,11 @@ def edit_appt(appointment_id):
         except ValueError:
             pass
 
-    available_slots = []
+    available_slots = SlotGrid.from_times([appt.time])
     if target_doctor_id and target_date:
-        day_enum = DayOfWeek[target_date.strftime('%A').upper()]
-        slots = DoctorAvailability.query.filter_by(
-            doctor_id=target_doctor_id, 
-            day=day_enum
-        ).order_by(DoctorAvailability.start_time).all()
-        available_slots = [(s.start_time.strftime('%H:%M'), s.start_time.strftime('%H:%M')) for s in slots]
-
-    form.time.choices = available_slots
+        available_slots |= get_free_grid(target_doctor_id, target_date)
 
-    current_time_str = appt.time.strftime('%H:%M')
-    if (current_time_str, current_time_str) not in form.time.choices:
-        form.time.choices.append((current_time_str, current_time_str))
-        form.time.choices.sort()
+    form.time.choices = [(slot, slot) for slot in available_slots.labels()]
 
     if form.validate_on_submit():
         try:
@@ -114,7 +259,11 @@ def edit_appt(appointment_id):
             appt.date = form.date.data
             appt.time = datetime.strptime(form.time.data, '%H:%M').time()
             appt.problem = form.problem.data
+            appt.slot_minutes = doctor_slot_minutes(appt.doctor_id)
 
+            db.session.flush()
+            if overlapping_booking(appt) is not None:
+                raise ValueError('that time overlaps another appointment with the doctor')
             db.session.commit()
             flash('Appointment updated successfully', 'success')
             
@@ -145,21 +294,28 @@ def view_doctors():
         flash('Access Denied', 'danger')
         return redirect(url_for('login'))
     
+    today = date.today()
     doctors_with_stats = db.session.query(
-        Doctor,
-        func.count(case((Appointment.status == AppointmentStatus.COMPLETED, Appointment.id))).label('completed_count'),
-        func.count(case((Appointment.status == AppointmentStatus.BOOKED, Appointment.id))).label('pending_count'),
-        func.count(case((Appointment.date == date.today(), Appointment.id))).label('today_count')
-    ).outerjoin(Appointment).group_by(Doctor.id).all()
+        Doctor.id,
+        User.name,
+        Doctor.specialization,
+        func.coalesce(DoctorStats.completed_count, 0),
+        func.coalesce(DoctorStats.booked_count, 0),
+        func.coalesce(DoctorDailyStats.booked_count + DoctorDailyStats.completed_count + DoctorDailyStats.cancelled_count, 0)
+    ).outerjoin(User, Doctor.user_id == User.id).outerjoin(
+        DoctorStats, DoctorStats.doctor_id == Doctor.id
+    ).outerjoin(
+        DoctorDailyStats, (DoctorDailyStats.doctor_id == Doctor.id) & (DoctorDailyStats.date == today)
+    ).order_by(Doctor.id).all()
 
     doctor_data = [{
-        'id': doc.id,
-        'name': doc.user.name if doc.user else 'N/A',
-        'specialization': doc.specialization,
+        'id': doctor_id,
+        'name': name or 'N/A',
+        'specialization': specialization,
         'today_count': today_count,
         'completed_count': completed_count,
         'pending_count': pending_count
-    } for doc, completed_count, pending_count, today_count in doctors_with_stats]
+    } for doctor_id, name, specialization, completed_count, pending_count, today_count in doctors_with_stats]
 
     return render_template('admin/doctors.html', doctors=doctor_data)
 
@@ -173,20 +329,24 @@ def view_doctor_detail(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
     availability_schedule = defaultdict(list)
 
-    slots = DoctorAvailability.query.filter_by(doctor_id=doctor.id).order_by(
-        DoctorAvailability.day, 
+    slots = DoctorAvailability.query.with_entities(
+        DoctorAvailability.day,
         DoctorAvailability.start_time
-    ).all()
-    for slot in slots:
-        time_format = f"{slot.start_time.strftime('%H:%M')}"
-        availability_schedule[slot.day.value].append(time_format)
+    ).filter_by(doctor_id=doctor.id).all()
+    weekly_grids = defaultdict(SlotGrid)
+    for day, start_time in slots:
+        weekly_grids[day] |= SlotGrid.from_times([start_time])
+    for day, grid in weekly_grids.items():
+        availability_schedule[day.value] = grid.labels()
     
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).all()
-
-    today = date.today()
-    today_count = sum(1 for appt in appointments if appt.date == today)
-    completed_count = sum(1 for appt in appointments if appt.status == AppointmentStatus.COMPLETED)
-    pending_count = sum(1 for appt in appointments if appt.status == AppointmentStatus.BOOKED)
+    today_count, completed_count, pending_count = get_doctor_counts(doctor.id, date.today())
+    # One page of the history, newest first; the total comes from the stats row loaded above
+    appointments = paginate_from_request(
+        appointment_listing('patient').filter(Appointment.doctor_id == doctor.id),
+        APPOINTMENT_KEY,
+        descending=True,
+        total=get_doctor_total(doctor.id)
+    )
 
     return render_template(
         'admin/doctor_detail.html',
@@ -208,38 +368,28 @@ def edit_doctor(doctor_id):
 
     doctor = Doctor.query.get_or_404(doctor_id)
     form = DoctorSetupForm(obj = doctor)
+    existing_slots = DoctorAvailability.query.filter_by(doctor_id=doctor.id).all()
+    slots_grid = SlotGrid.from_times(slot.start_time for slot in existing_slots)
+
+    # Slot checkboxes at the picked length ("Show Slots" reloads them); at the doctor's own
+    # length they include the current slots even if they don't line up with the form's hours
+    minutes = chosen_slot_minutes(form, doctor.slot_minutes)
+    offer_slots(form.available_slots, SETUP_HOURS, minutes, slots_grid if minutes == doctor.slot_minutes else None)
 
     if request.method == 'GET':
-        existing_slots = DoctorAvailability.query.filter_by(doctor_id=doctor.id).all()
         if existing_slots:
             days_set = {slot.day.name for slot in existing_slots}
-            slots_set = {slot.start_time.strftime('%H:%M') for slot in existing_slots}
 
             form.available_days.data = list(days_set)
-            form.available_slots.data = list(slots_set)
+            form.available_slots.data = slots_grid.labels()
 
-    if form.validate_on_submit():
+    if 'load_slots' not in request.form and form.validate_on_submit():
         try:
             doctor.specialization = form.specialization.data
-            DoctorAvailability.query.filter_by(doctor_id=doctor.id).delete()
-            selected_days = form.available_days.data
-            selected_slots = form.available_slots.data
-
-            for day_str in selected_days:
-                day_enum = DayOfWeek[day_str.upper()]
-                for slot_str in selected_slots:
-                    start_time = datetime.strptime(slot_str, '%H:%M').time()
-                    end_time_dt = datetime.combine(datetime.today(), start_time) + timedelta(minutes=30)
-                    end_time = end_time_dt.time()
-
-                    new_slot = DoctorAvailability(
-                        doctor_id=doctor.id,
-                        day=day_enum,
-                        start_time=start_time,
-                        end_time=end_time
-                    )
-                    db.session.add(new_slot)
-            db.session.commit()
+            schedule = weekly_grid_from_form(form.available_days.data, form.available_slots.data, minutes)
+            set_slot_minutes(doctor, minutes)
+            apply_weekly_schedule(doctor.id, schedule)
+            invalidate_identity(doctor.user_id)
 
             flash(f'Doctor {doctor.user.name}\'s profile has been updated successfully!', 'success')
             return redirect(url_for('admin.view_doctor_detail', doctor_id=doctor.id))
@@ -265,6 +415,8 @@ def delete_doctor(doctor_id):
         db.session.delete(user)
     
     db.session.commit()
+    invalidate_identity(doctor.user_id)
+    invalidate_directory()
 
     flash('Doctor and associated data deleted successfully', 'success')
     return redirect(url_for('admin.view_doctors'))
@@ -278,28 +430,88 @@ def view_patients():
         flash('Access Denied', 'danger')
         return redirect(url_for('login'))
     
-    from models import Patient
-    patients = Patient.query.all()
-    patients_data = []
-
-    for p in patients:
-        today = date.today()
-        age = today.year - p.dob.year - ((today.month, today.day) < (p.dob.month, p.dob.day))
-  
-        latest_appt = None
-        if p.appointments:
-            latest_appt = max(p.appointments, key = lambda appt:(appt.date, appt.time))
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    sort = request.args.get('sort', 'id')
+    order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+
+    query = db.session.query(
+        Patient.id,
+        User.name,
+        Patient.dob,
+        Patient.phone_number
+    ).join(User, Patient.user_id == User.id)
+
+    sort_columns = {
+        'id': Patient.id,
+        'name': User.name,
+        'age': Patient.dob,
+        'phone': Patient.phone_number,
+    }
+    if sort in ('total', 'latest'):
+        # Sorting on an aggregate needs it for every patient: one grouped pass over the
+        # (patient_id, date) index in patient order rather than a subquery per patient
+        query = query.outerjoin(Appointment, Appointment.patient_id == Patient.id).group_by(Patient.id)
+        sort_columns['total'] = func.count(Appointment.id)
+        sort_columns['latest'] = func.max(Appointment.date)
+    if sort not in sort_columns:
+        sort = 'id'
+    # Older patients have earlier dates of birth, so age ascending is dob descending
+    descending = (order == 'desc') != (sort == 'age')
+    sort_column = sort_columns[sort]
+    page_rows = query.add_columns(sort_column.label('sort_key')).order_by(
+        sort_column.desc() if descending else sort_column.asc(), Patient.id
+    ).limit(per_page).offset((page - 1) * per_page).subquery()
+
+    # The per-patient aggregates shown, as correlated subqueries over just this page's rows;
+    # each is an index lookup on (patient_id, date)
+    total_appointments = select(func.count(Appointment.id)).where(
+        Appointment.patient_id == page_rows.c.id
+    ).scalar_subquery().label('total_appointments')
+    latest = select(Appointment.date, Appointment.time).where(
+        Appointment.patient_id == page_rows.c.id
+    ).order_by(Appointment.date.desc(), Appointment.time.desc()).limit(1)
+    latest_date = latest.with_only_columns(Appointment.date).scalar_subquery().label('latest_date')
+    latest_time = latest.with_only_columns(Appointment.time).scalar_subquery().label('latest_time')
+
+    sort_key = page_rows.c.sort_key
+    total = Patient.query.count()
+    rows = db.session.query(
+        page_rows.c.id,
+        page_rows.c.name,
+        page_rows.c.dob,
+        page_rows.c.phone_number,
+        total_appointments,
+        latest_date,
+        latest_time
+    ).order_by(sort_key.desc() if descending else sort_key.asc(), page_rows.c.id).all()
 
+    today = date.today()
+    patients_data = []
+    for row in rows:
+        age = today.year - row.dob.year - ((today.month, today.day) < (row.dob.month, row.dob.day))
         patients_data.append({
-            'id': p.id,
-            'name': p.user.name,
-            'dob': p.dob,
+            'id': row.id,
+            'name': row.name,
+            'dob': row.dob,
             'age': age,
-            'phone_number': p.phone_number,
-            'latest_appointment': latest_appt,
-            'total_appointments': len(p.appointments)
+            'phone_number': row.phone_number,
+            'latest_date': row.latest_date,
+            'latest_time': row.latest_time,
+            'total_appointments': row.total_appointments
         })
-    return render_template('admin/patients.html', patients=patients_data)
+
+    pages = max((total + per_page - 1) // per_page, 1)
+    return render_template(
+        'admin/patients.html',
+        patients=patients_data,
+        page=page,
+        pages=pages,
+        per_page=per_page,
+        total=total,
+        sort=sort,
+        order=order
+    )
 
 @admin_bp.route('/patient/<int:patient_id>')
 @login_required
@@ -334,6 +546,7 @@ def delete_patient(patient_id):
         db.session.delete(user)
     
     db.session.commit()
+    invalidate_identity(patient.user_id)
     flash('Patient and associated data deleted successfully', 'success')
     return redirect(url_for('admin.view_patients'))
 
@@ -357,6 +570,7 @@ def edit_patient(patient_id):
             patient.phone_number = form.phone_number.data
 
             db.session.commit()
+            invalidate_identity(user.id)
             flash('Patient details updated successfully', 'success')
             # [FIX] Redirect to detail view, not list view
             return redirect(url_for('admin.view_patient_detail', patient_id=patient.id))
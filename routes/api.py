@@ -0,0 +1,201 @@
+from flask import Blueprint, Response, jsonify, request, abort
+from flask_login import login_required, current_user
+from datetime import datetime, timedelta
+from availability import AvailabilityRange, date_range
+from schedule_version import get_schedule_version
+from first_available import first_available, MAX_DAYS, MAX_RESULTS
+from leave import add_leave, overlapping_leave
+from database import db
+from models import Doctor, DoctorLeave
+
+api_bp = Blueprint('api', __name__)
+
+MAX_RANGE_DAYS = 31
+
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400, description=f"'{name}' must be YYYY-MM-DD")
+
+
+def parse_time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%H:%M').time()
+    except ValueError:
+        abort(400, description=f"'{name}' must be HH:MM")
+
+
+def parse_local_datetime(value):
+    """
+    ISO datetime -> naive local time, like everything the schedule stores. A value with an
+    offset ('...T09:00+05:30') is converted to this server's local time rather than having
+    the offset dropped.
+    """
+    value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+@api_bp.route('/doctors/<int:doctor_id>/availability')
+@login_required
+def doctor_availability(doctor_id):
+    """
+    Free slots for one doctor on ?date= or over ?from=&to= (inclusive, up to 31 days).
+    The ETag is built from the doctor's schedule_version, so revalidation costs one
+    primary-key lookup and a 304 when nothing has been booked or rescheduled.
+    """
+    single_date = parse_date_arg('date')
+    date_from = single_date or parse_date_arg('from')
+    date_to = single_date or parse_date_arg('to') or date_from
+    if date_from is None:
+        abort(400, description="pass ?date= or ?from=&to=")
+    if date_to < date_from or (date_to - date_from) >= timedelta(days=MAX_RANGE_DAYS):
+        abort(400, description=f"date range must be 1 to {MAX_RANGE_DAYS} days")
+
+    version = get_schedule_version(doctor_id)
+    if version is None:
+        abort(404)
+
+    etag = f"{doctor_id}-{version}-{date_from.isoformat()}-{date_to.isoformat()}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        availability = AvailabilityRange([doctor_id], date_from, date_to)
+        response = jsonify({
+            'doctor_id': doctor_id,
+            'version': version,
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'slot_minutes': availability.slot_length(doctor_id),
+            'slots': {day.isoformat(): availability.free_slots(doctor_id, day) for day in date_range(date_from, date_to)}
+        })
+
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate every time; the 304 path is the cheap one
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_bp.route('/availability/earliest')
+@login_required
+def earliest_availability():
+    """
+    The ?limit= (default 10, up to 50) earliest free slots across every doctor of
+    ?specialization= (any when omitted), searching ?from= (today) to ?to= (90 days ahead),
+    optionally only between the times of day ?after=HH:MM and ?before=HH:MM.
+    """
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to')
+    if date_from and date_to and date_to < date_from:
+        abort(400, description="'to' must not be before 'from'")
+    limit = request.args.get('limit', 10, type=int)
+    if not 1 <= limit <= MAX_RESULTS:
+        abort(400, description=f"limit must be 1 to {MAX_RESULTS}")
+
+    slots = first_available(
+        specialization=request.args.get('specialization'),
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit,
+        after=parse_time_arg('after'),
+        before=parse_time_arg('before')
+    )
+    return jsonify({
+        'specialization': request.args.get('specialization') or None,
+        'max_days': MAX_DAYS,
+        'slots': [{
+            'date': slot.date.isoformat(),
+            'time': slot.time,
+            'doctor_id': slot.doctor_id,
+            'doctor_name': slot.doctor_name,
+            'specialization': slot.specialization,
+            'slot_minutes': slot.slot_minutes,
+        } for slot in slots]
+    })
+
+
+def leave_json(block):
+    return {
+        'id': block.id,
+        'doctor_id': block.doctor_id,
+        'start': block.start_at.isoformat(timespec='minutes'),
+        'end': block.end_at.isoformat(timespec='minutes'),
+        'available': bool(block.is_available),
+    }
+
+
+def require_schedule_owner(doctor_id):
+    """Only the doctor or an admin may change a doctor's leave."""
+    if current_user.role != 'Admin' and current_user.doctor_id != doctor_id:
+        abort(403)
+
+
+@api_bp.route('/doctors/<int:doctor_id>/leave')
+@login_required
+def list_leave(doctor_id):
+    """The doctor's leave blocks overlapping ?from=&to= (dates, inclusive; default the next 90 days)."""
+    date_from = parse_date_arg('from') or datetime.now().date()
+    date_to = parse_date_arg('to') or date_from + timedelta(days=MAX_DAYS - 1)
+    if date_to < date_from:
+        abort(400, description="'to' must not be before 'from'")
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+    return jsonify({'doctor_id': doctor_id, 'leave': [leave_json(b) for b in overlapping_leave([doctor_id], start, end)]})
+
+
+@api_bp.route('/doctors/<int:doctor_id>/leave', methods=['POST'])
+@login_required
+def create_leave(doctor_id):
+    """
+    Add a block from a JSON body {"start": "YYYY-MM-DDTHH:MM", "end": ..., "available": false,
+    "reason": ...}; times with a UTC offset are converted to local time. Returns the block and
+    the BOOKED appointments inside it, which stay booked.
+    Only JSON is accepted: a cross-site form can't send it, so the session cookie alone can't be abused.
+    """
+    require_schedule_owner(doctor_id)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(415, description='send a JSON object')
+    try:
+        start_at = parse_local_datetime(body['start'])
+        end_at = parse_local_datetime(body['end'])
+    except (KeyError, TypeError, ValueError):
+        abort(400, description="'start' and 'end' must be YYYY-MM-DDTHH:MM")
+    if db.session.get(Doctor, doctor_id) is None:
+        abort(404)
+
+    try:
+        leave, collisions = add_leave(doctor_id, start_at, end_at,
+                                      is_available=bool(body.get('available')), reason=body.get('reason'))
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    return jsonify({
+        'leave': leave_json(leave),
+        'collisions': [{
+            'appointment_id': appt.id,
+            'date': appt.date.isoformat(),
+            'time': appt.time.strftime('%H:%M'),
+            'patient_id': appt.patient_id,
+            'patient_name': appt.patient.user.name,
+        } for appt in collisions]
+    }), 201
+
+
+@api_bp.route('/doctors/<int:doctor_id>/leave/<int:leave_id>', methods=['DELETE'])
+@login_required
+def delete_leave(doctor_id, leave_id):
+    require_schedule_owner(doctor_id)
+    leave = DoctorLeave.query.filter_by(id=leave_id, doctor_id=doctor_id).first_or_404()
+    db.session.delete(leave)
+    db.session.commit()
+    return Response(status=204)
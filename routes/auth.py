@@ -0,0 +1,172 @@
+from flask_login import login_user, login_required, current_user, logout_user
+from flask import render_template, request, redirect, url_for, flash
+from forms import LoginForm, RegisterForm, DoctorSetupForm, PatientSetupForm, chosen_slot_minutes, offer_slots, SETUP_HOURS
+from models import User, db, Doctor, Patient
+from passwords import password_hasher
+from schedule_writer import apply_weekly_schedule, weekly_grid_from_form
+from identity import invalidate_identity
+
+def login() :
+    loginform = LoginForm()
+    if loginform.validate_on_submit():
+        user = User.query.filter_by(email = loginform.email.data).first()
+
+        if user and password_hasher.verify(user.password, loginform.password.data):
+            if password_hasher.needs_rehash(user.password):
+                # Stored with an older algorithm/cost; upgrade while we have the plain password
+                user.password = password_hasher.hash(loginform.password.data)
+                db.session.commit()
+            login_user(user)
+            if user.role == 'Admin':
+                flash('Login Successful !', "success")
+                return redirect(url_for('admin.dashboard'))
+            
+            elif user.role == 'Doctor':
+                if not user.doctor_profile:
+                    flash('Please complete your profile before proceeding.', 'info')
+                    return redirect(url_for('doctor_setup'))
+                flash('Login Successful !', "success")
+                return redirect(url_for('doctor.dashboard'))
+            
+            elif user.role == 'Patient': # PATIENT
+                if not user.patient_profile:
+                    flash('Please complete your profile before proceeding.', 'info')
+                    return redirect(url_for('patient_setup'))
+                flash('Login Successful !', "success")
+                return redirect (url_for('patient.dashboard'))
+        else:
+            flash('Login Failed. Check email and password', 'danger')
+    
+    return render_template('index.html', form=loginform)
+
+
+def register():
+    registerform = RegisterForm()
+    if registerform.validate_on_submit():
+        user_by_username = User.query.filter_by(username = registerform.username.data).first()
+        user_by_email = User.query.filter_by(email = registerform.email.data).first()
+
+        if user_by_username and user_by_email :
+            flash("User with this username and email already exists. Please login.", "info")
+            return redirect(url_for("login"))
+        
+        elif user_by_username:
+            registerform.username.errors.append("This username is already taken. Choose a different one.")
+        
+        elif user_by_email:
+            registerform.email.errors.append("This email is already taken. Choose a different one.")
+        
+        else:
+            hashed_password = password_hasher.hash(registerform.password.data)
+            
+            new_user = User(username = registerform.username.data, 
+                            name = registerform.name.data,
+                            email = registerform.email.data,
+                            password = hashed_password,
+                            role = registerform.role.data)
+            
+            db.session.add(new_user)
+            db.session.commit()
+
+            login_user(new_user)
+            if new_user.role == 'Doctor':
+                flash('Account created! Please complete your doctor profile.', 'success')
+                return redirect(url_for('doctor_setup'))
+            elif new_user.role == 'Patient':
+                flash('Account created! Please complete your patient profile.', 'success')
+                return redirect(url_for('patient_setup'))
+            
+            return redirect(url_for('login'))
+
+    return render_template('register.html', form = registerform)
+
+@login_required
+def doctor_setup():
+    # Authorization checks
+    if current_user.role != 'Doctor':
+        flash("This page is only for doctors.", "warning")
+        return redirect(url_for('login'))
+    if current_user.doctor_id:
+        flash("You have already completed your profile setup.", "info")
+        return redirect(url_for('doctor.dashboard')) 
+
+    form = DoctorSetupForm()
+    # The slot checkboxes follow the chosen slot length; "Show Slots" reloads them without saving
+    minutes = chosen_slot_minutes(form)
+    offer_slots(form.available_slots, SETUP_HOURS, minutes)
+
+    if 'load_slots' not in request.form and form.validate_on_submit():
+        try:
+            new_doctor = Doctor(
+                user_id=current_user.id,
+                specialization=form.specialization.data,
+                slot_minutes=minutes
+            )
+            db.session.add(new_doctor)
+            db.session.flush()
+
+            # Profile and weekly schedule go in as one transaction
+            apply_weekly_schedule(new_doctor.id, weekly_grid_from_form(form.available_days.data, form.available_slots.data, minutes))
+            invalidate_identity(current_user.id)
+
+            flash("Doctor profile created successfully!", "success")
+            return redirect(url_for("doctor.dashboard"))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f"An error occurred: {e}", "danger")
+
+    return render_template("admin/doctor_setup.html", form=form, entity='doctor', edit_mode=False)
+
+@login_required
+def patient_setup():
+    if current_user.role != 'Patient':
+        flash('This page is only for patients', 'warning')
+        return redirect(url_for('login'))
+    if current_user.patient_id:
+        flash('You have already complted your profile setup.', 'info')
+        return redirect(url_for('patient.dashboard'))
+    
+    form = PatientSetupForm()
+
+    if form.validate_on_submit():
+        try:
+            new_patient = Patient(
+                user_id = current_user.id,
+                dob = form.dob.data,
+                phone_number = form.phone_number.data
+            )
+
+            current_user.db_user.name = form.name.data
+
+            db.session.add(new_patient)
+            db.session.commit()
+            invalidate_identity(current_user.id)
+
+            flash("Your profile has been completed successfully!", "success")
+            return redirect(url_for('patient.dashboard'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f"An error occured : {e}", "danger")
+    
+    elif request.method == 'GET':
+        form.name.data = current_user.name
+
+    return render_template(
+        "admin/doctor_setup.html", form=form, entity='patient', edit_mode=False)
+
+@login_required
+def logout():
+    invalidate_identity(current_user.id)
+    logout_user()  # Logs out the current user
+    flash("You have been logged out successfully.", "success")
+    return redirect(url_for('login'))  # Redirect to your login page
+
+
+def register_auth_routes(app):
+    # Plain app routes (not a blueprint) so url_for('login') etc. keep working everywhere
+    app.add_url_rule('/', view_func=login, methods=["GET", "POST"])
+    app.add_url_rule('/register', view_func=register, methods=["GET", "POST"])
+    app.add_url_rule('/doctor/setup', view_func=doctor_setup, methods=['GET', 'POST'])
+    app.add_url_rule('/patient/setup', view_func=patient_setup, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', view_func=logout)
@@ -1,12 +1,65 @@
 from routes.routes import *
 from models import *
-from forms import TreatmentForm, DoctorProfileForm, DailySlotForm
+from forms import TreatmentForm, DoctorProfileForm, DailySlotForm, LeaveForm, DAILY_HOURS
+from availability import AvailabilityRange, get_slot_table
+from slot_grid import SlotGrid, slot_choices
+from intervals import check_overlaps
+from schedule_writer import apply_slot_minutes
+from booking import overlapping_booking
+from sqlalchemy.exc import IntegrityError
+from pagination import paginate_from_request, APPOINTMENT_KEY
+from identity import invalidate_identity
+from directory import invalidate_directory
+from schedule_version import touch_schedule
+from summaries import get_summary
+from listings import appointment_listing
+from fragments import fragment_cache
+from markupsafe import Markup
+from search import treatment_search_page, highlight
+from leave import add_leave, upcoming_leave, colliding_appointments
 from datetime import date
 from datetime import datetime, timedelta
 from collections import defaultdict
 
 doctor_bp = Blueprint('doctor', __name__)
 
+
+def _slot_table(name, doctor, selected_date, free_label, empty_message=None):
+    """Rendered slot table for the date plus the slots open on it, cached until the doctor's schedule changes."""
+    def render():
+        slots = get_slot_table(doctor.id, selected_date)
+        return {
+            'html': render_template('doctor/_slot_table.html', slots=slots, selected_date=selected_date,
+                                    free_label=free_label, empty_message=empty_message),
+            'available': [s['time'] for s in slots if s['is_available']],
+            'slots': [s['time'] for s in slots],
+        }
+    return fragment_cache.get_or_render(name, doctor.id, selected_date, doctor.schedule_version, render)
+
+
+def _daily_slot_choices(doctor, table=None):
+    """
+    Checkboxes for one date: back-to-back slots over the daily hours at the doctor's slot
+    length, plus any slot already on that date (e.g. at another offset after a length change).
+    """
+    grid = SlotGrid.from_labels(label for label, _ in slot_choices(*DAILY_HOURS, doctor.slot_minutes))
+    if table:
+        grid |= SlotGrid.from_labels(table.get('slots', table['available']))
+    return [(label, label) for label in grid.labels()]
+
+
+def _upcoming_table(doctor, today):
+    # Every upcoming row is a BOOKED appointment, so a change to anything shown bumps schedule_version
+    def render():
+        upcoming_appointments = appointment_listing('patient').filter(
+            Appointment.doctor_id == doctor.id,
+            Appointment.date >= today,
+            Appointment.status == AppointmentStatus.BOOKED
+        ).order_by(Appointment.date, Appointment.time).all()
+        return render_template('doctor/_upcoming.html', upcoming_appointments=upcoming_appointments)
+    return fragment_cache.get_or_render('upcoming', doctor.id, today, doctor.schedule_version, render)
+
+
 @doctor_bp.route('/dashboard')
 @login_required
 def dashboard():
@@ -23,44 +76,24 @@ def dashboard():
         selected_date = date.today()
     today = date.today()
 
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.doctor_id == doctor.id,
-        Appointment.date >= today,
-        Appointment.status == AppointmentStatus.BOOKED
-    ).order_by(Appointment.date, Appointment.time).all()
-    
-    completed_appointments = Appointment.query.filter(
-        Appointment.doctor_id == doctor.id,
-        Appointment.status == AppointmentStatus.COMPLETED
-    ).order_by(Appointment.date.desc(), Appointment.time.desc()).all()
+    completed_appointments = paginate_from_request(
+        appointment_listing('patient', 'treatment').filter(
+            Appointment.doctor_id == doctor.id,
+            Appointment.status == AppointmentStatus.COMPLETED
+        ),
+        APPOINTMENT_KEY,
+        descending=True
+    )
 
-    # Build per-day slot view for the selected date (shows booked/free)
-    slots_display = []
-    day_enum = get_weekday_enum_for_date(selected_date)
-    weekly_slots = build_slots_from_availability(doctor, day_enum)
-    overrides = { (o.start_time.strftime('%H:%M')): o for o in DoctorAvailabilityOverride.query.filter_by(doctor_id=doctor.id, date=selected_date).all() }
-    appts_on_day = Appointment.query.filter_by(doctor_id=doctor.id, date=selected_date, status=AppointmentStatus.BOOKED).all()
-    booked_times = { a.time.strftime('%H:%M') for a in appts_on_day }
-
-    seen = set()
-    for st, et, label in weekly_slots:
-        seen.add(label)
-        override = overrides.get(label)
-        is_available = True if override is None else override.is_available
-        is_booked = label in booked_times
-        slots_display.append({'time': label, 'is_weekly': True, 'override': override, 'is_available': is_available, 'is_booked': is_booked})
-    for label, o in overrides.items():
-        if label not in seen:
-            is_booked = label in booked_times
-            slots_display.append({'time': label, 'is_weekly': False, 'override': o, 'is_available': o.is_available, 'is_booked': is_booked})
-    slots_display.sort(key=lambda x: datetime.strptime(x['time'], '%H:%M').time())
+    # Per-day slot view for the selected date (shows booked/free) and the upcoming list, both cached
+    slot_table = _slot_table('dashboard_slots', doctor, selected_date, 'Free', 'No slots configured for this date.')
 
     return render_template(
         'doctor/dashboard.html', 
         doctor=doctor, 
-        upcoming_appointments=upcoming_appointments,
+        upcoming_table=Markup(_upcoming_table(doctor, today)),
         completed_appointments=completed_appointments
-        , selected_date=selected_date, slots_display=slots_display
+        , selected_date=selected_date, slot_table=Markup(slot_table['html'])
     )
 
 
@@ -77,7 +110,10 @@ def edit_profile():
     if form.validate_on_submit():
         try:
             doctor.specialization = form.specialization.data
-            db.session.commit()
+            # Commits; a new slot length redraws the weekly schedule at that length
+            apply_slot_minutes(doctor, form.slot_minutes.data)
+            invalidate_identity(current_user.id)
+            invalidate_directory()
             flash('Profile updated successfully.', 'success')
             return redirect(url_for('doctor.dashboard'))
         except Exception as e:
@@ -86,23 +122,11 @@ def edit_profile():
 
     if request.method == 'GET':
         form.specialization.data = doctor.specialization
+        form.slot_minutes.data = doctor.slot_minutes
 
     return render_template('doctor/profile_edit.html', form=form, doctor=doctor)
 
 
-def get_weekday_enum_for_date(dt):
-    return DayOfWeek[dt.strftime('%A').upper()]
-
-
-def build_slots_from_availability(doctor, day_enum):
-    """Return list of tuples (start_time_obj, end_time_obj, str_label) for the weekly availability for given day."""
-    slots = []
-    avails = DoctorAvailability.query.filter_by(doctor_id=doctor.id, day=day_enum).order_by(DoctorAvailability.start_time).all()
-    for a in avails:
-        slots.append((a.start_time, a.end_time, a.start_time.strftime('%H:%M')))
-    return slots
-
-
 @doctor_bp.route('/slots', methods=['GET', 'POST'])
 @login_required
 def manage_slots():
@@ -113,35 +137,42 @@ def manage_slots():
 
     doctor = current_user.doctor_profile
     form = DailySlotForm()
+    if request.method == 'POST' and form.date.data:
+        form.slots.choices = _daily_slot_choices(doctor, _slot_table('manage_slots', doctor, form.date.data, 'Available'))
+    else:
+        form.slots.choices = _daily_slot_choices(doctor)
 
     selected_date = None
-    slots_display = []  # each item: {time, is_weekly, override, is_booked}
+    slot_table = ''
 
     if form.validate_on_submit():
         # Save overrides: Clear existing overrides for this date and create new ones based on comparison
         selected_date = form.date.data
         
         # 1. Get standard weekly slots for this day
-        day_enum = get_weekday_enum_for_date(selected_date)
-        weekly_slots_objs = build_slots_from_availability(doctor, day_enum)
-        weekly_times = set(s[2] for s in weekly_slots_objs) # s[2] is the string label 'HH:MM'
+        availability = AvailabilityRange([doctor.id], selected_date, selected_date)
+        weekly_grid = availability.weekly_grid(doctor.id, selected_date)
         
         # 2. Get slots selected in the form
-        selected_slots = set(form.slots.data or [])
+        selected_grid = SlotGrid.from_labels(form.slots.data or [])
+        try:
+            check_overlaps(selected_grid, doctor.slot_minutes)
+        except ValueError as e:
+            flash(f'{e}. Untick one of them.', 'danger')
+            return redirect(url_for('doctor.manage_slots') + f'?date={selected_date.strftime("%Y-%m-%d")}')
         
         # 3. Identify slots to BLOCK (Present in weekly, but unchecked in form)
-        to_block = weekly_times - selected_slots
+        to_block = weekly_grid - selected_grid
         
         # 4. Identify slots to ADD (Not in weekly, but checked in form)
-        to_add = selected_slots - weekly_times
+        to_add = selected_grid - weekly_grid
         
         # delete existing overrides for that date to start fresh
         DoctorAvailabilityOverride.query.filter_by(doctor_id=doctor.id, date=selected_date).delete()
+        touch_schedule(doctor.id)
         
         # Create BLOCKING overrides (is_available=False)
-        for slot_str in to_block:
-            st = datetime.strptime(slot_str, '%H:%M').time()
-            et = (datetime.combine(datetime.today(), st) + timedelta(minutes=30)).time()
+        for st, et in to_block.intervals(doctor.slot_minutes):
             override = DoctorAvailabilityOverride(
                 doctor_id=doctor.id,
                 date=selected_date,
@@ -152,9 +183,7 @@ def manage_slots():
             db.session.add(override)
 
         # Create ADDING overrides (is_available=True)
-        for slot_str in to_add:
-            st = datetime.strptime(slot_str, '%H:%M').time()
-            et = (datetime.combine(datetime.today(), st) + timedelta(minutes=30)).time()
+        for st, et in to_add.intervals(doctor.slot_minutes):
             override = DoctorAvailabilityOverride(
                 doctor_id=doctor.id,
                 date=selected_date,
@@ -186,41 +215,63 @@ def manage_slots():
         form.date.data = selected_date
 
     if selected_date:
-        day_enum = get_weekday_enum_for_date(selected_date)
-
-        # Build base weekly slots
-        weekly_slots = build_slots_from_availability(doctor, day_enum)
+        table = _slot_table('manage_slots', doctor, selected_date, 'Available')
+        slot_table = Markup(table['html'])
+        form.slots.choices = _daily_slot_choices(doctor, table)
 
-        # Apply overrides for the date
-        overrides = { (o.start_time.strftime('%H:%M')): o for o in DoctorAvailabilityOverride.query.filter_by(doctor_id=doctor.id, date=selected_date).all() }
-
-        # Find booked appointments for that doctor on that date
-        appts = Appointment.query.filter_by(doctor_id=doctor.id, date=selected_date, status=AppointmentStatus.BOOKED).all()
-        booked_times = { a.time.strftime('%H:%M') for a in appts }
-
-        # Include weekly slots and any override-only slots
-        seen = set()
-        for st, et, label in weekly_slots:
-            seen.add(label)
-            override = overrides.get(label)
-            is_available = True if override is None else override.is_available
-            is_booked = label in booked_times
-            slots_display.append({'time': label, 'is_weekly': True, 'override': override, 'is_available': is_available, 'is_booked': is_booked})
+        # Pre-select form slots for currently available slots (overrides that set availability true OR weekly slots present)
+        form.slots.data = list(table['available'])
 
-        # Add overrides that are not part of weekly (explicitly added)
-        for label, o in overrides.items():
-            if label not in seen:
-                is_booked = label in booked_times
-                slots_display.append({'time': label, 'is_weekly': False, 'override': o, 'is_available': o.is_available, 'is_booked': is_booked})
+    return render_template('doctor/manage_slots.html', form=form, slot_table=slot_table, selected_date=selected_date)
 
-        # Sort slots_display by time
-        slots_display.sort(key=lambda x: datetime.strptime(x['time'], '%H:%M').time())
+@doctor_bp.route('/leave', methods=['GET', 'POST'])
+@login_required
+def manage_leave():
+    """Block (or open) every slot in a date/time range at once, e.g. two weeks of leave."""
+    if current_user.role != 'Doctor':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('login'))
 
-        # Pre-select form slots for currently available slots (overrides that set availability true OR weekly slots present)
-        preselected = [s['time'] for s in slots_display if s['is_available']]
-        form.slots.data = preselected
+    form = LeaveForm()
+    if form.validate_on_submit():
+        try:
+            leave, collisions = add_leave(current_user.doctor_id, form.start_at.data, form.end_at.data,
+                                          is_available=form.kind.data == 'available', reason=form.reason.data)
+        except ValueError as e:
+            flash(str(e), 'danger')
+        else:
+            if collisions:
+                flash(f'Block saved. {len(collisions)} booked appointment(s) fall inside it and are listed below.', 'warning')
+            else:
+                flash('Block saved.', 'success')
+            return redirect(url_for('doctor.manage_leave', leave_id=leave.id))
+
+    # After saving, list the BOOKED appointments the new block collides with
+    collisions, checked = [], None
+    leave_id = request.args.get('leave_id', type=int)
+    if leave_id:
+        checked = DoctorLeave.query.filter_by(id=leave_id, doctor_id=current_user.doctor_id).first()
+        if checked and not checked.is_available:
+            collisions = colliding_appointments(checked.doctor_id, checked.start_at, checked.end_at)
+
+    return render_template('doctor/leave.html', form=form, blocks=upcoming_leave(current_user.doctor_id),
+                           checked=checked, collisions=collisions)
+
+
+@doctor_bp.route('/leave/<int:leave_id>/delete', methods=['POST'])
+@login_required
+def delete_leave(leave_id):
+    if current_user.role != 'Doctor':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('login'))
 
-    return render_template('doctor/manage_slots.html', form=form, slots=slots_display, selected_date=selected_date)
+    leave = DoctorLeave.query.get_or_404(leave_id)
+    if leave.doctor_id != current_user.doctor_id:
+        abort(403)
+    db.session.delete(leave)
+    db.session.commit()
+    flash('Block removed.', 'success')
+    return redirect(url_for('doctor.manage_leave'))
 
 @doctor_bp.route('/patient/<int:patient_id>/history')
 @login_required
@@ -233,7 +284,7 @@ def patient_history(patient_id):
     
     appointments = Appointment.query.filter_by(
         patient_id=patient.id, 
-        doctor_id=current_user.doctor_profile.id
+        doctor_id=current_user.doctor_id
     ).order_by(Appointment.date.desc(), Appointment.time.desc()).all()
 
     return render_template(
@@ -250,7 +301,7 @@ def treat_patient(appointment_id):
         return redirect(url_for('login'))
 
     appointment = Appointment.query.get_or_404(appointment_id)
-    if appointment.doctor_id != current_user.doctor_profile.id:
+    if appointment.doctor_id != current_user.doctor_id:
         abort(403)
 
     form = TreatmentForm()
@@ -280,15 +331,47 @@ def update_appointment_status(appointment_id):
         return redirect(url_for('login'))
 
     appointment = Appointment.query.get_or_404(appointment_id)
-    if appointment.doctor_id != current_user.doctor_profile.id:
+    if appointment.doctor_id != current_user.doctor_id:
         abort(403)
 
     new_status = request.form.get('status')
     if new_status in [status.name for status in AppointmentStatus]:
         appointment.status = AppointmentStatus[new_status]
-        db.session.commit()
-        flash(f'Appointment status updated to {new_status}.', 'success')
+        # Re-booking a cancelled appointment whose slot has since been taken: the unique index
+        # catches the same start time, overlapping_booking a booking of another length overlapping it
+        try:
+            db.session.flush()
+            taken = appointment.status == AppointmentStatus.BOOKED and overlapping_booking(appointment) is not None
+        except IntegrityError:
+            taken = True
+        if taken:
+            db.session.rollback()
+            flash('That slot has already been booked by another patient.', 'danger')
+        else:
+            db.session.commit()
+            flash(f'Appointment status updated to {new_status}.', 'success')
     else:
         flash('Invalid status.', 'danger')
 
-    return redirect(url_for('doctor.dashboard'))
\ No newline at end of file
+    return redirect(url_for('doctor.dashboard'))
+
+@doctor_bp.route('/records/search')
+@login_required
+def search_records():
+    """Ranked search over this doctor's own treatment records (disease, diagnosis, prescription, notes)."""
+    if current_user.role != 'Doctor':
+        flash("Access denied.", "danger")
+        return redirect(url_for('login'))
+
+    q = request.args.get('q', '').strip()
+    results = treatment_search_page(q, request.args.get('after'), request.args.get('before'), doctor_id=current_user.doctor_id) if q else []
+    return render_template('doctor/treatment_search.html', q=q, results=results, highlight=highlight)
+
+@doctor_bp.route('/summary')
+@login_required
+def summary():
+    if current_user.role != 'Doctor':
+        flash("Access denied.", "danger")
+        return redirect(url_for('login'))
+
+    return render_template('doctor/summary.html', summary=get_summary('Doctor', current_user.doctor_id))
@@ -2,9 +2,28 @@ from flask import jsonify
 from routes.routes import *
 from models import *
 from forms import FeedbackForm, PatientSetupForm, AppointmentForm
-from datetime import datetime, date
+from availability import get_free_grid
+from booking import reserve_slot, doctor_slot_minutes, overlapping_booking
+from sqlalchemy.exc import IntegrityError
+from pagination import paginate_from_request, APPOINTMENT_KEY
+from identity import invalidate_identity
+from directory import search_directory, specializations
+from slot_grid import SlotGrid
+from summaries import get_summary
+from listings import appointment_listing
+from search import treatment_search_page, highlight
+from first_available import first_available
+from datetime import datetime, date, time
 patient_bp = Blueprint('patient', __name__)
 
+FIRST_AVAILABLE_LIMIT = 15
+# Time-of-day choices on the first-available page: label -> (after, before)
+FIRST_AVAILABLE_WINDOWS = {
+    'morning': (None, time(12, 0)),
+    'afternoon': (time(12, 0), time(17, 0)),
+    'evening': (time(17, 0), None),
+}
+
 ## PATIENT DASHBOARD ##
 
 @patient_bp.route('/dashboard')
@@ -19,17 +38,21 @@ def dashboard():
 
     age = today.year - patient.dob.year - ((today.month, today.day) < (patient.dob.month, patient.dob.day))
 
-    future_appointments = Appointment.query.filter(
+    future_appointments = appointment_listing('doctor').filter(
         Appointment.patient_id == patient.id,
         Appointment.date >= today,
         Appointment.status == AppointmentStatus.BOOKED,
         Appointment.date >= today
         ).order_by(Appointment.date, Appointment.time).all()
     
-    past_appointments = Appointment.query.filter(
-        Appointment.patient_id == patient.id,
-        Appointment.date < today
-        ).order_by(Appointment.date.desc(), Appointment.time.desc()).all()
+    past_appointments = paginate_from_request(
+        appointment_listing('doctor', 'treatment', columns=('rating', 'remarks')).filter(
+            Appointment.patient_id == patient.id,
+            Appointment.date < today
+        ),
+        APPOINTMENT_KEY,
+        descending=True
+    )
     
     return render_template('patient/dashboard.html', patient=patient, 
                            age=age, 
@@ -40,7 +63,7 @@ def dashboard():
 @login_required
 def edit_profile():
     form = PatientSetupForm()
-    user = current_user
+    user = current_user.db_user
     patient_profile = user.patient_profile
 
     if form.validate_on_submit():
@@ -49,6 +72,7 @@ def edit_profile():
         patient_profile.phone_number = form.phone_number.data
         
         db.session.commit()
+        invalidate_identity(user.id)
 
         flash('Profile updated successfully.', 'success')
         return redirect(url_for('patient.dashboard'))
@@ -70,7 +94,7 @@ def edit_profile():
 def edit_appt(appointment_id):
     appt = Appointment.query.get_or_404(appointment_id)
 
-    if appt.patient_id != current_user.patient_profile.id:
+    if appt.patient_id != current_user.patient_id:
         abort(403)
     
     if appt.date < date.today():
@@ -101,16 +125,14 @@ def edit_appt(appointment_id):
             except: pass
 
         if req_doctor_id and req_date:
-            available_slots = get_available_slots(req_doctor_id, req_date)
+            available_slots = get_free_grid(req_doctor_id, req_date)
             
             # Important: If keeping the same doctor/date, ensure the current time is a valid choice
-            # even if get_available_slots (correctly) marks it as booked.
+            # even if get_free_grid (correctly) marks it as booked.
             if req_doctor_id == appt.doctor_id and req_date == appt.date:
-                current_time_str = appt.time.strftime('%H:%M')
-                if current_time_str not in available_slots:
-                    available_slots.append(current_time_str)
+                available_slots |= SlotGrid.from_times([appt.time])
             
-            form.time.choices = [(slot, slot) for slot in sorted(available_slots)]
+            form.time.choices = [(slot, slot) for slot in available_slots.labels()]
         else:
             form.time.choices = []
     # --- FIX END ---
@@ -126,12 +148,21 @@ def edit_appt(appointment_id):
             try:
                 appt.time = datetime.strptime(form.time.data, '%H:%M').time()
                 appt.problem = form.problem.data
+                appt.slot_minutes = doctor_slot_minutes(appt.doctor_id)
 
-                db.session.commit()
-                flash('Appointment updated successfully.', 'success')
-                return redirect(url_for('patient.dashboard'))
+                db.session.flush()
+                if overlapping_booking(appt) is not None:
+                    db.session.rollback()
+                    flash('This time overlaps another appointment with the doctor. Please select another time.', 'danger')
+                else:
+                    db.session.commit()
+                    flash('Appointment updated successfully.', 'success')
+                    return redirect(url_for('patient.dashboard'))
             except ValueError:
                 flash('Invalid time format selected.', 'danger')
+            except IntegrityError:
+                db.session.rollback()
+                flash('This time slot is already booked. Please select another time.', 'danger')
     
     elif request.method == 'GET':
         form.doctor_id.data = appt.doctor_id
@@ -141,12 +172,10 @@ def edit_appt(appointment_id):
 
         # Load slots for the current appointment
         if appt.doctor_id and appt.date:
-            available_slots = get_available_slots(appt.doctor_id, appt.date)
-            current_time_str = appt.time.strftime('%H:%M')
-            if current_time_str not in available_slots:
-                available_slots.append(current_time_str)
+            available_slots = get_free_grid(appt.doctor_id, appt.date)
+            available_slots |= SlotGrid.from_times([appt.time])
             if available_slots:
-                form.time.choices = [(slot, slot) for slot in sorted(available_slots)]
+                form.time.choices = [(slot, slot) for slot in available_slots.labels()]
 
     return render_template('patient/patient_forms.html', form=form, appointment=appt, form_type='edit_appt')
 
@@ -155,7 +184,7 @@ def edit_appt(appointment_id):
 def delete_appointment(appointment_id):
     appt = Appointment.query.get_or_404(appointment_id)
 
-    if appt.patient_id != current_user.patient_profile.id:
+    if appt.patient_id != current_user.patient_id:
         abort(403)
     
     # Only allow deleting upcoming appointments (not past appointments)
@@ -178,7 +207,7 @@ def delete_appointment(appointment_id):
 def cancel_appt(appointment_id):
     appt = Appointment.query.get_or_404(appointment_id)
 
-    if appt.patient_id != current_user.patient_profile.id:
+    if appt.patient_id != current_user.patient_id:
         abort(403)
 
     if appt.date < date.today():
@@ -200,7 +229,7 @@ def feedback(appointment_id):
     appt = Appointment.query.get_or_404(appointment_id)
     form = FeedbackForm()
 
-    if appt.patient_id != current_user.patient_profile.id:
+    if appt.patient_id != current_user.patient_id:
         abort(403)
 
     if appt.status != AppointmentStatus.COMPLETED:
@@ -233,7 +262,7 @@ def book_appt():
         return redirect(url_for('login'))
     
     # Check if patient profile exists
-    if not current_user.patient_profile:
+    if not current_user.patient_id:
         flash('Patient profile not found. Please complete your profile first.', 'danger')
         return redirect(url_for('patient.dashboard'))
     
@@ -290,20 +319,22 @@ def book_appt():
                 # Pre-populate form
                 form.doctor_id.data = doctor_id
                 form.date.data = selected_date
+                # Coming from the first-available search: preselect the slot picked there
+                form.time.data = request.args.get('time')
             except ValueError:
                 pass
     
     # Always populate slots if doctor and date are available (before validation)
-    available_slots = []
+    available_slots = SlotGrid()
     final_doctor_id = doctor_id or form.doctor_id.data
     final_date = selected_date or form.date.data
     
     if final_doctor_id and final_date:
-        available_slots = get_available_slots(final_doctor_id, final_date)
+        available_slots = get_free_grid(final_doctor_id, final_date)
         
         # Update form time choices with available slots
         if available_slots:
-            form.time.choices = [(slot, slot) for slot in sorted(available_slots)]
+            form.time.choices = [(slot, slot) for slot in available_slots.labels()]
         else:
             form.time.choices = [('', 'No available slots for this date')]
     else:
@@ -326,8 +357,8 @@ def book_appt():
             flash('Please select a time slot.', 'danger')
             # Re-populate slots for re-rendering
             if form.doctor_id.data and form.date.data:
-                available_slots = get_available_slots(form.doctor_id.data, form.date.data)
-                form.time.choices = [(slot, slot) for slot in sorted(available_slots)] if available_slots else []
+                available_slots = get_free_grid(form.doctor_id.data, form.date.data)
+                form.time.choices = [(slot, slot) for slot in available_slots.labels()] if available_slots else []
             return render_template('patient/Appt_booking.html', form=form, title="Booking New Appointment")
         
         try:
@@ -336,24 +367,8 @@ def book_appt():
             flash('Invalid time format. Please select a valid time slot.', 'danger')
             # Re-populate slots for re-rendering
             if form.doctor_id.data and form.date.data:
-                available_slots = get_available_slots(form.doctor_id.data, form.date.data)
-                form.time.choices = [(slot, slot) for slot in sorted(available_slots)] if available_slots else []
-            return render_template('patient/Appt_booking.html', form=form, title="Booking New Appointment")
-
-        # Check if the slot is still available (prevent double-booking)
-        existing_appointment = Appointment.query.filter_by(
-            doctor_id=form.doctor_id.data,
-            date=form.date.data,
-            time=appointment_time,
-            status=AppointmentStatus.BOOKED
-        ).first()
-
-        if existing_appointment:
-            flash('This time slot is already booked. Please select another time.', 'danger')
-            # Re-populate slots for re-rendering
-            if form.doctor_id.data and form.date.data:
-                available_slots = get_available_slots(form.doctor_id.data, form.date.data)
-                form.time.choices = [(slot, slot) for slot in sorted(available_slots)] if available_slots else []
+                available_slots = get_free_grid(form.doctor_id.data, form.date.data)
+                form.time.choices = [(slot, slot) for slot in available_slots.labels()] if available_slots else []
             return render_template('patient/Appt_booking.html', form=form, title="Booking New Appointment")
 
         # Validate that the date is not in the past
@@ -361,118 +376,106 @@ def book_appt():
             flash('Cannot book appointments in the past. Please select a future date.', 'danger')
             # Re-populate slots for re-rendering
             if form.doctor_id.data and form.date.data:
-                available_slots = get_available_slots(form.doctor_id.data, form.date.data)
-                form.time.choices = [(slot, slot) for slot in sorted(available_slots)] if available_slots else []
+                available_slots = get_free_grid(form.doctor_id.data, form.date.data)
+                form.time.choices = [(slot, slot) for slot in available_slots.labels()] if available_slots else []
             return render_template('patient/Appt_booking.html', form=form, title="Booking New Appointment")
 
         # Check if patient profile exists
-        if not current_user.patient_profile:
+        if not current_user.patient_id:
             flash('Patient profile not found. Please contact administrator.', 'danger')
             return redirect(url_for('patient.dashboard'))
         
-        new_appointment = Appointment(
-            patient_id = current_user.patient_profile.id,
-            doctor_id = form.doctor_id.data,
-            date = form.date.data,
-            time = appointment_time,
-            problem = form.problem.data,
-            status = AppointmentStatus.BOOKED
+        # The INSERT is the double-booking check: a concurrent booking of the same slot loses here
+        new_appointment = reserve_slot(
+            patient_id=current_user.patient_id,
+            doctor_id=form.doctor_id.data,
+            appt_date=form.date.data,
+            appt_time=appointment_time,
+            problem=form.problem.data
         )
 
-        try:
-            db.session.add(new_appointment)
-            db.session.commit()
-            flash('Appointment booked successfully.', 'success')
-            return redirect(url_for('patient.dashboard'))
-        except Exception as e:
-            db.session.rollback()
-            flash('An error occurred while booking the appointment. Please try again.', 'danger')
+        if new_appointment is None:
+            flash('This time slot is already booked. Please select another time.', 'danger')
             # Re-populate slots for re-rendering
-            if form.doctor_id.data and form.date.data:
-                available_slots = get_available_slots(form.doctor_id.data, form.date.data)
-                form.time.choices = [(slot, slot) for slot in sorted(available_slots)] if available_slots else []
+            available_slots = get_free_grid(form.doctor_id.data, form.date.data)
+            form.time.choices = [(slot, slot) for slot in available_slots.labels()] if available_slots else []
             return render_template('patient/Appt_booking.html', form=form, title="Booking New Appointment")
+
+        flash('Appointment booked successfully.', 'success')
+        return redirect(url_for('patient.dashboard'))
     
     return render_template('patient/Appt_booking.html', form=form, title="Booking New Appointment")
 
-def get_available_slots(doctor_id, selected_date):
-    """Helper function to get available slots for a doctor on a given date"""
-    try:
-        day_of_week = selected_date.strftime('%A').upper()
-
-        # Get all available slots for the doctor on this day of week
-        available_slots = DoctorAvailability.query.filter_by(
-            doctor_id=doctor_id,
-            day=DayOfWeek[day_of_week]
-        ).all()
-
-        # Get all already booked appointments for this doctor on this date
-        booked_appointments = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            date=selected_date,
-            status=AppointmentStatus.BOOKED
-        ).all()
-
-        # Extract booked times as strings
-        booked_times = {appt.time.strftime('%H:%M') for appt in booked_appointments}
-
-        # Filter out booked slots
-        available_times = [
-            slot.start_time.strftime('%H:%M') 
-            for slot in available_slots 
-            if slot.start_time.strftime('%H:%M') not in booked_times
-        ]
-
-        return available_times
-    except (ValueError, KeyError):
-        return []
-
 @patient_bp.route('/doctors')
 @login_required
 def list_doctors():
-    doctors = Doctor.query.join(User).all()
-    availability_by_doctor = {}
+    specialization = request.args.get('specialization', '')
+    day_name = request.args.get('day', '')
+    day = DayOfWeek[day_name] if day_name in DayOfWeek.__members__ else None
+
+    doctors = search_directory(specialization=specialization, day=day)
+
+    return render_template(
+        'patient/list_doctors.html',
+        doctors=doctors,
+        specializations=specializations(),
+        days=list(DayOfWeek),
+        selected_specialization=specialization,
+        selected_day=day
+    )
+
+@patient_bp.route('/first-available')
+@login_required
+def first_available_slots():
+    """Earliest free slots across all doctors of a specialization, each linking to the booking form."""
+    if current_user.role != 'Patient':
+        flash("Access denied.", "danger")
+        return redirect(url_for('login'))
 
-    for doctor in doctors:
-        availability = DoctorAvailability.query.filter_by(doctor_id=doctor.id).all()
-        availability_by_doctor[doctor.id] = {
-            'days': sorted(list(set([avail.day.value for avail in availability]))),
-            'slots': sorted(list(set([avail.start_time.strftime('%H:%M') for avail in availability])))
-        }
+    specialization = request.args.get('specialization', '')
+    window = request.args.get('window', '')
+    after, before = FIRST_AVAILABLE_WINDOWS.get(window, (None, None))
 
-    return render_template('patient/list_doctors.html', doctors=doctors, availability_by_doctor=availability_by_doctor)
+    slots = None
+    if 'specialization' in request.args:
+        slots = first_available(specialization=specialization, after=after, before=before, limit=FIRST_AVAILABLE_LIMIT)
+
+    return render_template(
+        'patient/first_available.html',
+        slots=slots,
+        specializations=specializations(),
+        windows=FIRST_AVAILABLE_WINDOWS,
+        selected_specialization=specialization,
+        selected_window=window
+    )
 
 @patient_bp.route('/get-slots/<int:doctor_id>/<string:date_str>')
 @login_required
 def get_slots(doctor_id, date_str):
     try:
         selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        day_of_week = selected_date.strftime('%A').upper()
-
-        # Get all available slots for the doctor on this day of week
-        available_slots = DoctorAvailability.query.filter_by(
-            doctor_id=doctor_id,
-            day=DayOfWeek[day_of_week]
-        ).all()
-
-        # Get all already booked appointments for this doctor on this date
-        booked_appointments = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            date=selected_date,
-            status=AppointmentStatus.BOOKED
-        ).all()
-
-        # Extract booked times as strings
-        booked_times = {appt.time.strftime('%H:%M') for appt in booked_appointments}
-
-        # Filter out booked slots
-        available_times = [
-            slot.start_time.strftime('%H:%M') 
-            for slot in available_slots 
-            if slot.start_time.strftime('%H:%M') not in booked_times
-        ]
-
-        return jsonify(available_times)
-
-    except (ValueError, KeyError) as e:
-        return jsonify([])
\ No newline at end of file
+    except ValueError:
+        return jsonify([])
+
+    return jsonify(get_free_grid(doctor_id, selected_date).labels())
+
+@patient_bp.route('/records/search')
+@login_required
+def search_records():
+    """Ranked search over the patient's own treatment records (disease, diagnosis, prescription, notes)."""
+    if current_user.role != 'Patient':
+        flash("Access denied.", "danger")
+        return redirect(url_for('login'))
+
+    q = request.args.get('q', '').strip()
+    results = treatment_search_page(q, request.args.get('after'), request.args.get('before'), patient_id=current_user.patient_id) if q else []
+    return render_template('patient/treatment_search.html', q=q, results=results, highlight=highlight)
+
+@patient_bp.route('/summary')
+@login_required
+def summary():
+    if current_user.role != 'Patient':
+        flash("Access denied.", "danger")
+        return redirect(url_for('login'))
+
+    return render_template('patient/summary.html', summary=get_summary('Patient', current_user.patient_id))
@@ -0,0 +1,76 @@
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+from database import db
+from models import Doctor, Appointment, DoctorAvailability, DoctorAvailabilityOverride, DoctorLeave
+
+SCHEDULE_MODELS = (Appointment, DoctorAvailability, DoctorAvailabilityOverride, DoctorLeave)
+
+doctor_table = Doctor.__table__
+
+# Appointment attributes the doctor's slots and cached upcoming table depend on. Feedback
+# (rating, remarks) isn't among them, so rating a visit doesn't throw the caches away
+APPOINTMENT_SCHEDULE_ATTRS = ('doctor_id', 'patient_id', 'date', 'time', 'slot_minutes', 'status', 'problem')
+
+# session.info key listing the doctors whose version this transaction bumped; fragments.py
+# drops their cached fragments once the transaction commits
+TOUCHED_KEY = 'schedule_touched'
+
+
+def bump_schedule_versions(connection, doctor_ids):
+    doctor_ids = {doctor_id for doctor_id in doctor_ids if doctor_id is not None}
+    if doctor_ids:
+        connection.execute(
+            update(doctor_table)
+            .where(doctor_table.c.id.in_(doctor_ids))
+            .values(schedule_version=doctor_table.c.schedule_version + 1)
+        )
+
+
+def mark_touched(session, doctor_ids):
+    session.info.setdefault(TOUCHED_KEY, set()).update(doctor_ids)
+
+
+def touch_schedules(doctor_ids):
+    """Bump doctors' versions by hand, for bulk query.delete()/Core writes the ORM events don't see."""
+    bump_schedule_versions(db.session.connection(), doctor_ids)
+    mark_touched(db.session(), doctor_ids)
+
+
+def touch_schedule(doctor_id):
+    touch_schedules([doctor_id])
+
+
+def get_schedule_version(doctor_id):
+    """Current version, or None if the doctor doesn't exist."""
+    return db.session.query(Doctor.schedule_version).filter(Doctor.id == doctor_id).scalar()
+
+
+def _schedule_modified(obj):
+    state = inspect(obj)
+    if isinstance(obj, Appointment):
+        return any(state.attrs[name].history.has_changes() for name in APPOINTMENT_SCHEDULE_ATTRS)
+    return state.session.is_modified(obj)
+
+
+@event.listens_for(Appointment.doctor_id, 'set', active_history=True)
+def _keep_old_doctor(target, value, oldvalue, initiator):
+    # active_history loads the previous doctor_id even when it was expired (after a commit),
+    # so the flush below also bumps the doctor the appointment moved away from
+    pass
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_on_flush(session, flush_context, instances):
+    doctor_ids = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, SCHEDULE_MODELS):
+            doctor_ids.add(obj.doctor_id)
+    for obj in session.dirty:
+        if isinstance(obj, SCHEDULE_MODELS) and _schedule_modified(obj):
+            doctor_ids.add(obj.doctor_id)
+            # An appointment moved to another doctor changes the old doctor's slots too
+            doctor_ids.update(inspect(obj).attrs.doctor_id.history.deleted)
+    doctor_ids.discard(None)
+    if doctor_ids:
+        bump_schedule_versions(session.connection(), doctor_ids)
+        mark_touched(session, doctor_ids)
@@ -0,0 +1,160 @@
+from collections import defaultdict
+from sqlalchemy import delete, insert, select
+from database import db
+from models import Doctor, DoctorAvailability, DayOfWeek
+from slot_grid import SlotGrid, SLOT_TIMES, DEFAULT_SLOT_MINUTES, slot_end, slot_index, minute_of_day
+from intervals import check_overlaps
+from schedule_version import touch_schedules
+from directory import invalidate_directory
+
+availability_table = DoctorAvailability.__table__
+
+# Keeps each IN (...) list well under SQLite's bound-parameter limit
+DELETE_CHUNK = 500
+
+
+def weekly_grid_from_form(day_names, slot_labels, minutes=DEFAULT_SLOT_MINUTES):
+    """
+    {DayOfWeek: SlotGrid} for the same slot labels on every selected day (the setup/edit forms).
+    Raises ValueError if two of the `minutes` long slots would overlap.
+    """
+    grid = SlotGrid.from_labels(slot_labels)
+    check_overlaps(grid, minutes)
+    return {DayOfWeek[name.upper()]: grid for name in day_names}
+
+
+def slot_lengths(doctor_ids):
+    return dict(db.session.execute(select(Doctor.id, Doctor.slot_minutes).where(Doctor.id.in_(doctor_ids))).all())
+
+
+def load_weekly_grids(doctor_ids, minutes_by_doctor):
+    """
+    Stored schedules as {doctor_id: {DayOfWeek: (SlotGrid, {slot index: row id})}}, plus
+    {doctor_id: [row id]} of rows whose length isn't the doctor's slot length (left from before it changed).
+    """
+    stored = defaultdict(dict)
+    stale = defaultdict(list)
+    rows = db.session.execute(
+        select(availability_table.c.id, availability_table.c.doctor_id, availability_table.c.day,
+               availability_table.c.start_time, availability_table.c.end_time)
+        .where(availability_table.c.doctor_id.in_(doctor_ids))
+    ).all()
+    for row_id, doctor_id, day, start_time, end_time in rows:
+        i = slot_index(start_time)
+        if end_time != slot_end(i, minutes_by_doctor.get(doctor_id, DEFAULT_SLOT_MINUTES)):
+            stale[doctor_id].append(row_id)
+            continue
+        grid, ids = stored[doctor_id].get(day, (SlotGrid(), {}))
+        ids[i] = row_id
+        stored[doctor_id][day] = (grid | SlotGrid(1 << i), ids)
+    return stored, stale
+
+
+def write_weekly_schedules(schedules):
+    """
+    Make the stored weekly schedules match `schedules` ({doctor_id: {DayOfWeek: SlotGrid}},
+    days missing from a doctor's mapping are cleared), each row as long as the doctor's
+    slot_minutes. Only the difference is written, as one bulk DELETE and one executemany
+    INSERT inside the caller's transaction; the caller commits.
+    Returns (inserted, deleted) row counts.
+    """
+    if not schedules:
+        return 0, 0
+
+    minutes_by_doctor = slot_lengths(list(schedules))
+    stored, stale = load_weekly_grids(list(schedules), minutes_by_doctor)
+    to_insert = []
+    to_delete = [row_id for row_ids in stale.values() for row_id in row_ids]
+    changed_doctors = set(stale)
+
+    for doctor_id, requested in schedules.items():
+        minutes = minutes_by_doctor.get(doctor_id, DEFAULT_SLOT_MINUTES)
+        for day in DayOfWeek:
+            wanted = requested.get(day, SlotGrid())
+            current, row_ids = stored[doctor_id].get(day, (SlotGrid(), {}))
+            added = wanted - current
+            removed = current - wanted
+            if added or removed:
+                changed_doctors.add(doctor_id)
+            to_insert.extend({
+                'doctor_id': doctor_id,
+                'day': day,
+                'start_time': SLOT_TIMES[i],
+                'end_time': slot_end(i, minutes)
+            } for i in added)
+            to_delete.extend(row_ids[i] for i in removed)
+
+    for start in range(0, len(to_delete), DELETE_CHUNK):
+        db.session.execute(
+            delete(availability_table).where(availability_table.c.id.in_(to_delete[start:start + DELETE_CHUNK]))
+        )
+    if to_insert:
+        db.session.execute(insert(availability_table), to_insert)
+
+    # Core statements bypass the ORM flush listener that maintains schedule_version
+    touch_schedules(changed_doctors)
+    return len(to_insert), len(to_delete)
+
+
+def apply_weekly_schedules(schedules):
+    """write_weekly_schedules() plus the commit (taking anything else pending in the session with it) and cache invalidation."""
+    try:
+        counts = write_weekly_schedules(schedules)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_directory()
+    return counts
+
+
+def apply_weekly_schedule(doctor_id, schedule):
+    return apply_weekly_schedules({doctor_id: schedule})
+
+
+def respaced_schedule(doctor_id, minutes):
+    """
+    The doctor's weekly schedule redrawn with `minutes` long slots: the hours each day's slots
+    cover, merged into ranges, filled with back-to-back slots of the new length.
+    """
+    rows = db.session.execute(
+        select(availability_table.c.day, availability_table.c.start_time, availability_table.c.end_time)
+        .where(availability_table.c.doctor_id == doctor_id)
+    ).all()
+    spans = defaultdict(list)
+    for day, start_time, end_time in rows:
+        start, end = minute_of_day(start_time), minute_of_day(end_time)
+        spans[day].append((start, end if end > start else end + 24 * 60))
+
+    schedule = {}
+    for day, day_spans in spans.items():
+        grid = SlotGrid()
+        range_start = range_end = None
+        for start, end in sorted(day_spans) + [(None, None)]:
+            if start is not None and range_end is not None and start <= range_end:
+                range_end = max(range_end, end)
+                continue
+            if range_start is not None:
+                grid |= SlotGrid.spaced(range_start, range_end, minutes)
+            range_start, range_end = start, end
+        schedule[day] = grid
+    return schedule
+
+
+def set_slot_minutes(doctor, minutes):
+    """Change a doctor's slot length in the session, without touching the weekly rows or committing."""
+    if minutes == doctor.slot_minutes:
+        return
+    doctor.slot_minutes = minutes
+    # Overrides, leave and bookings map onto different slots now, even on days without weekly rows
+    touch_schedules([doctor.id])
+
+
+def apply_slot_minutes(doctor, minutes):
+    """Set a doctor's slot length, redrawing the weekly schedule if it changed, and commit."""
+    if minutes == doctor.slot_minutes:
+        db.session.commit()
+        return
+    schedule = respaced_schedule(doctor.id, minutes)
+    set_slot_minutes(doctor, minutes)
+    apply_weekly_schedule(doctor.id, schedule)
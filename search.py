@@ -0,0 +1,301 @@
+import re
+from collections import namedtuple
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from database import db
+from pagination import KeysetPage
+
+# Longest query we turn into a MATCH expression; extra words are ignored
+MAX_TOKENS = 8
+# Treatment search results per page
+TREATMENT_PAGE_SIZE = 20
+# Typeahead: suggestions returned, and matches ranked to pick them (see search_people)
+SUGGEST_LIMIT = 8
+SUGGEST_CANDIDATES = 200
+
+TreatmentHit = namedtuple('TreatmentHit', ['treatment_id', 'appointment_id', 'date', 'doctor_id', 'doctor_name',
+                                           'patient_id', 'patient_name', 'disease', 'diagnosis',
+                                           'prescription', 'notes', 'score'])
+
+PersonHit = namedtuple('PersonHit', ['user_id', 'name', 'email', 'username', 'role', 'phone_number',
+                                     'specialization', 'patient_id', 'doctor_id'])
+
+# One row per user, rowid = user.id. The ids and role are stored but not indexed.
+# prefix='2 3' keeps extra indexes for 2- and 3-character prefixes, which typeahead hits most
+PEOPLE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS people_search USING fts5(
+    name, email, username, phone_number, specialization,
+    role UNINDEXED, patient_id UNINDEXED, doctor_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+"""
+
+PEOPLE_ROWS = """
+INSERT INTO people_search (rowid, name, email, username, phone_number, specialization, role, patient_id, doctor_id)
+SELECT u.id, u.name, u.email, u.username, coalesce(p.phone_number, ''), coalesce(d.specialization, ''),
+       u.role, p.id, d.id
+FROM "user" u LEFT JOIN patient p ON p.user_id = u.id LEFT JOIN doctor d ON d.user_id = u.id
+"""
+
+
+def _reindex(user_id):
+    return f"DELETE FROM people_search WHERE rowid = {user_id}; {PEOPLE_ROWS} WHERE u.id = {user_id};"
+
+
+# Triggers rather than ORM events, so Core writes (bulk_import.py) and raw SQL keep the
+# index in sync too. Updates only fire for the searched columns: not for password rehashes
+# or schedule_version bumps
+PEOPLE_TRIGGERS = {
+    'people_search_user_insert': f'AFTER INSERT ON "user" BEGIN {_reindex("NEW.id")} END',
+    'people_search_user_update': (
+        'AFTER UPDATE OF id, name, email, username, role ON "user" '
+        f'BEGIN DELETE FROM people_search WHERE rowid = OLD.id; {_reindex("NEW.id")} END'
+    ),
+    'people_search_user_delete': 'AFTER DELETE ON "user" BEGIN DELETE FROM people_search WHERE rowid = OLD.id; END',
+    'people_search_patient_insert': f'AFTER INSERT ON patient BEGIN {_reindex("NEW.user_id")} END',
+    'people_search_patient_update': (
+        'AFTER UPDATE OF user_id, phone_number ON patient '
+        f'BEGIN {_reindex("OLD.user_id")} {_reindex("NEW.user_id")} END'
+    ),
+    'people_search_patient_delete': f'AFTER DELETE ON patient BEGIN {_reindex("OLD.user_id")} END',
+    'people_search_doctor_insert': f'AFTER INSERT ON doctor BEGIN {_reindex("NEW.user_id")} END',
+    'people_search_doctor_update': (
+        'AFTER UPDATE OF user_id, specialization ON doctor '
+        f'BEGIN {_reindex("OLD.user_id")} {_reindex("NEW.user_id")} END'
+    ),
+    'people_search_doctor_delete': f'AFTER DELETE ON doctor BEGIN {_reindex("OLD.user_id")} END',
+}
+
+
+# Treatments, rowid = treatment.id. `scope` holds 'd<doctor_id> p<patient_id>' of the
+# appointment, so a doctor's or patient's search is a column filter FTS5 intersects with the
+# words' posting lists instead of a join filtering every match afterwards
+TREATMENT_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS treatment_search USING fts5(
+    disease, diagnosis, prescription, notes, scope,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+TREATMENT_ROWS = """
+INSERT INTO treatment_search (rowid, disease, diagnosis, prescription, notes, scope)
+SELECT t.id, t.disease, coalesce(t.diagnosis, ''), coalesce(t.prescription, ''), coalesce(t.notes, ''),
+       'd' || a.doctor_id || ' p' || a.patient_id
+FROM treatment t JOIN appointment a ON a.id = t.appointment_id
+"""
+
+TREATMENT_TEXT_COLUMNS = '{disease diagnosis prescription notes}'
+
+# Column weights for bm25: the disease counts most, scope not at all
+TREATMENT_RANK = 'bm25(treatment_search, 4.0, 3.0, 2.0, 1.0, 0.0)'
+
+# Recording a treatment (treat_patient, imports) indexes just that row. Appointment updates
+# only matter when they move the treatment to another doctor or patient
+TREATMENT_TRIGGERS = {
+    'treatment_search_insert': f'AFTER INSERT ON treatment BEGIN {TREATMENT_ROWS} WHERE t.id = NEW.id; END',
+    'treatment_search_update': (
+        'AFTER UPDATE OF id, appointment_id, disease, diagnosis, prescription, notes ON treatment '
+        f'BEGIN DELETE FROM treatment_search WHERE rowid = OLD.id; {TREATMENT_ROWS} WHERE t.id = NEW.id; END'
+    ),
+    'treatment_search_delete': 'AFTER DELETE ON treatment BEGIN DELETE FROM treatment_search WHERE rowid = OLD.id; END',
+    'treatment_search_appointment_update': (
+        'AFTER UPDATE OF id, doctor_id, patient_id ON appointment BEGIN '
+        'DELETE FROM treatment_search WHERE rowid IN (SELECT id FROM treatment WHERE appointment_id = OLD.id); '
+        f'{TREATMENT_ROWS} WHERE t.appointment_id = NEW.id; END'
+    ),
+}
+
+
+def _ensure_index(name, table_ddl, triggers, rebuild):
+    connection = db.session.connection()
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': name}).first()
+    connection.execute(text(table_ddl))
+    for trigger, body in triggers.items():
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+        connection.execute(text(f'CREATE TRIGGER {trigger} {body}'))
+    if exists:
+        db.session.commit()
+    else:
+        rebuild()
+
+
+def ensure_search_index():
+    """
+    Create the FTS5 tables and (re)create their triggers; fill a table if it was just created.
+    Run by init_db, so `flask init-db` adds search to an existing database.
+    """
+    if db.session.connection().dialect.name != 'sqlite':
+        return
+    _ensure_index('people_search', PEOPLE_TABLE, PEOPLE_TRIGGERS, rebuild_people_index)
+    _ensure_index('treatment_search', TREATMENT_TABLE, TREATMENT_TRIGGERS, rebuild_treatment_index)
+
+
+def _rebuild(name, rows):
+    connection = db.session.connection()
+    connection.execute(text(f'DELETE FROM {name}'))
+    connection.execute(text(rows))
+    connection.execute(text(f"INSERT INTO {name} ({name}) VALUES ('optimize')"))
+    count = connection.execute(text(f'SELECT count(*) FROM {name}')).scalar()
+    db.session.commit()
+    return count
+
+
+def rebuild_people_index():
+    """Refill the people index from the user, patient and doctor tables. Returns the row count."""
+    return _rebuild('people_search', PEOPLE_ROWS)
+
+
+def rebuild_treatment_index():
+    """Refill the treatment index from the treatment and appointment tables. Returns the row count."""
+    return _rebuild('treatment_search', TREATMENT_ROWS)
+
+
+def rebuild_search_index():
+    """Refill both indexes; returns (users, treatments) indexed."""
+    return rebuild_people_index(), rebuild_treatment_index()
+
+
+def query_tokens(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TOKENS]
+
+
+def match_expression(query):
+    """
+    Every word of `query` as a prefix, ANDed: 'ann smi' -> '"ann"* "smi"*'. Words are split
+    like the tokenizer does, so emails and phone numbers match piece by piece.
+    """
+    return ' '.join(f'"{token}"*' for token in query_tokens(query))
+
+
+def search_people(query, role=None, limit=20, offset=0, candidates=None):
+    """
+    Users matching `query` (optionally only one role), best match first: a hit in the name
+    counts most, then email/username, phone and specialization.
+
+    Ranking scores every match, which for a short prefix can be the whole table. With
+    `candidates`, only the first that many matches (in user id order) are ranked, which keeps
+    typeahead fast; queries matching fewer rows than that are ranked exactly as before.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    matches = (
+        'SELECT rowid, name, email, username, role, phone_number, specialization, patient_id, doctor_id, '
+        'bm25(people_search, 10.0, 4.0, 4.0, 2.0, 2.0) AS score '
+        'FROM people_search WHERE people_search MATCH :expression'
+        + (' AND role = :role' if role else '')
+        + (' LIMIT :candidates' if candidates else '')
+    )
+    rows = db.session.execute(text(
+        f'SELECT * FROM ({matches}) ORDER BY score LIMIT :limit OFFSET :offset'
+    ), {'expression': expression, 'role': role, 'candidates': candidates, 'limit': limit, 'offset': offset})
+    return [PersonHit(*row[:-1]) for row in rows]
+
+
+def treatment_terms(query):
+    """
+    Whole words, ANDed, with `word*` for a prefix: 'asthma salb*' -> '"asthma" "salb"*'. Unlike
+    names, every word is not a prefix by default: a prefix has to merge the posting lists of
+    every word it covers, which on a million treatments costs more than the search itself.
+    """
+    words = re.findall(r'(\w+)(\*?)', query.lower())[:MAX_TOKENS]
+    return ' '.join(f'"{word}"{star}' for word, star in words)
+
+
+def search_treatments(query, doctor_id=None, patient_id=None, limit=20, after=None, before=None):
+    """
+    Treatments whose disease, diagnosis, prescription or notes contain every word of `query`,
+    best match first, with the appointment date and both names. Pass doctor_id and/or
+    patient_id to only search that doctor's or patient's records.
+
+    Every match is ranked, ties broken by treatment id. `after` / `before` are the
+    (score, treatment_id) of the last / first hit of a page and return the `limit` hits just
+    after / before it, so a deep page doesn't mean ranking and skipping all the ones above it.
+    """
+    terms = treatment_terms(query)
+    if not terms:
+        return []
+    expression = f'{TREATMENT_TEXT_COLUMNS} : ({terms})'
+    if doctor_id is not None:
+        expression += f' AND scope : "d{int(doctor_id)}"'
+    if patient_id is not None:
+        expression += f' AND scope : "p{int(patient_id)}"'
+
+    seek, order = '', 'score, rowid'
+    if after is not None:
+        seek = 'WHERE (score, rowid) > (:score, :rowid)'
+    elif before is not None:
+        seek, order = 'WHERE (score, rowid) < (:score, :rowid)', 'score DESC, rowid DESC'
+    score, rowid = after or before or (None, None)
+
+    # Rank in the FTS table first, then join just this page's rows
+    rows = db.session.execute(text(f"""
+        SELECT t.id, t.appointment_id, a.date, a.doctor_id, du.name, a.patient_id, pu.name,
+               t.disease, t.diagnosis, t.prescription, t.notes, m.score
+        FROM (
+            SELECT rowid, score FROM (
+                SELECT rowid, {TREATMENT_RANK} AS score FROM treatment_search
+                WHERE treatment_search MATCH :expression
+            ) {seek} ORDER BY {order} LIMIT :limit
+        ) m
+        JOIN treatment t ON t.id = m.rowid
+        JOIN appointment a ON a.id = t.appointment_id
+        JOIN doctor d ON d.id = a.doctor_id JOIN "user" du ON du.id = d.user_id
+        JOIN patient p ON p.id = a.patient_id JOIN "user" pu ON pu.id = p.user_id
+        ORDER BY m.score, m.rowid
+    """), {'expression': expression, 'score': score, 'rowid': rowid, 'limit': limit})
+    return [TreatmentHit(*row) for row in rows]
+
+
+def treatment_cursor(hit):
+    """'-3.1415_42' for a hit; repr() keeps the score exact so the next page starts right after it."""
+    return f'{hit.score!r}_{hit.treatment_id}'
+
+
+def _decode_treatment_cursor(cursor):
+    score, _, rowid = (cursor or '').rpartition('_')
+    try:
+        return float(score), int(rowid)
+    except ValueError:
+        return None
+
+
+def treatment_search_page(query, after=None, before=None, **scope):
+    """
+    One page of search_treatments() as a KeysetPage, driven by the ?after= / ?before= cursors
+    of the page links. The extra row fetched only says whether there's another page that way.
+    """
+    after_key = _decode_treatment_cursor(after)
+    before_key = _decode_treatment_cursor(before) if after_key is None else None
+    hits = search_treatments(query, limit=TREATMENT_PAGE_SIZE + 1, after=after_key, before=before_key, **scope)
+    has_more = len(hits) > TREATMENT_PAGE_SIZE
+    if before_key is not None:
+        # Fetched walking backwards: the extra row is the first one
+        items, has_next, has_prev = hits[-TREATMENT_PAGE_SIZE:], True, has_more
+    else:
+        items, has_next, has_prev = hits[:TREATMENT_PAGE_SIZE], has_more, after_key is not None
+    return KeysetPage(
+        items,
+        TREATMENT_PAGE_SIZE,
+        None,
+        next_cursor=treatment_cursor(items[-1]) if items and has_next else None,
+        prev_cursor=treatment_cursor(items[0]) if items and has_prev else None
+    )
+
+
+def highlight(value, query):
+    """Escape `value` and wrap the words matching `query` (as prefixes) in <mark>."""
+    value = value or ''
+    tokens = query_tokens(query)
+    if not tokens:
+        return escape(value)
+    pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, tokens)) + r')\w*', re.IGNORECASE)
+    parts, end = [], 0
+    for match in pattern.finditer(value):
+        parts.append(escape(value[end:match.start()]))
+        parts.append(Markup('<mark>%s</mark>') % match.group(0))
+        end = match.end()
+    parts.append(escape(value[end:]))
+    return Markup('').join(parts)
@@ -0,0 +1,149 @@
+from datetime import time
+
+# Grid resolution: bit i of a day = a slot starting at i * 5 min. Every slot length is a multiple.
+GRID_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // GRID_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+# Slot lengths a doctor can pick (Doctor.slot_minutes)
+SLOT_LENGTHS = (10, 15, 20, 30, 45)
+DEFAULT_SLOT_MINUTES = 30
+
+# Precomputed per-position values so converting a grid never goes through strftime/strptime
+SLOT_TIMES = [time(*divmod(i * GRID_MINUTES, 60)) for i in range(SLOTS_PER_DAY)]
+SLOT_LABELS = ['%02d:%02d' % (t.hour, t.minute) for t in SLOT_TIMES]
+LABEL_INDEX = {label: i for i, label in enumerate(SLOT_LABELS)}
+
+
+def slot_index(t):
+    return (t.hour * 60 + t.minute) // GRID_MINUTES
+
+
+def minute_of_day(t):
+    return t.hour * 60 + t.minute
+
+
+def slot_end(i, minutes=DEFAULT_SLOT_MINUTES):
+    """End time of a `minutes` long slot starting at position `i`; wraps past midnight."""
+    return SLOT_TIMES[(i + minutes // GRID_MINUTES) % SLOTS_PER_DAY]
+
+
+def _bit_range(first, last):
+    """Bits first..last-1, clipped to the day."""
+    first, last = max(first, 0), min(last, SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+class SlotGrid:
+    """
+    One day of slot start times packed into an integer, one bit per 5 minutes (bit i = a slot
+    starting at i * 5 min). How long each slot runs is the doctor's slot_minutes, so a
+    30-minute schedule sets every sixth bit. Weekly schedules, overrides and bookings combine
+    with |, & and - instead of set/string work.
+    """
+    __slots__ = ('bits',)
+
+    def __init__(self, bits=0):
+        self.bits = bits & FULL_DAY
+
+    @classmethod
+    def from_times(cls, times):
+        bits = 0
+        for t in times:
+            bits |= 1 << slot_index(t)
+        return cls(bits)
+
+    @classmethod
+    def from_labels(cls, labels):
+        bits = 0
+        for label in labels:
+            try:
+                bits |= 1 << LABEL_INDEX[label]
+            except KeyError:
+                raise ValueError(f"'{label}' is not a slot time (HH:MM on a {GRID_MINUTES}-minute boundary)")
+        return cls(bits)
+
+    @classmethod
+    def spaced(cls, start_minute, end_minute, minutes=DEFAULT_SLOT_MINUTES):
+        """Back-to-back `minutes` slots from start_minute that end by end_minute (minutes from midnight)."""
+        first = int(-(-start_minute // GRID_MINUTES))  # first grid position at or after the start
+        step = minutes // GRID_MINUTES
+        last = min(end_minute, 24 * 60) - minutes  # latest start that still fits
+        bits = 0
+        for i in range(max(first, 0), int(last // GRID_MINUTES) + 1, step):
+            bits |= 1 << i
+        return cls(bits)
+
+    @classmethod
+    def from_range(cls, start, end, minutes=DEFAULT_SLOT_MINUTES):
+        """Back-to-back `minutes` slots from `start` that end by `end` (None = midnight)."""
+        return cls.spaced(minute_of_day(start), minute_of_day(end) if end else 24 * 60, minutes)
+
+    @classmethod
+    def covering(cls, start_minute, end_minute, minutes=DEFAULT_SLOT_MINUTES):
+        """Every start position whose `minutes` slot overlaps [start_minute, end_minute)."""
+        first = int((start_minute - minutes) // GRID_MINUTES) + 1
+        last = -int(-end_minute // GRID_MINUTES)
+        return cls(_bit_range(first, last))
+
+    def __or__(self, other):
+        return SlotGrid(self.bits | other.bits)
+
+    def __and__(self, other):
+        return SlotGrid(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return SlotGrid(self.bits & ~other.bits)
+
+    def __invert__(self):
+        return SlotGrid(~self.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, SlotGrid) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __contains__(self, t):
+        return bool(self.bits >> slot_index(t) & 1)
+
+    def __iter__(self):
+        """Yield set slot indexes in time order."""
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def __repr__(self):
+        return f"SlotGrid({self.labels()})"
+
+    def times(self):
+        return [SLOT_TIMES[i] for i in self]
+
+    def labels(self):
+        return [SLOT_LABELS[i] for i in self]
+
+    def intervals(self, minutes=DEFAULT_SLOT_MINUTES):
+        """(start_time, end_time) for each slot, for writing schedule rows."""
+        return [(SLOT_TIMES[i], slot_end(i, minutes)) for i in self]
+
+
+EMPTY = SlotGrid()
+
+
+def slot_choices(start, end, minutes=DEFAULT_SLOT_MINUTES):
+    """Form choices for back-to-back `minutes` slots from `start` that end by `end`."""
+    return [(label, label) for label in SlotGrid.from_range(start, end, minutes).labels()]
+
+
+def slot_length_choices():
+    return [(minutes, f'{minutes} minutes') for minutes in SLOT_LENGTHS]
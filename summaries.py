@@ -0,0 +1,171 @@
+import time as timer
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select
+from database import db
+from models import Appointment, AppointmentStatus, Treatment, SummaryWeek, SummaryDisease, SummaryRun
+
+CHUNK_SIZE = 5000
+RECENT_WEEKS = 12
+TOP_DISEASES = 5
+
+# Positions in the per-week accumulator list
+STATUS_SLOT = {
+    AppointmentStatus.BOOKED: 0,
+    AppointmentStatus.COMPLETED: 1,
+    AppointmentStatus.CANCELLED: 2,
+}
+RATING_TOTAL, RATING_COUNT = 3, 4
+
+appointment_table = Appointment.__table__
+treatment_table = Treatment.__table__
+week_table = SummaryWeek.__table__
+disease_table = SummaryDisease.__table__
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def iter_appointment_chunks(chunk_size=CHUNK_SIZE):
+    """
+    Appointments joined to their treatment's disease, chunk_size appointments at a time, walking
+    the primary key. The limit applies to appointments before the join, so all of one
+    appointment's treatment rows land in the same chunk.
+    """
+    last_id = 0
+    while True:
+        page = (
+            select(
+                appointment_table.c.id,
+                appointment_table.c.doctor_id,
+                appointment_table.c.patient_id,
+                appointment_table.c.date,
+                appointment_table.c.status,
+                appointment_table.c.rating
+            )
+            .where(appointment_table.c.id > last_id)
+            .order_by(appointment_table.c.id)
+            .limit(chunk_size)
+            .subquery()
+        )
+        rows = db.session.execute(
+            select(page, treatment_table.c.disease)
+            .outerjoin(treatment_table, treatment_table.c.appointment_id == page.c.id)
+            .order_by(page.c.id)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _batched(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def build_summaries(chunk_size=CHUNK_SIZE):
+    """
+    Recompute the weekly and disease rollups for every doctor and patient. Memory grows with
+    owners x weeks, not with the number of appointments. The old rollups are replaced in one
+    transaction, so the pages never see a half-built report. Returns the SummaryRun.
+    """
+    started = timer.perf_counter()
+    weeks = defaultdict(lambda: [0, 0, 0, 0, 0])
+    diseases = defaultdict(int)
+    disease_names = {}
+    appointment_count = 0
+    previous_id = None
+
+    for rows in iter_appointment_chunks(chunk_size):
+        for row in rows:
+            owners = (('Doctor', row.doctor_id), ('Patient', row.patient_id))
+            # An appointment with more than one treatment comes back once per treatment
+            if row.id != previous_id:
+                appointment_count += 1
+                monday = week_start(row.date)
+                for role, owner_id in owners:
+                    counts = weeks[(role, owner_id, monday)]
+                    counts[STATUS_SLOT[row.status]] += 1
+                    if row.rating is not None:
+                        counts[RATING_TOTAL] += row.rating
+                        counts[RATING_COUNT] += 1
+            previous_id = row.id
+
+            disease = (row.disease or '').strip()
+            if disease:
+                key = disease.lower()
+                disease_names.setdefault(key, disease[:200])
+                for role, owner_id in owners:
+                    diseases[(role, owner_id, key)] += 1
+
+    week_rows = [{
+        'role': role,
+        'owner_id': owner_id,
+        'week_start': monday,
+        'booked_count': counts[0],
+        'completed_count': counts[1],
+        'cancelled_count': counts[2],
+        'rating_total': counts[RATING_TOTAL],
+        'rating_count': counts[RATING_COUNT]
+    } for (role, owner_id, monday), counts in weeks.items()]
+    disease_rows = [{
+        'role': role,
+        'owner_id': owner_id,
+        'disease': disease_names[key],
+        'count': count
+    } for (role, owner_id, key), count in diseases.items()]
+
+    try:
+        db.session.execute(delete(week_table))
+        db.session.execute(delete(disease_table))
+        for batch in _batched(week_rows, chunk_size):
+            db.session.execute(insert(week_table), batch)
+        for batch in _batched(disease_rows, chunk_size):
+            db.session.execute(insert(disease_table), batch)
+        run = SummaryRun(
+            finished_at=datetime.now(),
+            appointment_count=appointment_count,
+            seconds=round(timer.perf_counter() - started, 3)
+        )
+        db.session.add(run)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return run
+
+
+def get_summary(role, owner_id):
+    """Everything the summary page shows for one doctor or patient, read from the rollups only."""
+    owner = (SummaryWeek.role == role, SummaryWeek.owner_id == owner_id)
+
+    recent_weeks = SummaryWeek.query.filter(*owner).order_by(SummaryWeek.week_start.desc()).limit(RECENT_WEEKS).all()
+    booked, completed, cancelled, rating_total, rating_count = db.session.query(
+        func.coalesce(func.sum(SummaryWeek.booked_count), 0),
+        func.coalesce(func.sum(SummaryWeek.completed_count), 0),
+        func.coalesce(func.sum(SummaryWeek.cancelled_count), 0),
+        func.coalesce(func.sum(SummaryWeek.rating_total), 0),
+        func.coalesce(func.sum(SummaryWeek.rating_count), 0)
+    ).filter(*owner).one()
+    total = booked + completed + cancelled
+
+    top_diseases = db.session.query(SummaryDisease.disease, SummaryDisease.count).filter(
+        SummaryDisease.role == role,
+        SummaryDisease.owner_id == owner_id
+    ).order_by(SummaryDisease.count.desc(), SummaryDisease.disease).limit(TOP_DISEASES).all()
+
+    return {
+        'weeks': list(reversed(recent_weeks)),
+        'total': total,
+        'booked': booked,
+        'completed': completed,
+        'cancelled': cancelled,
+        'completion_rate': round(100 * completed / total, 1) if total else None,
+        'cancel_rate': round(100 * cancelled / total, 1) if total else None,
+        'average_rating': round(rating_total / rating_count, 2) if rating_count else None,
+        'rating_count': rating_count,
+        'top_diseases': top_diseases,
+        'last_run': SummaryRun.query.order_by(SummaryRun.id.desc()).first()
+    }